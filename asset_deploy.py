@@ -0,0 +1,182 @@
+"""manual_assets 部署：哈希清单 + 零拷贝链接。
+
+哈希清单记录 manual_assets 中每个文件的 sha256 / size / mtime_ns / git blob id，
+默认写在源码树之外的 .cache/manual-assets-manifest.json（已 gitignore，MANUAL_ASSETS_MANIFEST 可改路径），
+构建不会改动受版本控制的文件。清单含本机 mtime，不入库；CI 可缓存 .cache/ 跨次复用。
+校验时优先用 `git ls-files -s` 的 blob id（新 clone 的 mtime 全变，blob 不变），
+不在 git 中或工作区有改动的文件退回 size + mtime_ns；只有变化的文件才重新哈希，
+清单也只在 manual_assets 变化时重写。没有清单时（例如全新 clone）全部哈希一遍。
+
+部署顺序：reflink (FICLONE，写时复制) → 硬链接 → 复制。硬链接与源文件共用 inode，
+只用于构建中不会被原地改写的二进制资源（字体分片、图片）；文本类文件一律复制。
+"""
+import json
+import os
+import shutil
+import subprocess
+
+from hash_cache import sha256_file
+
+MANIFEST_FILENAME = "manual-assets-manifest.json"
+DEFAULT_MANIFEST_DIR = ".cache"
+MANIFEST_VERSION = 1
+# linux/fs.h: _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+HARDLINK_SAFE_EXTENSIONS = (".woff2", ".woff", ".ttf", ".otf", ".png", ".jpg", ".jpeg", ".webp", ".avif", ".bin")
+
+
+def git_blob_ids(source_dir):
+    """
+    返回 {相对 source_dir 的路径: blob id}，只包含工作区与索引一致的文件。
+    不在 git 仓库中或没有 git 时返回 {}。
+    """
+    def run(*args):
+        return subprocess.run(
+            ["git", "-c", "core.quotepath=off", *args, "-z", "--", "."],
+            cwd=source_dir,
+            capture_output=True,
+            check=True,
+        ).stdout.decode("utf-8", "surrogateescape")
+
+    try:
+        staged = run("ls-files", "-s")
+        modified = set(filter(None, run("ls-files", "-m").split("\0")))
+    except (OSError, subprocess.CalledProcessError):
+        return {}
+
+    blobs = {}
+    for record in filter(None, staged.split("\0")):
+        meta, path = record.split("\t", 1)
+        if path not in modified:
+            blobs[path] = meta.split()[1]
+    return blobs
+
+
+def default_manifest_path():
+    return os.environ.get("MANUAL_ASSETS_MANIFEST") or os.path.join(DEFAULT_MANIFEST_DIR, MANIFEST_FILENAME)
+
+
+def load_manifest(manifest_path):
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(data, dict) or data.get("version") != MANIFEST_VERSION:
+        return {}
+    return data.get("files", {})
+
+
+def _walk_files(source_dir):
+    for root, dirs, files in os.walk(source_dir):
+        dirs.sort()
+        for file in sorted(files):
+            full_path = os.path.join(root, file)
+            yield os.path.relpath(full_path, source_dir).replace("\\", "/"), full_path
+
+
+def _manifest_key(entry):
+    if entry.get("blob"):
+        return entry.get("sha256"), entry["blob"]
+    return entry.get("sha256"), entry.get("size"), entry.get("mtime_ns")
+
+
+def refresh_manifest(source_dir, manifest_path=None, blob_ids=None):
+    """
+    校验并按需更新 manifest_path（默认 default_manifest_path()）处的清单，返回 ({rel_path: entry}, 统计)。
+    统计中 rehashed 为重新计算哈希的文件数，written 表示清单是否被重写。
+    """
+    manifest_path = manifest_path or default_manifest_path()
+    previous = load_manifest(manifest_path)
+    if blob_ids is None:
+        blob_ids = git_blob_ids(source_dir)
+
+    files = {}
+    stats = {"files": 0, "rehashed": 0, "by_blob": 0, "by_stat": 0, "written": False}
+    for rel_path, full_path in _walk_files(source_dir):
+        stat = os.stat(full_path)
+        blob = blob_ids.get(rel_path)
+        entry = previous.get(rel_path)
+        stats["files"] += 1
+        if entry and blob and entry.get("blob") == blob:
+            stats["by_blob"] += 1
+        elif entry and entry.get("size") == stat.st_size and entry.get("mtime_ns") == stat.st_mtime_ns:
+            stats["by_stat"] += 1
+        else:
+            entry = {"sha256": sha256_file(full_path)}
+            stats["rehashed"] += 1
+        files[rel_path] = {"sha256": entry["sha256"], "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "blob": blob}
+
+    # 有 blob id 的文件只在内容变化时重写清单，避免每次 clone 后 mtime 变化都产生改动
+    if {rel_path: _manifest_key(entry) for rel_path, entry in files.items()} != {
+        rel_path: _manifest_key(entry) for rel_path, entry in previous.items()
+    }:
+        os.makedirs(os.path.dirname(manifest_path) or ".", exist_ok=True)
+        with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION, "files": files}, f, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+        os.replace(manifest_path + ".tmp", manifest_path)
+        stats["written"] = True
+    return files, stats
+
+
+def reflink(source_path, target_path):
+    """写时复制克隆（btrfs / xfs / bcachefs 等），不支持时抛出 OSError。"""
+    try:
+        import fcntl
+    except ImportError as e:
+        raise OSError("reflink 不可用") from e
+    try:
+        with open(source_path, "rb") as src, open(target_path, "wb") as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+    except OSError:
+        if os.path.exists(target_path):
+            os.remove(target_path)
+        raise
+    shutil.copystat(source_path, target_path)
+
+
+def place_file(source_path, target_path, allow_hardlink, try_reflink=True):
+    """把文件放到目标位置，返回使用的方式：reflink / hardlink / copy。"""
+    if try_reflink:
+        try:
+            reflink(source_path, target_path)
+            return "reflink"
+        except OSError:
+            pass
+    if allow_hardlink:
+        try:
+            os.link(source_path, target_path)
+            return "hardlink"
+        except OSError:
+            pass
+    shutil.copy2(source_path, target_path)
+    return "copy"
+
+
+def deploy_manifest_files(source_dir, target_dir, files, hash_cache=None):
+    """
+    把清单中目标目录缺失的文件补齐（不覆盖已有文件），返回 {方式: 数量, "skipped": 数量}。
+    新放置的文件内容与源一致，哈希直接登记到 hash_cache。
+    """
+    counts = {"reflink": 0, "hardlink": 0, "copy": 0, "skipped": 0}
+    created_dirs = set()
+    # 同一文件系统上 reflink 失败一次后基本都会失败，之后不再尝试
+    try_reflink = True
+    for rel_path, entry in files.items():
+        target_path = os.path.join(target_dir, *rel_path.split("/"))
+        if os.path.lexists(target_path):
+            counts["skipped"] += 1
+            continue
+        parent_dir = os.path.dirname(target_path)
+        if parent_dir not in created_dirs:
+            os.makedirs(parent_dir, exist_ok=True)
+            created_dirs.add(parent_dir)
+
+        source_path = os.path.join(source_dir, *rel_path.split("/"))
+        allow_hardlink = rel_path.lower().endswith(HARDLINK_SAFE_EXTENSIONS)
+        method = place_file(source_path, target_path, allow_hardlink, try_reflink)
+        try_reflink = try_reflink and method == "reflink"
+        counts[method] += 1
+        if hash_cache is not None:
+            hash_cache.record(rel_path, entry["sha256"], target_path)
+    return counts
@@ -0,0 +1,172 @@
+"""把 output/ 增量同步到 asset-xtower 检出目录，取代 rm -rf + cp -r。
+
+以两边的 checksums.sha256 为准（检出目录里的是上次部署的清单）：
+  - 只复制新增 / 变更的文件及其预压缩副本、内容哈希别名（见 deploy_delta）；
+  - 删除上次有、本次没有的文件（连同别名）；
+  - 未变的文件不碰，mtime 与 inode 保持原样，git 的 stat 缓存仍然有效；
+  - 清单中未变但检出里缺失的文件照常补上。
+检出目录没有清单时退回镜像模式：逐个比较内容，复制缺失或不同的文件，并删除受管目录中 output/ 没有的文件。
+
+--git-index：同步后用 `git update-index --add --remove --stdin` 只为变动的路径写入 blob 并更新索引，
+之后直接 git commit，不需要 git add -A 扫描整个仓库。
+"""
+import os
+import subprocess
+import sys
+
+import asset_deploy
+import deploy_delta
+import generate_index
+from hash_cache import sha256_file
+
+# 镜像模式下会清理多余文件的目录（与原先推送步骤 rm -rf 的目录一致）
+SYNC_MANAGED_DIRS = (
+    "chart",
+    "music",
+    "illustration",
+    "illustrationBlur",
+    "illustrationLowRes",
+    "avatar",
+    "avatar-atlas",
+    "info",
+    "phira",
+)
+
+
+def _full_path(root, web_path):
+    return os.path.join(root, *web_path.split("/"))
+
+
+def _walk_public(root):
+    """root 下所有非隐藏文件的 Web 路径。"""
+    paths = set()
+    for dirpath, dirs, files in os.walk(root):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        for name in files:
+            if not name.startswith("."):
+                paths.add(os.path.relpath(os.path.join(dirpath, name), root).replace(os.sep, "/"))
+    return paths
+
+
+def plan_sync(output_dir, target_dir):
+    """
+    返回 {"mode", "copy": [路径], "delete": [路径]}。
+    mode 为 "delta"（两边都有清单）或 "mirror"。
+    """
+    checksum_name = generate_index.CHECKSUM_FILENAME
+    current = deploy_delta.load_checksums(_full_path(output_dir, checksum_name))
+    previous = deploy_delta.load_checksums(_full_path(target_dir, checksum_name))
+
+    if current is not None and previous is not None:
+        delta = deploy_delta.diff_checksums(previous, current)
+        copy = set(deploy_delta.build_upload_list(output_dir, delta, current))
+        # 未变的文件若在检出中缺失（例如上次推送中断）也要补上
+        for web_path, digest in current.items():
+            if web_path in copy:
+                continue
+            for path in [web_path, *deploy_delta.companion_paths(output_dir, web_path, digest)]:
+                if not os.path.exists(_full_path(target_dir, path)):
+                    copy.add(path)
+        return {"mode": "delta", "copy": sorted(copy), "delete": deploy_delta.build_removed_list(delta, previous)}
+
+    source_files = _walk_public(output_dir)
+    copy = []
+    for web_path in sorted(source_files):
+        source_path = _full_path(output_dir, web_path)
+        target_path = _full_path(target_dir, web_path)
+        if (
+            not os.path.exists(target_path)
+            or os.path.getsize(target_path) != os.path.getsize(source_path)
+            or sha256_file(target_path) != ((current or {}).get(web_path) or sha256_file(source_path))
+        ):
+            copy.append(web_path)
+    delete = []
+    for managed in SYNC_MANAGED_DIRS:
+        managed_root = _full_path(target_dir, managed)
+        if os.path.isdir(managed_root):
+            delete.extend(f"{managed}/{path}" for path in sorted(_walk_public(managed_root)) if f"{managed}/{path}" not in source_files)
+    return {"mode": "mirror", "copy": copy, "delete": delete}
+
+
+def apply_sync(output_dir, target_dir, plan):
+    """执行同步，返回 {"copied", "deleted", "bytes"}。目标已存在时先删除再放置。"""
+    copied = deleted = copied_bytes = 0
+    try_reflink = True
+    for web_path in plan["copy"]:
+        source_path = _full_path(output_dir, web_path)
+        target_path = _full_path(target_dir, web_path)
+        if not os.path.isfile(source_path):
+            continue
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        if os.path.lexists(target_path):
+            os.remove(target_path)
+        method = asset_deploy.place_file(source_path, target_path, allow_hardlink=False, try_reflink=try_reflink)
+        try_reflink = method == "reflink"
+        copied += 1
+        copied_bytes += os.path.getsize(target_path)
+    for web_path in plan["delete"]:
+        target_path = _full_path(target_dir, web_path)
+        if os.path.lexists(target_path):
+            os.remove(target_path)
+            deleted += 1
+            _prune_empty_dirs(target_dir, os.path.dirname(target_path))
+    return {"copied": copied, "deleted": deleted, "bytes": copied_bytes}
+
+
+def _prune_empty_dirs(root, directory):
+    root = os.path.abspath(root)
+    directory = os.path.abspath(directory)
+    while directory != root and directory.startswith(root + os.sep):
+        try:
+            os.rmdir(directory)
+        except OSError:
+            return
+        directory = os.path.dirname(directory)
+
+
+def stage_in_git(repo_dir, paths):
+    """只为 paths 更新 git 索引：存在的文件写入 blob 并登记，已删除的从索引移除。"""
+    if not paths:
+        return 0
+    payload = "".join(f"{path}\0" for path in paths).encode("utf-8")
+    subprocess.run(
+        ["git", "-C", repo_dir, "update-index", "--add", "--remove", "-z", "--stdin"],
+        input=payload,
+        check=True,
+    )
+    return len(paths)
+
+
+def sync(output_dir, target_dir, git_index=False):
+    plan = plan_sync(output_dir, target_dir)
+    result = apply_sync(output_dir, target_dir, plan)
+    result["mode"] = plan["mode"]
+    if git_index:
+        result["staged"] = stage_in_git(target_dir, plan["copy"] + plan["delete"])
+    return result
+
+
+def main(argv):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="按校验和清单把 output/ 增量同步到 asset-xtower 检出目录")
+    parser.add_argument("target", help="asset-xtower 检出目录")
+    parser.add_argument("--output", default=generate_index.OUTPUT_DIR)
+    parser.add_argument("--git-index", action="store_true", help="同步后只为变动的路径更新 git 索引")
+    args = parser.parse_args(argv)
+    return run(args.output, args.target, git_index=args.git_index)
+
+
+def run(output_dir, target_dir, git_index=False):
+    """同步并打印摘要（main.py sync 子命令与本模块命令行共用）。"""
+    result = sync(output_dir, target_dir, git_index=git_index)
+    staged = f"，已登记到 git 索引 {result['staged']} 条" if "staged" in result else ""
+    print(
+        f"同步完成 ({result['mode']}): 复制 {result['copied']} 个文件 ({result['bytes'] / 1024 / 1024:.1f} MB)，"
+        f"删除 {result['deleted']} 个{staged}"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,272 @@
+// 搜索内核：Worker 与主线程回退路径共用，不依赖 DOM。
+(function (global) {
+  "use strict";
+
+  const RESOURCE_TYPES = [
+    ["illustration", "ill"],
+    ["music", "music"],
+    ["chart", "chart"],
+    ["avatar", "avatar"],
+    ["phira", "phira"],
+    ["chap", "chap"],
+    ["info", "info"],
+    ["lilith", "lilith"]
+  ];
+  const RESOURCE_TYPE_MAP = new Map(RESOURCE_TYPES);
+
+  function normalizeQuery(value) {
+    return value
+      .normalize("NFKC")
+      .toLowerCase()
+      .replace(/[_\-./\\]+/g, " ")
+      .replace(/\s+/g, " ")
+      .trim();
+  }
+
+  function getResourceType(path) {
+    const prefix = path.split("/", 1)[0].toLowerCase();
+    return RESOURCE_TYPE_MAP.get(prefix) || "file";
+  }
+
+  function buildRecord(path) {
+    const prefix = path.split("/", 1)[0].toLowerCase();
+    const basename = path.split("/").pop() || path;
+    return {
+      path,
+      prefix,
+      normalizedPath: normalizeQuery(path),
+      normalizedName: normalizeQuery(basename),
+      type: getResourceType(path)
+    };
+  }
+
+  function scoreRecord(record, terms) {
+    let score = 0;
+
+    for (const term of terms) {
+      if (!record.normalizedPath.includes(term)) return -1;
+
+      if (record.prefix === term || record.type === term) score += 120;
+      else if (record.prefix.startsWith(term) || record.type.startsWith(term)) score += 70;
+
+      if (record.normalizedName === term) score += 80;
+      else if (record.normalizedName.startsWith(term)) score += 50;
+      else if (record.normalizedName.includes(term)) score += 30;
+
+      if (record.normalizedPath.startsWith(term)) score += 20;
+      else score += 5;
+    }
+
+    return score;
+  }
+
+  // a 排在 b 之后（更差）时返回 true，与旧版 sort 的顺序保持一致。
+  function isWorse(a, b) {
+    if (a.score !== b.score) return a.score < b.score;
+    return a.record.path.localeCompare(b.record.path) > 0;
+  }
+
+  // 容量为 limit 的小顶堆：堆顶是当前保留结果里最差的一条，新结果只需和它比较。
+  class TopK {
+    constructor(limit) {
+      this.limit = limit;
+      this.heap = [];
+    }
+
+    push(entry) {
+      const heap = this.heap;
+      if (heap.length < this.limit) {
+        heap.push(entry);
+        this.siftUp(heap.length - 1);
+      } else if (this.limit > 0 && isWorse(heap[0], entry)) {
+        heap[0] = entry;
+        this.siftDown(0);
+      }
+    }
+
+    siftUp(index) {
+      const heap = this.heap;
+      while (index > 0) {
+        const parent = (index - 1) >> 1;
+        if (!isWorse(heap[index], heap[parent])) break;
+        [heap[index], heap[parent]] = [heap[parent], heap[index]];
+        index = parent;
+      }
+    }
+
+    siftDown(index) {
+      const heap = this.heap;
+      for (;;) {
+        const left = index * 2 + 1;
+        const right = left + 1;
+        let worst = index;
+        if (left < heap.length && isWorse(heap[left], heap[worst])) worst = left;
+        if (right < heap.length && isWorse(heap[right], heap[worst])) worst = right;
+        if (worst === index) return;
+        [heap[index], heap[worst]] = [heap[worst], heap[index]];
+        index = worst;
+      }
+    }
+
+    sorted() {
+      return this.heap.slice().sort((a, b) => (isWorse(a, b) ? 1 : isWorse(b, a) ? -1 : 0));
+    }
+  }
+
+  function parseTerms(query) {
+    const normalized = normalizeQuery(query);
+    return normalized ? normalized.split(" ") : [];
+  }
+
+  function scanRecords(records, terms, topK, start, end) {
+    for (let i = start; i < end; i++) {
+      const score = scoreRecord(records[i], terms);
+      if (score >= 0) topK.push({ record: records[i], score });
+    }
+  }
+
+  function buildHighlightRegex(query) {
+    const terms = query.split(/\s+/).filter((term) => term.length > 0);
+    if (!terms.length) return null;
+
+    const escapedTerms = terms.map((term) => term.replace(/[.*+?^${}()|[\]\\]/g, "\\$&"));
+    return new RegExp(`(${escapedTerms.join("|")})`, "gi");
+  }
+
+  // 返回 [start, end) 区间列表，渲染时直接切片，主线程不再为每条结果构造正则。
+  function highlightRanges(text, regex) {
+    if (!regex) return [];
+    const ranges = [];
+    regex.lastIndex = 0;
+    let match;
+    while ((match = regex.exec(text)) !== null) {
+      if (match[0].length === 0) {
+        regex.lastIndex++;
+        continue;
+      }
+      ranges.push([match.index, match.index + match[0].length]);
+    }
+    return ranges;
+  }
+
+  function toResults(entries, query) {
+    const regex = buildHighlightRegex(query);
+    return entries.map(({ record }) => ({
+      path: record.path,
+      type: record.type,
+      ranges: highlightRanges(record.path, regex)
+    }));
+  }
+
+  function search(records, query, limit) {
+    const terms = parseTerms(query);
+    if (!terms.length) return [];
+    const topK = new TopK(limit);
+    scanRecords(records, terms, topK, 0, records.length);
+    return toResults(topK.sorted(), query);
+  }
+
+  // ---- 紧凑索引 (index/manifest.json + 分片 + 增量) ----
+  const INDEX_CACHE_NAME = "somnia-index-v1";
+
+  function frontDecode(encoded) {
+    const paths = [];
+    let previous = "";
+    for (let i = 0; i < encoded.length; i += 2) {
+      previous = previous.slice(0, encoded[i]) + encoded[i + 1];
+      paths.push(previous);
+    }
+    return paths;
+  }
+
+  function applyDelta(paths, delta) {
+    const removed = new Set(frontDecode(delta.remove));
+    const result = paths.filter((path) => !removed.has(path));
+    return result.concat(frontDecode(delta.add)).sort();
+  }
+
+  async function fetchJson(url, options) {
+    const response = await fetch(url, { credentials: "same-origin", ...options });
+    if (!response.ok) throw new Error(`HTTP ${response.status}`);
+    return response.json();
+  }
+
+  async function openIndexCache() {
+    try {
+      return typeof caches !== "undefined" ? await caches.open(INDEX_CACHE_NAME) : null;
+    } catch (_error) {
+      return null;
+    }
+  }
+
+  async function loadShard(indexUrl, name, info, cache) {
+    const cacheKey = new URL(`__shard__/${encodeURIComponent(name)}`, indexUrl).href;
+    let cached = null;
+    if (cache) {
+      try {
+        const hit = await cache.match(cacheKey);
+        if (hit) cached = await hit.json();
+      } catch (_error) {
+        cached = null;
+      }
+    }
+    if (cached && cached.hash === info.hash) return cached.paths;
+
+    let paths = null;
+    const deltaFile = cached && info.deltas ? info.deltas[cached.hash] : null;
+    if (deltaFile) {
+      try {
+        paths = applyDelta(cached.paths, await fetchJson(new URL(deltaFile, indexUrl)));
+        // 增量结果与清单计数不符时放弃，改拉完整分片。
+        if (paths.length !== info.count) paths = null;
+      } catch (_error) {
+        paths = null;
+      }
+    }
+    if (!paths) paths = frontDecode((await fetchJson(new URL(info.file, indexUrl))).p);
+
+    if (cache) {
+      try {
+        await cache.put(cacheKey, new Response(JSON.stringify({ hash: info.hash, paths })));
+      } catch (_error) {
+        // 缓存写入失败只影响下次加载速度。
+      }
+    }
+    return paths;
+  }
+
+  async function loadIndexPaths(indexUrl) {
+    const manifest = await fetchJson(new URL("manifest.json", indexUrl), { cache: "no-cache" });
+    const cache = await openIndexCache();
+    const names = Object.keys(manifest.shards || {}).sort();
+    const lists = await Promise.all(names.map((name) => loadShard(indexUrl, name, manifest.shards[name], cache)));
+    return [].concat(...lists);
+  }
+
+  // 优先加载紧凑索引，站点未生成 index/ 时回退到 files.json。
+  async function loadPaths(indexUrl, filesUrl) {
+    try {
+      return await loadIndexPaths(indexUrl);
+    } catch (_error) {
+      const files = await fetchJson(filesUrl);
+      return Array.isArray(files) ? files.filter((file) => typeof file === "string") : [];
+    }
+  }
+
+  global.SearchEngine = {
+    RESOURCE_TYPES,
+    TopK,
+    applyDelta,
+    frontDecode,
+    loadPaths,
+    buildRecord,
+    getResourceType,
+    highlightRanges,
+    normalizeQuery,
+    parseTerms,
+    scanRecords,
+    scoreRecord,
+    search,
+    toResults
+  };
+})(typeof self !== "undefined" ? self : globalThis);
@@ -0,0 +1,51 @@
+// 搜索 Worker：持有预处理后的记录，主线程只负责渲染。
+importScripts("search-engine.js");
+
+const RESULT_LIMIT = 20;
+// 每扫描这么多条记录让出一次事件循环，使新的查询能及时打断旧查询。
+const SCAN_CHUNK_SIZE = 4000;
+
+let records = [];
+let latestQueryId = 0;
+
+function yieldToEventLoop() {
+  return new Promise((resolve) => setTimeout(resolve, 0));
+}
+
+async function loadFiles(indexUrl, filesUrl) {
+  try {
+    const paths = await SearchEngine.loadPaths(indexUrl, filesUrl);
+    records = paths.map(SearchEngine.buildRecord);
+    self.postMessage({ type: "ready", count: records.length });
+  } catch (error) {
+    self.postMessage({ type: "error", message: String(error && error.message ? error.message : error) });
+  }
+}
+
+async function runQuery(id, query) {
+  const terms = SearchEngine.parseTerms(query);
+  if (!terms.length) {
+    self.postMessage({ type: "results", id, query, results: [] });
+    return;
+  }
+
+  const topK = new SearchEngine.TopK(RESULT_LIMIT);
+  for (let start = 0; start < records.length; start += SCAN_CHUNK_SIZE) {
+    if (id !== latestQueryId) return;
+    SearchEngine.scanRecords(records, terms, topK, start, Math.min(records.length, start + SCAN_CHUNK_SIZE));
+    if (start + SCAN_CHUNK_SIZE < records.length) await yieldToEventLoop();
+  }
+  if (id !== latestQueryId) return;
+
+  self.postMessage({ type: "results", id, query, results: SearchEngine.toResults(topK.sorted(), query) });
+}
+
+self.onmessage = (event) => {
+  const message = event.data || {};
+  if (message.type === "load") {
+    loadFiles(message.indexUrl, message.filesUrl);
+  } else if (message.type === "query") {
+    latestQueryId = message.id;
+    runQuery(message.id, message.query);
+  }
+};
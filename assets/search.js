@@ -10,12 +10,15 @@ const UI = {
 };
 
 const State = {
-  files: [],
   records: [],
   selectedIndex: -1,
-  isLoading: true
+  isLoading: true,
+  worker: null,
+  queryId: 0
 };
 
+const RESULT_LIMIT = 20;
+
 const QUICK_ACTIONS = [
   { label: "曲绘", query: "illustration" },
   { label: "音频", query: "music" },
@@ -23,17 +26,6 @@ const QUICK_ACTIONS = [
   { label: "信息", query: "info" }
 ];
 
-const RESOURCE_TYPES = [
-  ["illustration", "ill"],
-  ["music", "music"],
-  ["chart", "chart"],
-  ["avatar", "avatar"],
-  ["phira", "phira"],
-  ["chap", "chap"],
-  ["info", "info"],
-  ["lilith", "lilith"]
-];
-
 function getViewportHeight() {
   return window.visualViewport ? window.visualViewport.height : window.innerHeight;
 }
@@ -63,33 +55,6 @@ function schedulePositionResults() {
   });
 }
 
-function normalizeQuery(value) {
-  return value
-    .normalize("NFKC")
-    .toLowerCase()
-    .replace(/[_\-./\\]+/g, " ")
-    .replace(/\s+/g, " ")
-    .trim();
-}
-
-function getResourceType(path) {
-  const prefix = path.split("/", 1)[0].toLowerCase();
-  const found = RESOURCE_TYPES.find(([key]) => key === prefix);
-  return found ? found[1] : "file";
-}
-
-function buildRecord(path) {
-  const prefix = path.split("/", 1)[0].toLowerCase();
-  const basename = path.split("/").pop() || path;
-  return {
-    path,
-    prefix,
-    normalizedPath: normalizeQuery(path),
-    normalizedName: normalizeQuery(basename),
-    type: getResourceType(path)
-  };
-}
-
 async function loadVersion() {
   const candidates = ["info/version.txt", "version.txt"];
 
@@ -109,89 +74,114 @@ async function loadVersion() {
   }
 }
 
-async function initSystem() {
-  loadVersion();
+function onSystemReady() {
+  State.isLoading = false;
+  UI.input.disabled = false;
+  UI.input.placeholder = "Search resources...";
+  UI.statusText.textContent = "OPERATIONAL";
+  UI.loader.classList.remove("active");
 
-  try {
-    UI.loader.classList.add("active");
-    const response = await fetch("files.json", { credentials: "same-origin" });
-    if (!response.ok) throw new Error(`HTTP ${response.status}`);
-
-    const files = await response.json();
-    State.files = Array.isArray(files) ? files.filter((file) => typeof file === "string") : [];
-    State.records = State.files.map(buildRecord);
-    State.isLoading = false;
-    UI.input.disabled = false;
-    UI.input.placeholder = "Search resources...";
-    UI.statusText.textContent = "OPERATIONAL";
-    UI.loader.classList.remove("active");
-
-    if (window.matchMedia("(min-width: 768px)").matches) {
-      UI.input.focus();
-    }
-  } catch (error) {
-    console.error("System Failure:", error);
-    UI.input.placeholder = "信号丢失";
-    UI.input.classList.add("error");
-    UI.statusDot.classList.add("error");
-    UI.statusText.textContent = "OFFLINE";
-    UI.loader.classList.remove("active");
-    UI.input.disabled = false;
+  if (window.matchMedia("(min-width: 768px)").matches) {
+    UI.input.focus();
   }
+  if (UI.input.value.trim()) onInputValueChanged(UI.input.value);
 }
 
-function scoreRecord(record, terms) {
-  let score = 0;
-
-  for (const term of terms) {
-    if (!record.normalizedPath.includes(term)) return -1;
+function onSystemFailure(error) {
+  console.error("System Failure:", error);
+  UI.input.placeholder = "信号丢失";
+  UI.input.classList.add("error");
+  UI.statusDot.classList.add("error");
+  UI.statusText.textContent = "OFFLINE";
+  UI.loader.classList.remove("active");
+  UI.input.disabled = false;
+}
 
-    if (record.prefix === term || record.type === term) score += 120;
-    else if (record.prefix.startsWith(term) || record.type.startsWith(term)) score += 70;
+async function loadRecordsOnMainThread(urls) {
+  const paths = await SearchEngine.loadPaths(urls.indexUrl, urls.filesUrl);
+  State.records = paths.map(SearchEngine.buildRecord);
+}
 
-    if (record.normalizedName === term) score += 80;
-    else if (record.normalizedName.startsWith(term)) score += 50;
-    else if (record.normalizedName.includes(term)) score += 30;
+function startWorker(urls) {
+  const worker = new Worker("assets/search-worker.js");
+  worker.onmessage = (event) => {
+    const message = event.data || {};
+    if (message.type === "ready") {
+      onSystemReady();
+    } else if (message.type === "results") {
+      // 只渲染最新一次查询的结果，过期结果直接丢弃。
+      if (message.id === State.queryId) renderResults(message.results, message.query);
+    } else if (message.type === "error") {
+      onSystemFailure(new Error(message.message));
+    }
+  };
+  worker.onerror = (event) => {
+    event.preventDefault();
+    worker.terminate();
+    State.worker = null;
+    // Worker 无法启动（如 file:// 打开）时回退到主线程搜索。
+    initMainThreadSearch(urls);
+  };
+  worker.postMessage({ type: "load", ...urls });
+  State.worker = worker;
+}
 
-    if (record.normalizedPath.startsWith(term)) score += 20;
-    else score += 5;
+async function initMainThreadSearch(urls) {
+  try {
+    await loadRecordsOnMainThread(urls);
+    onSystemReady();
+  } catch (error) {
+    onSystemFailure(error);
   }
+}
+
+function initSystem() {
+  loadVersion();
+  UI.loader.classList.add("active");
 
-  return score;
+  const urls = {
+    indexUrl: new URL("index/", document.baseURI).href,
+    filesUrl: new URL("files.json", document.baseURI).href
+  };
+  if (typeof Worker === "function") {
+    try {
+      startWorker(urls);
+      return;
+    } catch (_error) {
+      State.worker = null;
+    }
+  }
+  initMainThreadSearch(urls);
 }
 
-function filterData(query) {
-  const normalized = normalizeQuery(query);
-  if (!normalized) return [];
-
-  const terms = normalized.split(" ");
-  return State.records
-    .map((record) => ({ record, score: scoreRecord(record, terms) }))
-    .filter((entry) => entry.score >= 0)
-    .sort((a, b) => b.score - a.score || a.record.path.localeCompare(b.record.path))
-    .slice(0, 20)
-    .map((entry) => entry.record);
+function requestSearch(query) {
+  State.queryId += 1;
+  const id = State.queryId;
+  if (State.worker) {
+    State.worker.postMessage({ type: "query", id, query });
+    return;
+  }
+  renderResults(SearchEngine.search(State.records, query, RESULT_LIMIT), query);
 }
 
 function toSafeHref(path) {
   return path.split("/").map((segment) => encodeURIComponent(segment)).join("/");
 }
 
-function appendHighlightedText(container, text, regex) {
-  regex.lastIndex = 0;
+function setHighlightedText(container, text, ranges) {
+  container.textContent = "";
   let lastIndex = 0;
-  let match;
 
-  while ((match = regex.exec(text)) !== null) {
-    if (match.index > lastIndex) {
-      container.appendChild(document.createTextNode(text.slice(lastIndex, match.index)));
+  for (const [start, end] of ranges) {
+    if (start > lastIndex) {
+      container.appendChild(document.createTextNode(text.slice(lastIndex, start)));
     }
 
     const span = document.createElement("span");
     span.className = "highlight";
-    span.textContent = match[0];
+    span.textContent = text.slice(start, end);
     container.appendChild(span);
-    lastIndex = match.index + match[0].length;
+    lastIndex = end;
   }
 
   if (lastIndex < text.length) {
@@ -199,39 +189,40 @@ function appendHighlightedText(container, text, regex) {
   }
 }
 
-function buildHighlightRegex(query) {
-  const terms = query.split(/\s+/).filter((term) => term.length > 0);
-  if (!terms.length) return null;
-
-  const escapedTerms = terms.map((term) => term.replace(/[.*+?^${}()|[\]\\]/g, "\\$&"));
-  return new RegExp(`(${escapedTerms.join("|")})`, "gi");
-}
-
-function createResultItem(record, index, query) {
+function createResultItem() {
   const item = document.createElement("a");
-  item.href = toSafeHref(record.path);
   item.className = "result-item";
   item.role = "option";
-  item.setAttribute("aria-label", record.path);
-  item.id = `result-${index}`;
   item.target = "_blank";
   item.rel = "noopener noreferrer";
 
   const type = document.createElement("span");
   type.className = "result-type";
-  type.textContent = record.type;
   item.appendChild(type);
 
   const path = document.createElement("span");
   path.className = "result-path";
-  const regex = buildHighlightRegex(query);
-  if (regex) appendHighlightedText(path, record.path, regex);
-  else path.textContent = record.path;
   item.appendChild(path);
 
   return item;
 }
 
+// 只改动与上次渲染不同的部分，复用已有的结果节点。
+function patchResultItem(item, result, index) {
+  item.id = `result-${index}`;
+  item.setAttribute("aria-selected", "false");
+
+  const rangesKey = result.ranges.map((range) => range.join("-")).join(",");
+  if (item.dataset.path === result.path && item.dataset.ranges === rangesKey) return;
+
+  item.dataset.path = result.path;
+  item.dataset.ranges = rangesKey;
+  item.href = toSafeHref(result.path);
+  item.setAttribute("aria-label", result.path);
+  item.firstChild.textContent = result.type;
+  setHighlightedText(item.lastChild, result.path, result.ranges);
+}
+
 function showResults() {
   UI.results.classList.add("show");
   UI.input.setAttribute("aria-expanded", "true");
@@ -244,6 +235,8 @@ function hideResults() {
 }
 
 function renderQuickActions() {
+  // 作废仍在 Worker 里计算的查询，避免清空输入后旧结果又覆盖快捷入口。
+  State.queryId += 1;
   UI.results.innerHTML = "";
   State.selectedIndex = -1;
   UI.input.removeAttribute("aria-activedescendant");
@@ -272,8 +265,18 @@ function renderQuickActions() {
   showResults();
 }
 
-function renderResults(matches, query) {
+function renderMessage(text) {
   UI.results.innerHTML = "";
+  const div = document.createElement("div");
+  div.className = "result-empty";
+  div.role = "option";
+  div.setAttribute("aria-disabled", "true");
+  div.textContent = text;
+  UI.results.appendChild(div);
+  showResults();
+}
+
+function renderResults(matches, query) {
   State.selectedIndex = -1;
   UI.input.removeAttribute("aria-activedescendant");
 
@@ -283,19 +286,28 @@ function renderResults(matches, query) {
   }
 
   if (matches.length === 0) {
-    const div = document.createElement("div");
-    div.className = "result-empty";
-    div.role = "option";
-    div.setAttribute("aria-disabled", "true");
-    div.textContent = "No echoes found.";
-    UI.results.appendChild(div);
-    showResults();
+    renderMessage("No echoes found.");
     return;
   }
 
-  const fragment = document.createDocumentFragment();
-  matches.forEach((record, index) => fragment.appendChild(createResultItem(record, index, query)));
-  UI.results.appendChild(fragment);
+  // 快捷入口和空状态不是结果节点，切换回结果列表时先清掉。
+  const existing = Array.from(UI.results.children);
+  if (existing.some((node) => !node.classList.contains("result-item"))) {
+    UI.results.innerHTML = "";
+    existing.length = 0;
+  }
+
+  matches.forEach((result, index) => {
+    let item = existing[index];
+    if (!item) {
+      item = createResultItem();
+      UI.results.appendChild(item);
+    }
+    patchResultItem(item, result, index);
+  });
+  for (let index = matches.length; index < existing.length; index++) {
+    existing[index].remove();
+  }
   showResults();
 }
 
@@ -304,7 +316,12 @@ function onInputValueChanged(rawValue) {
   const value = rawValue.trim();
   UI.clearBtn.classList.toggle("visible", value.length > 0);
   UI.body.classList.toggle("searching", value.length > 0);
-  renderResults(filterData(value), value);
+  if (!value) {
+    renderResults([], value);
+    return;
+  }
+  if (State.isLoading) return;
+  requestSearch(value);
 }
 
 UI.input.addEventListener("input", (event) => {
@@ -0,0 +1,257 @@
+"""头像图集：把 avatar/*.png 打包成少数几张图集（PNG + WebP / AVIF）并生成坐标索引。
+
+产物（output/avatar-atlas/）：
+  atlas-<页>.<扩展名>  每页最大 AVATAR_ATLAS_SIZE × AVATAR_ATLAS_SIZE，裁到实际使用的范围
+  index.json           {"version", "padding", "pages": [{"name", "width", "height", "formats", "hash"}],
+                        "avatars": {头像名: [页, x, y, 宽, 高]}, "sources": {头像名: sha256}}
+前端按 pages[页].name + 扩展名取图（hash 可作为查询参数破缓存），再按坐标裁出头像。
+
+装箱使用 MaxRects（最短边最佳匹配）。增量重建：内容与尺寸都没变的头像保持原坐标，
+先占住它们的位置，再把新增 / 变更的头像按面积从大到小放进空闲区域；
+只有放入了新头像或移除了头像的页才重新合成与编码，其余页的文件原样保留。
+"""
+import hashlib
+import json
+import os
+import sys
+
+from image_export import FILE_EXTENSION, PreparedImage, iter_image_variant_payloads, resolve_export_formats
+from hash_cache import sha256_file
+
+ATLAS_DIR_NAME = "avatar-atlas"
+ATLAS_INDEX_FILENAME = "index.json"
+ATLAS_VERSION = 1
+DEFAULT_ATLAS_SIZE = 2048
+# 相邻头像之间留出的像素，避免缩放采样时串色
+DEFAULT_PADDING = 2
+DEFAULT_ATLAS_FORMATS = ("png", "webp", "avif")
+
+
+class MaxRectsBin:
+    """MaxRects 装箱：维护互相可重叠的极大空闲矩形，放置时选短边剩余最小的位置。"""
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.free = [(0, 0, width, height)]
+
+    def find(self, width, height):
+        """返回 (x, y) 或 None。"""
+        best = None
+        best_score = None
+        for fx, fy, fw, fh in self.free:
+            if width <= fw and height <= fh:
+                score = (min(fw - width, fh - height), max(fw - width, fh - height), fy, fx)
+                if best_score is None or score < best_score:
+                    best, best_score = (fx, fy), score
+        return best
+
+    def insert(self, width, height):
+        position = self.find(width, height)
+        if position is not None:
+            self.occupy(position[0], position[1], width, height)
+        return position
+
+    def occupy(self, x, y, width, height):
+        """把矩形从所有空闲区域中切掉（用于新放置以及增量时保留的旧位置）。"""
+        split = []
+        for fx, fy, fw, fh in self.free:
+            if x >= fx + fw or x + width <= fx or y >= fy + fh or y + height <= fy:
+                split.append((fx, fy, fw, fh))
+                continue
+            if x > fx:
+                split.append((fx, fy, x - fx, fh))
+            if x + width < fx + fw:
+                split.append((x + width, fy, fx + fw - x - width, fh))
+            if y > fy:
+                split.append((fx, fy, fw, y - fy))
+            if y + height < fy + fh:
+                split.append((fx, y + height, fw, fy + fh - y - height))
+        self.free = self._prune(split)
+
+    @staticmethod
+    def _prune(rects):
+        """去掉被其他空闲矩形完全包含的矩形。"""
+        rects = sorted(set(rects), key=lambda r: -r[2] * r[3])
+        kept = []
+        for rect in rects:
+            x, y, w, h = rect
+            if not any(kx <= x and ky <= y and x + w <= kx + kw and y + h <= ky + kh for kx, ky, kw, kh in kept):
+                kept.append(rect)
+        return kept
+
+
+def pack(sizes, atlas_size, padding, fixed=None):
+    """
+    sizes: {名称: (宽, 高)}，需要放置的头像；fixed: {名称: (页, x, y, 宽, 高)}，保持不动的旧位置。
+    返回 {名称: (页, x, y, 宽, 高)}（含 fixed）。单张超过图集大小的头像抛出 ValueError。
+    """
+    placements = dict(fixed or {})
+    bins = []
+
+    def page_bin(page):
+        while len(bins) <= page:
+            bins.append(MaxRectsBin(atlas_size, atlas_size))
+        return bins[page]
+
+    for page, x, y, width, height in placements.values():
+        page_bin(page).occupy(x, y, min(width + padding, atlas_size - x), min(height + padding, atlas_size - y))
+
+    order = sorted(sizes, key=lambda name: (-sizes[name][0] * sizes[name][1], -max(sizes[name]), name))
+    for name in order:
+        width, height = sizes[name]
+        if width > atlas_size or height > atlas_size:
+            raise ValueError(f"头像 {name} ({width}x{height}) 超过图集大小 {atlas_size}")
+        padded = (min(width + padding, atlas_size), min(height + padding, atlas_size))
+        for page in range(len(bins) + 1):
+            position = page_bin(page).insert(*padded)
+            if position is not None:
+                placements[name] = (page, position[0], position[1], width, height)
+                break
+    return placements
+
+
+def load_index(atlas_dir):
+    try:
+        with open(os.path.join(atlas_dir, ATLAS_INDEX_FILENAME), "r", encoding="utf-8") as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return index if index.get("version") == ATLAS_VERSION else None
+
+
+def scan_avatars(avatar_dir):
+    """返回 {头像名: (sha256, 宽, 高)}；只读取 PNG 头部取尺寸。"""
+    from PIL import Image
+
+    avatars = {}
+    if not os.path.isdir(avatar_dir):
+        return avatars
+    for name in sorted(os.listdir(avatar_dir)):
+        if not name.lower().endswith(".png"):
+            continue
+        path = os.path.join(avatar_dir, name)
+        with Image.open(path) as image:
+            avatars[name[:-4]] = (sha256_file(path), *image.size)
+    return avatars
+
+
+def plan_atlas(avatars, previous, atlas_size, padding):
+    """
+    返回 (placements, dirty_pages)。previous 的打包参数不同时全部重新装箱。
+    """
+    fixed = {}
+    if previous and previous.get("padding") == padding and previous.get("size") == atlas_size:
+        for name, placement in previous["avatars"].items():
+            digest, width, height = avatars.get(name, (None, 0, 0))
+            if digest == previous["sources"].get(name) and (width, height) == tuple(placement[3:]):
+                fixed[name] = tuple(placement)
+    pending = {name: (width, height) for name, (_, width, height) in avatars.items() if name not in fixed}
+    placements = pack(pending, atlas_size, padding, fixed)
+
+    previous_pages = {name: placement[0] for name, placement in (previous or {}).get("avatars", {}).items()}
+    dirty = {placements[name][0] for name in pending}
+    # 被移除或挪走的头像会在原页留下残影，该页也需重画
+    dirty |= {page for name, page in previous_pages.items() if name not in fixed}
+
+    # 头像全部移除后中间可能出现空页：页号压紧，换了页号的页按新文件名重画
+    used = sorted({placement[0] for placement in placements.values()})
+    renumber = {page: index for index, page in enumerate(used)}
+    placements = {name: (renumber[placement[0]], *placement[1:]) for name, placement in placements.items()}
+    dirty = {renumber[page] for page in dirty if page in renumber}
+    dirty |= {index for page, index in renumber.items() if page != index}
+    previous_count = len(previous.get("pages", [])) if previous else 0
+    dirty |= set(range(previous_count, len(used)))
+    return placements, dirty
+
+
+def render_page(avatar_dir, placements, page):
+    from PIL import Image
+
+    members = [(name, placement) for name, placement in placements.items() if placement[0] == page]
+    width = max(x + w for _, (_, x, _, w, _) in members)
+    height = max(y + h for _, (_, _, y, _, h) in members)
+    atlas = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    for name, (_, x, y, _, _) in members:
+        with Image.open(os.path.join(avatar_dir, f"{name}.png")) as image:
+            atlas.paste(image.convert("RGBA"), (x, y))
+    return atlas
+
+
+def build_avatar_atlas(output_dir, atlas_size=DEFAULT_ATLAS_SIZE, padding=DEFAULT_PADDING, formats=None, logger=print):
+    """
+    生成或增量更新头像图集，返回 {"avatars", "pages", "rebuilt": [页]}；没有头像时返回 None。
+    """
+    avatar_dir = os.path.join(output_dir, "avatar")
+    atlas_dir = os.path.join(output_dir, ATLAS_DIR_NAME)
+    avatars = scan_avatars(avatar_dir)
+    if not avatars:
+        return None
+    formats = tuple(formats or resolve_export_formats(os.environ.get("AVATAR_ATLAS_FORMATS"), DEFAULT_ATLAS_FORMATS, logger=logger))
+
+    previous = load_index(atlas_dir)
+    if previous and tuple(previous.get("formats", ())) != formats:
+        previous = None
+    placements, dirty = plan_atlas(avatars, previous, atlas_size, padding)
+    page_count = max(placement[0] for placement in placements.values()) + 1
+    # 页文件被删掉时同样需要重画
+    dirty |= {
+        page for page in range(page_count)
+        if not all(os.path.exists(os.path.join(atlas_dir, f"atlas-{page}.{FILE_EXTENSION[fmt]}")) for fmt in formats)
+    }
+
+    os.makedirs(atlas_dir, exist_ok=True)
+    pages = list(previous["pages"][:page_count]) if previous else []
+    for page in sorted(dirty):
+        image = render_page(avatar_dir, placements, page)
+        name = f"atlas-{page}"
+        digest = hashlib.sha256()
+        for rel_path, payload in iter_image_variant_payloads(PreparedImage(image), name, formats, logger=logger):
+            data = payload.getvalue()
+            digest.update(data)
+            with open(os.path.join(atlas_dir, rel_path), "wb") as f:
+                f.write(data)
+        entry = {"name": name, "width": image.width, "height": image.height, "formats": list(formats), "hash": digest.hexdigest()[:16]}
+        if page < len(pages):
+            pages[page] = entry
+        else:
+            pages.append(entry)
+
+    # 页数减少时删除多余的页文件
+    for entry in (previous or {}).get("pages", [])[page_count:]:
+        for fmt in entry["formats"]:
+            stale = os.path.join(atlas_dir, f"{entry['name']}.{FILE_EXTENSION[fmt]}")
+            if os.path.exists(stale):
+                os.remove(stale)
+
+    index = {
+        "version": ATLAS_VERSION,
+        "size": atlas_size,
+        "padding": padding,
+        "formats": list(formats),
+        "pages": pages,
+        "avatars": {name: list(placements[name]) for name in sorted(placements)},
+        "sources": {name: avatars[name][0] for name in sorted(avatars)},
+    }
+    with open(os.path.join(atlas_dir, ATLAS_INDEX_FILENAME), "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, separators=(",", ":"))
+    return {"avatars": len(placements), "pages": page_count, "rebuilt": sorted(dirty)}
+
+
+def main(argv):
+    from resource import _get_int_env
+
+    output_dir = argv[0] if argv else "output"
+    atlas_size = _get_int_env("AVATAR_ATLAS_SIZE", DEFAULT_ATLAS_SIZE, min_value=1)
+    padding = _get_int_env("AVATAR_ATLAS_PADDING", DEFAULT_PADDING, min_value=0)
+    result = build_avatar_atlas(output_dir, atlas_size, padding)
+    if result is None:
+        print("没有头像 (avatar/*.png)，跳过图集生成")
+        return 0
+    rebuilt = ", ".join(map(str, result["rebuilt"])) or "无"
+    print(f"头像图集: {result['avatars']} 个头像，{result['pages']} 页，重新生成的页: {rebuilt}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
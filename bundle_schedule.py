@@ -0,0 +1,156 @@
+"""resource 提取的 bundle 调度：按预估耗时从大到小派发（最长作业优先），减少单线程长尾。
+
+预估耗时 = 类别基础开销 + 类别单价 × 字节数：
+  image（曲绘 / 头像，纹理解码 + 编码，CPU 密集）按 zip 目录中的解压后大小计价；
+  audio（FSB5 → OGG，主要是读取与拷贝）按压缩后大小计价；
+  chart（TextAsset）按解压后大小计价。
+单价优先取上次运行记录的各 bundle 实际耗时（output/.bundle-timings.json，隐藏文件不发布）
+按类别拟合的结果，样本不足时使用内置默认值。
+
+派发顺序在 CPU 密集与 I/O 密集两个队列之间交替，各队列内按预估耗时从大到小；
+运行结束后用实际耗时回放 catalog 原顺序与调度顺序，报告节省的尾部时间。
+"""
+import heapq
+import json
+import os
+
+TIMINGS_FILENAME = ".bundle-timings.json"
+TIMINGS_VERSION = 1
+# 每类至少这么多样本才用拟合结果替换默认值
+MIN_FIT_SAMPLES = 3
+
+CATEGORY_OF_KIND = {
+    "music": "audio",
+    "chart": "chart",
+}
+# 各类别用 zip 目录中的哪个大小计价
+SIZE_FIELD = {
+    "image": "file_size",
+    "audio": "compress_size",
+    "chart": "file_size",
+}
+IO_CATEGORIES = ("audio",)
+# (基础开销秒, 每字节秒)
+DEFAULT_COST_MODEL = {
+    "image": (0.02, 6e-8),
+    "audio": (0.01, 1e-8),
+    "chart": (0.005, 5e-9),
+}
+
+
+def category_of(plan):
+    return CATEGORY_OF_KIND.get(plan["kind"], "image")
+
+
+def load_timings(path):
+    """读取上次运行的 [{"category", "compress_size", "file_size", "seconds"}]，不存在或损坏时返回 []。"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return []
+    if data.get("version") != TIMINGS_VERSION:
+        return []
+    return data.get("samples", [])
+
+
+def save_timings(path, samples):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": TIMINGS_VERSION, "samples": samples}, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def fit_cost_model(samples):
+    """按类别对 seconds ~ base + rate × size 做最小二乘；样本不足或结果不合理时保留默认值。"""
+    model = dict(DEFAULT_COST_MODEL)
+    by_category = {}
+    for sample in samples:
+        field = SIZE_FIELD.get(sample.get("category"))
+        if field is None:
+            continue
+        by_category.setdefault(sample["category"], []).append((sample[field], sample["seconds"]))
+
+    for category, points in by_category.items():
+        if len(points) < MIN_FIT_SAMPLES:
+            continue
+        n = len(points)
+        mean_x = sum(x for x, _ in points) / n
+        mean_y = sum(y for _, y in points) / n
+        var_x = sum((x - mean_x) ** 2 for x, _ in points)
+        if var_x > 0:
+            rate = sum((x - mean_x) * (y - mean_y) for x, y in points) / var_x
+            base = mean_y - rate * mean_x
+        else:
+            rate, base = 0.0, mean_y
+        if rate < 0 or base < 0:
+            # 退化为过原点的比例估计
+            total_x = sum(x for x, _ in points)
+            rate = sum(y for _, y in points) / total_x if total_x else 0.0
+            base = 0.0
+        model[category] = (base, rate)
+    return model
+
+
+def estimate_cost(model, category, sizes):
+    base, rate = model.get(category, DEFAULT_COST_MODEL["image"])
+    return base + rate * sizes.get(SIZE_FIELD.get(category, "file_size"), 0)
+
+
+def build_jobs(groups, plans, sizes, model):
+    """
+    groups: [(作业 id, [(key, bundle), ...])]；sizes: bundle → {"compress_size", "file_size"}。
+    返回 [{"id", "entries", "category", "cost"}]，category 取作业内预估最重的 bundle 的类别。
+    """
+    jobs = []
+    for job_id, entries in groups:
+        heaviest = (-1.0, "image")
+        cost = 0.0
+        for key, bundle in entries:
+            category = category_of(plans[key])
+            bundle_cost = estimate_cost(model, category, sizes.get(bundle, {}))
+            cost += bundle_cost
+            heaviest = max(heaviest, (bundle_cost, category))
+        jobs.append({"id": job_id, "entries": entries, "category": heaviest[1], "cost": cost})
+    return jobs
+
+
+def order_jobs(jobs):
+    """
+    jobs: [{"id", "category", "cost"}]（category 为作业中最重的类别）。
+    返回派发顺序：CPU 与 I/O 两个队列各自按 cost 从大到小，交替取出，先取队首更大的一边。
+    """
+    cpu = sorted((job for job in jobs if job["category"] not in IO_CATEGORIES), key=lambda job: -job["cost"])
+    io = sorted((job for job in jobs if job["category"] in IO_CATEGORIES), key=lambda job: -job["cost"])
+    ordered = []
+    i = j = 0
+    take_cpu = bool(cpu) and (not io or cpu[0]["cost"] >= io[0]["cost"])
+    while i < len(cpu) or j < len(io):
+        if (take_cpu and i < len(cpu)) or j >= len(io):
+            ordered.append(cpu[i])
+            i += 1
+        else:
+            ordered.append(io[j])
+            j += 1
+        take_cpu = not take_cpu
+    return ordered
+
+
+def simulate_makespan(durations, workers):
+    """按给定顺序把作业派给最先空闲的 worker（与 ThreadPoolExecutor 的行为一致），返回总耗时。"""
+    free_at = [0.0] * max(1, workers)
+    for duration in durations:
+        start = heapq.heappop(free_at)
+        heapq.heappush(free_at, start + duration)
+    return max(free_at)
+
+
+def tail_report(original_order, scheduled_order, durations, workers):
+    """
+    用实际耗时 durations（id → 秒）回放两种顺序，返回
+    {"catalog_makespan", "scheduled_makespan", "saved"}。
+    """
+    catalog = simulate_makespan([durations[job_id] for job_id in original_order if job_id in durations], workers)
+    scheduled = simulate_makespan([durations[job_id] for job_id in scheduled_order if job_id in durations], workers)
+    return {"catalog_makespan": catalog, "scheduled_makespan": scheduled, "saved": catalog - scheduled}
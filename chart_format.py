@@ -0,0 +1,404 @@
+"""谱面后处理：规范化压缩 JSON + 紧凑二进制格式。
+
+压缩 JSON 会把恰好是 float32 的小数改写为能还原同一 float32 的最短十进制（float32 规范化）：
+按 float32 读取时数值不变，按 float64 比较则与原值不同（如 0.30000001192092896 → 0.3）。
+
+二进制格式（小端）：
+  头部        "PGCB" | 版本 u8 | 3 字节保留 | 元数据长度 u32
+  元数据      UTF-8 JSON：formatVersion、offset、各判定线 bpm 及其余字段、notes/events 条数
+  对齐        补零到 4 字节边界
+  notes       NOTE_FIELDS 定长记录，按 判定线 → 上/下 → 原顺序 排列
+  events      EVENT_FIELDS 定长记录，按 判定线 → 事件类型 → 原顺序 排列，缺省字段为 NaN
+
+数值统一存为 float32（与游戏内精度一致）。写入只依赖标准库，读取需要 numpy。
+"""
+import json
+import math
+import os
+import struct
+import sys
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+CHART_DIR_NAME = "chart"
+BINARY_EXTENSION = ".bin"
+MAGIC = b"PGCB"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sB3xI")
+
+NOTE_SIDES = ("notesAbove", "notesBelow")
+NOTE_FIELDS = (
+    ("line", "u2"),
+    ("side", "u1"),
+    ("type", "u1"),
+    ("time", "f4"),
+    ("positionX", "f4"),
+    ("holdTime", "f4"),
+    ("speed", "f4"),
+    ("floorPosition", "f4"),
+)
+NOTE_STRUCT = struct.Struct("<HBBfffff")
+
+# speedEvents 的 value 存在 start 列
+EVENT_KINDS = ("speedEvents", "judgeLineMoveEvents", "judgeLineRotateEvents", "judgeLineDisappearEvents")
+EVENT_VALUE_KEYS = ("start", "end", "start2", "end2", "floorPosition")
+EVENT_FIELDS = (
+    ("line", "u2"),
+    ("kind", "u1"),
+    ("_pad", "u1"),
+    ("startTime", "f4"),
+    ("endTime", "f4"),
+    ("start", "f4"),
+    ("end", "f4"),
+    ("start2", "f4"),
+    ("end2", "f4"),
+    ("floorPosition", "f4"),
+)
+EVENT_STRUCT = struct.Struct("<HBxfffffff")
+
+POSTPROCESS_MODES = ("minify", "binary")
+
+_NAN = float("nan")
+_FLOAT32 = struct.Struct("<f")
+
+
+def _to_float32(value):
+    return _FLOAT32.unpack(_FLOAT32.pack(value))[0]
+
+
+def float32_shortest(value):
+    """
+    float32 规范化：谱面里的小数大多是 float32 转出来的（如 0.30000001192092896），
+    这类值改写为能还原同一 float32 的最短十进制。只对 float32 无损，float64 值会变；
+    不是 float32 精确值的小数与整数保持原样。
+    """
+    if not math.isfinite(value) or value == int(value):
+        return value
+    try:
+        as_float32 = _to_float32(value)
+    except OverflowError:
+        return value
+    if as_float32 != value:
+        return value
+    for precision in range(1, 10):
+        candidate = float(f"{value:.{precision}g}")
+        if _to_float32(candidate) == as_float32:
+            return candidate
+    return value
+
+
+def _canonicalize(value):
+    if isinstance(value, float):
+        return float32_shortest(value)
+    if isinstance(value, list):
+        return [_canonicalize(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _canonicalize(item) for key, item in value.items()}
+    return value
+
+
+def minify_chart(data):
+    """返回 float32 规范化后的紧凑 JSON 字节。data 可以是 bytes/str 或已解析的谱面。"""
+    chart = json.loads(data) if isinstance(data, (bytes, bytearray, str)) else data
+    return json.dumps(_canonicalize(chart), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _number(value, default=_NAN):
+    return default if value is None else float(value)
+
+
+def encode_binary_chart(chart):
+    """把已解析的谱面编码为二进制格式。"""
+    lines_meta = []
+    notes = bytearray()
+    events = bytearray()
+    note_count = 0
+    event_count = 0
+
+    for line_index, line in enumerate(chart.get("judgeLineList", [])):
+        meta = {}
+        for key, value in line.items():
+            if key in NOTE_SIDES or key in EVENT_KINDS:
+                meta.setdefault("counts", {})[key] = len(value)
+            else:
+                meta[key] = value
+        lines_meta.append(meta)
+
+        for side, side_key in enumerate(NOTE_SIDES):
+            for note in line.get(side_key, []):
+                notes += NOTE_STRUCT.pack(
+                    line_index,
+                    side,
+                    int(note.get("type", 0)),
+                    _number(note.get("time"), 0.0),
+                    _number(note.get("positionX"), 0.0),
+                    _number(note.get("holdTime"), 0.0),
+                    _number(note.get("speed"), 0.0),
+                    _number(note.get("floorPosition"), 0.0),
+                )
+                note_count += 1
+
+        for kind, kind_key in enumerate(EVENT_KINDS):
+            for event in line.get(kind_key, []):
+                start = event.get("value") if kind_key == "speedEvents" else event.get("start")
+                events += EVENT_STRUCT.pack(
+                    line_index,
+                    kind,
+                    _number(event.get("startTime")),
+                    _number(event.get("endTime")),
+                    _number(start),
+                    _number(event.get("end")),
+                    _number(event.get("start2")),
+                    _number(event.get("end2")),
+                    _number(event.get("floorPosition")),
+                )
+                event_count += 1
+
+    metadata = {key: value for key, value in chart.items() if key != "judgeLineList"}
+    metadata["lines"] = lines_meta
+    metadata["notes"] = note_count
+    metadata["events"] = event_count
+    metadata_bytes = json.dumps(metadata, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    padding = (-(HEADER.size + len(metadata_bytes))) % 4
+
+    return b"".join((
+        HEADER.pack(MAGIC, FORMAT_VERSION, len(metadata_bytes)),
+        metadata_bytes,
+        b"\0" * padding,
+        bytes(notes),
+        bytes(events),
+    ))
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError("读取二进制谱面需要 numpy，请运行 'pip install numpy'")
+
+
+def note_dtype():
+    _require_numpy()
+    return np.dtype([field for field in NOTE_FIELDS])
+
+
+def event_dtype():
+    _require_numpy()
+    return np.dtype([field for field in EVENT_FIELDS])
+
+
+def read_binary_chart(data):
+    """
+    解析二进制谱面，返回 dict：formatVersion/offset 等原有字段、lines（判定线元数据）、
+    notes 与 events（numpy 结构化数组，直接引用 data 的内存，不复制）。
+    """
+    _require_numpy()
+    if isinstance(data, str):
+        with open(data, "rb") as f:
+            data = f.read()
+    magic, version, metadata_length = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError("不是 PGCB 二进制谱面")
+    if version != FORMAT_VERSION:
+        raise ValueError(f"不支持的二进制谱面版本: {version}")
+
+    offset = HEADER.size
+    chart = json.loads(bytes(data[offset:offset + metadata_length]).decode("utf-8"))
+    offset += metadata_length
+    offset += (-offset) % 4
+
+    notes_type = note_dtype()
+    events_type = event_dtype()
+    note_count = chart.pop("notes")
+    event_count = chart.pop("events")
+    chart["notes"] = np.frombuffer(data, dtype=notes_type, count=note_count, offset=offset)
+    offset += note_count * notes_type.itemsize
+    chart["events"] = np.frombuffer(data, dtype=events_type, count=event_count, offset=offset)
+    return chart
+
+
+def binary_chart_to_json(chart):
+    """把 read_binary_chart 的结果还原为官方 JSON 结构（数值为 float32 精度）。"""
+    lines = []
+    notes = chart["notes"]
+    events = chart["events"]
+    note_names = [name for name, _ in NOTE_FIELDS[3:]]
+    for line_index, meta in enumerate(chart["lines"]):
+        line = {key: value for key, value in meta.items() if key != "counts"}
+        counts = meta.get("counts", {})
+        line_notes = notes[notes["line"] == line_index]
+        for side, side_key in enumerate(NOTE_SIDES):
+            if side_key not in counts:
+                continue
+            rows = line_notes[line_notes["side"] == side]
+            line[side_key] = [
+                dict(type=int(row["type"]), **{name: float(row[name]) for name in note_names})
+                for row in rows
+            ]
+        line_events = events[events["line"] == line_index]
+        for kind, kind_key in enumerate(EVENT_KINDS):
+            if kind_key not in counts:
+                continue
+            converted = []
+            for row in line_events[line_events["kind"] == kind]:
+                event = {"startTime": float(row["startTime"]), "endTime": float(row["endTime"])}
+                for key in EVENT_VALUE_KEYS:
+                    value = float(row[key])
+                    if not math.isnan(value):
+                        event["value" if kind_key == "speedEvents" and key == "start" else key] = value
+                converted.append(event)
+            line[kind_key] = converted
+        lines.append(line)
+
+    result = {key: value for key, value in chart.items() if key not in ("lines", "notes", "events")}
+    result["judgeLineList"] = lines
+    return result
+
+
+def iter_chart_files(output_dir):
+    chart_root = os.path.join(output_dir, CHART_DIR_NAME)
+    if not os.path.isdir(chart_root):
+        return
+    for song_dir in sorted(os.listdir(chart_root)):
+        song_path = os.path.join(chart_root, song_dir)
+        if not os.path.isdir(song_path):
+            continue
+        for filename in sorted(os.listdir(song_path)):
+            if filename.endswith(".json"):
+                yield os.path.join(song_path, filename)
+
+
+def parse_postprocess_modes(raw_value):
+    """CHART_POSTPROCESS=minify,binary；1/all 表示全部开启，空值表示关闭。"""
+    tokens = [token.strip().lower() for token in (raw_value or "").replace(";", ",").split(",") if token.strip()]
+    if any(token in ("1", "true", "yes", "all") for token in tokens):
+        return POSTPROCESS_MODES
+    return tuple(mode for mode in POSTPROCESS_MODES if mode in tokens)
+
+
+def new_postprocess_stats():
+    return {"charts": 0, "minified": 0, "binary": 0, "skipped": 0, "errors": 0, "json_bytes_before": 0, "json_bytes_after": 0}
+
+
+def postprocess_chart_file(json_path, modes, stats):
+    """处理单个谱面文件并累加到 stats。二进制比 JSON 新时跳过。"""
+    stats["charts"] += 1
+    binary_path = json_path[:-5] + BINARY_EXTENSION
+    try:
+        json_mtime = os.path.getmtime(json_path)
+        if (
+            "binary" in modes
+            and os.path.exists(binary_path)
+            and os.path.getmtime(binary_path) >= json_mtime
+        ):
+            stats["skipped"] += 1
+            size = os.path.getsize(json_path)
+            stats["json_bytes_before"] += size
+            stats["json_bytes_after"] += size
+            return
+
+        with open(json_path, "rb") as f:
+            raw = f.read()
+        chart = json.loads(raw)
+        stats["json_bytes_before"] += len(raw)
+
+        if "minify" in modes:
+            minified = minify_chart(chart)
+            if minified != raw:
+                with open(json_path, "wb") as f:
+                    f.write(minified)
+                stats["minified"] += 1
+            stats["json_bytes_after"] += len(minified)
+        else:
+            stats["json_bytes_after"] += len(raw)
+
+        if "binary" in modes:
+            with open(binary_path, "wb") as f:
+                f.write(encode_binary_chart(chart))
+            stats["binary"] += 1
+    except (OSError, ValueError, struct.error) as e:
+        stats["errors"] += 1
+        if stats["errors"] <= 5:
+            print(f"谱面后处理失败: {json_path}, 错误: {e}")
+
+
+def postprocess_song_charts(output_dir, song_folder, modes=POSTPROCESS_MODES):
+    """只处理 chart/<song_folder>/ 下的谱面，供 pipeline 按歌曲调度。"""
+    stats = new_postprocess_stats()
+    song_path = os.path.join(output_dir, CHART_DIR_NAME, song_folder)
+    if os.path.isdir(song_path):
+        for filename in sorted(os.listdir(song_path)):
+            if filename.endswith(".json"):
+                postprocess_chart_file(os.path.join(song_path, filename), modes, stats)
+    return stats
+
+
+def postprocess_charts(output_dir="output", modes=POSTPROCESS_MODES):
+    """对 chart/ 下的谱面执行压缩与二进制导出，返回统计。"""
+    stats = new_postprocess_stats()
+    for json_path in iter_chart_files(output_dir):
+        postprocess_chart_file(json_path, modes, stats)
+    return stats
+
+
+def format_postprocess_stats(stats):
+    return (
+        f"谱面 {stats['charts']} 个，压缩 {stats['minified']}，二进制 {stats['binary']}，"
+        f"跳过 {stats['skipped']}，失败 {stats['errors']}；"
+        f"JSON {stats['json_bytes_before']} -> {stats['json_bytes_after']} 字节"
+    )
+
+
+def benchmark_load(output_dir="output", repeat=3):
+    """对比 json.load 与 read_binary_chart 加载全部谱面的耗时（取最好一轮，单位秒）。"""
+    _require_numpy()
+    pairs = [
+        (path, path[:-5] + BINARY_EXTENSION)
+        for path in iter_chart_files(output_dir)
+        if os.path.exists(path[:-5] + BINARY_EXTENSION)
+    ]
+
+    def run(loader, index):
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            for pair in pairs:
+                loader(pair[index])
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best or 0.0
+
+    def load_json(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    return {
+        "charts": len(pairs),
+        "json_seconds": run(load_json, 0),
+        "binary_seconds": run(read_binary_chart, 1),
+        "json_bytes": sum(os.path.getsize(json_path) for json_path, _ in pairs),
+        "binary_bytes": sum(os.path.getsize(binary_path) for _, binary_path in pairs),
+    }
+
+
+def main(argv):
+    output_dir = "output"
+    if "--benchmark" in argv:
+        result = benchmark_load(output_dir)
+        speedup = result["json_seconds"] / result["binary_seconds"] if result["binary_seconds"] else 0
+        print(
+            f"谱面加载对比 ({result['charts']} 个): json.load {result['json_seconds'] * 1000:.1f}ms "
+            f"({result['json_bytes']} 字节), 二进制 {result['binary_seconds'] * 1000:.1f}ms "
+            f"({result['binary_bytes']} 字节), 加速 {speedup:.1f}x"
+        )
+        return
+
+    modes = parse_postprocess_modes(os.environ.get("CHART_POSTPROCESS", "all"))
+    print(f"--- 谱面后处理: {', '.join(modes) or '无'} ---")
+    print(format_postprocess_stats(postprocess_charts(output_dir, modes)))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,166 @@
+"""谱面统计表 info/chart_stats.csv：每首歌每个难度一行（物量、各类 note 数、BPM、时长、密度）。
+
+统计在提取阶段一次算好，下游直接读表，不必再逐个解析谱面 JSON。
+表中带有谱面内容哈希，再次生成时只重新计算哈希变化的谱面。
+"""
+import csv
+import hashlib
+import json
+import os
+import sys
+
+import chart_format
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+STATS_FILENAME = "chart_stats.csv"
+LEVEL_ORDER = ("EZ", "HD", "IN", "AT")
+# Phigros 谱面 note.type
+NOTE_TYPES = {1: "tap", 2: "drag", 3: "hold", 4: "flick"}
+# 一拍 32 个时间单位：秒 = time * 60 / bpm / 32
+TIME_UNIT_FACTOR = 1.875
+DENSITY_WINDOW_SECONDS = 1.0
+STATS_COLUMNS = (
+    "id", "level", "notes", "combo", "tap", "drag", "hold", "flick",
+    "lines", "bpm", "bpm_min", "bpm_max", "duration", "avg_density", "peak_density", "sha256",
+)
+INT_COLUMNS = ("notes", "combo", "tap", "drag", "hold", "flick", "lines")
+FLOAT_COLUMNS = ("bpm", "bpm_min", "bpm_max", "duration", "avg_density", "peak_density")
+
+
+def _short_hash(data):
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def song_id_from_folder(folder):
+    return folder[:-2] if folder.endswith(".0") else folder
+
+
+def compute_chart_stats(chart):
+    """
+    chart 为 chart_format.read_binary_chart 的结果（notes 为 numpy 结构化数组）。
+    时长与密度按各判定线自己的 BPM 换算成秒后统一计算。
+    """
+    if np is None:
+        raise RuntimeError("计算谱面统计需要 numpy，请运行 'pip install numpy'")
+    notes = chart["notes"]
+    bpms = np.array([float(line.get("bpm", 0) or 0) for line in chart["lines"]], dtype=np.float64)
+    types = notes["type"]
+    counts = {name: int(np.count_nonzero(types == note_type)) for note_type, name in NOTE_TYPES.items()}
+
+    valid_bpms = bpms[bpms > 0]
+    stats = {
+        "notes": int(len(notes)),
+        "combo": int(len(notes)),
+        **counts,
+        "lines": int(len(bpms)),
+        "bpm": float(valid_bpms[0]) if len(valid_bpms) else 0.0,
+        "bpm_min": float(valid_bpms.min()) if len(valid_bpms) else 0.0,
+        "bpm_max": float(valid_bpms.max()) if len(valid_bpms) else 0.0,
+        "duration": 0.0,
+        "avg_density": 0.0,
+        "peak_density": 0.0,
+    }
+    if not len(notes) or not len(valid_bpms):
+        return stats
+
+    line_bpms = bpms[notes["line"]]
+    line_bpms = np.where(line_bpms > 0, line_bpms, valid_bpms[0])
+    seconds_per_unit = TIME_UNIT_FACTOR / line_bpms
+    hit_seconds = np.sort(notes["time"].astype(np.float64) * seconds_per_unit)
+    end_seconds = (notes["time"].astype(np.float64) + notes["holdTime"].astype(np.float64)) * seconds_per_unit
+
+    first = max(float(hit_seconds[0]), 0.0)
+    duration = float(end_seconds.max()) - first
+    # 以每个 note 为窗口起点，统计 DENSITY_WINDOW_SECONDS 内的 note 数，取最大值
+    window_ends = np.searchsorted(hit_seconds, hit_seconds + DENSITY_WINDOW_SECONDS, side="left")
+    peak = int((window_ends - np.arange(len(hit_seconds))).max())
+
+    stats["duration"] = round(duration, 3)
+    stats["avg_density"] = round(len(notes) / duration, 3) if duration > 0 else 0.0
+    stats["peak_density"] = round(peak / DENSITY_WINDOW_SECONDS, 3)
+    return stats
+
+
+def _level_sort_key(level):
+    return (LEVEL_ORDER.index(level) if level in LEVEL_ORDER else len(LEVEL_ORDER), level)
+
+
+def load_chart_stats(path):
+    """读取统计表，数值列转换为 int/float，返回 {(id, level): row}。"""
+    rows = {}
+    try:
+        with open(path, "r", encoding="utf8", newline="") as f:
+            for row in csv.DictReader(f):
+                try:
+                    for column in INT_COLUMNS:
+                        row[column] = int(row[column])
+                    for column in FLOAT_COLUMNS:
+                        row[column] = float(row[column])
+                except (KeyError, TypeError, ValueError):
+                    continue
+                rows[(row["id"], row["level"])] = row
+    except OSError:
+        return {}
+    return rows
+
+
+def _load_chart_arrays(json_path, raw):
+    """优先使用同目录下比 JSON 新的二进制谱面，否则从 JSON 转换。"""
+    binary_path = json_path[:-5] + chart_format.BINARY_EXTENSION
+    if os.path.exists(binary_path) and os.path.getmtime(binary_path) >= os.path.getmtime(json_path):
+        return chart_format.read_binary_chart(binary_path)
+    return chart_format.read_binary_chart(chart_format.encode_binary_chart(json.loads(raw)))
+
+
+def build_chart_stats(output_dir="output", previous_path=None):
+    """
+    生成 info/chart_stats.csv，返回 (行数, 重新计算数, 复用数)。
+
+    previous_path 指向上一版统计表（默认复用 output 中已有的），哈希相同的谱面直接沿用旧行。
+    """
+    stats_path = os.path.join(output_dir, "info", STATS_FILENAME)
+    previous = load_chart_stats(previous_path or stats_path)
+
+    rows = []
+    computed = 0
+    reused = 0
+    for json_path in chart_format.iter_chart_files(output_dir):
+        song_id = song_id_from_folder(os.path.basename(os.path.dirname(json_path)))
+        level = os.path.basename(json_path)[:-5]
+        try:
+            with open(json_path, "rb") as f:
+                raw = f.read()
+            digest = _short_hash(raw)
+            old_row = previous.get((song_id, level))
+            if old_row and old_row.get("sha256") == digest:
+                rows.append(old_row)
+                reused += 1
+                continue
+            row = {"id": song_id, "level": level, **compute_chart_stats(_load_chart_arrays(json_path, raw)), "sha256": digest}
+        except (OSError, ValueError) as e:
+            print(f"谱面统计失败: {json_path}, 错误: {e}")
+            continue
+        rows.append(row)
+        computed += 1
+
+    rows.sort(key=lambda row: (row["id"], _level_sort_key(row["level"])))
+    os.makedirs(os.path.dirname(stats_path), exist_ok=True)
+    with open(stats_path, "w", encoding="utf8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=STATS_COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+    return len(rows), computed, reused
+
+
+def main(argv):
+    output_dir = argv[0] if argv else "output"
+    total, computed, reused = build_chart_stats(output_dir, os.environ.get("CHART_STATS_PREVIOUS"))
+    print(f"谱面统计: {total} 行 (重新计算 {computed}，复用 {reused}) -> {os.path.join(output_dir, 'info', STATS_FILENAME)}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
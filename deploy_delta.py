@@ -0,0 +1,245 @@
+"""构建间增量：对比本次 checksums.sha256 与上次已部署的版本，得出只需上传的文件。
+
+上次的清单可以是本地路径（checksums.sha256 文件，或包含它的目录，例如 asset-xtower 检出）
+或 HTTP(S) URL。输出目录（默认 deploy-delta/，不在 output/ 内，不会被发布）：
+  delta.json    {"added", "changed", "removed", "upload", "upload_bytes", "total_bytes", ...}
+  upload.txt    需要上传的文件（相对 output/，每行一个，可直接用于 rsync --files-from）
+  removed.txt   需要从部署端删除的文件
+  CHANGELOG.md  按歌曲汇总的可读变更：新曲目、谱面、曲绘 / 头像、音乐
+
+上传列表 = 新增与变更的文件 + 它们的预压缩副本（.br / .zst 等）与内容哈希别名（h/），
+再加上校验和文件本身及其副本（checksums.sha256 不列出自身，总是上传）。
+"""
+import json
+import os
+import sys
+import urllib.request
+
+import generate_index
+import precompress
+
+DEFAULT_DELTA_DIR = "deploy-delta"
+DELTA_FILENAME = "delta.json"
+UPLOAD_LIST_FILENAME = "upload.txt"
+REMOVED_LIST_FILENAME = "removed.txt"
+CHANGELOG_FILENAME = "CHANGELOG.md"
+FETCH_TIMEOUT = 30
+# 变更日志中每节最多列出的条目
+CHANGELOG_ITEM_LIMIT = 50
+
+ART_DIRS = ("illustration", "illustrationBlur", "illustrationLowRes", "avatar")
+
+
+def parse_checksums(text):
+    """解析 "hash  path" 每行一条的清单，返回 {path: hash}。"""
+    checksums = {}
+    for line in text.splitlines():
+        digest, sep, path = line.partition("  ")
+        if sep and digest and path:
+            checksums[path] = digest
+    return checksums
+
+
+def load_checksums(source):
+    """从本地文件 / 目录或 HTTP(S) URL 读取清单；不存在时返回 None。"""
+    if source.startswith(("http://", "https://")):
+        try:
+            with urllib.request.urlopen(source, timeout=FETCH_TIMEOUT) as response:
+                return parse_checksums(response.read().decode("utf-8"))
+        except OSError as e:
+            print(f"  [warn] 无法获取上次的校验和 {source}: {e}")
+            return None
+    path = os.path.join(source, generate_index.CHECKSUM_FILENAME) if os.path.isdir(source) else source
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return parse_checksums(f.read())
+    except OSError:
+        return None
+
+
+def diff_checksums(previous, current):
+    """返回 {"added", "changed", "removed", "unchanged"}，前三项为排序后的路径列表。"""
+    added = sorted(path for path in current if path not in previous)
+    changed = sorted(path for path in current if path in previous and previous[path] != current[path])
+    removed = sorted(path for path in previous if path not in current)
+    return {"added": added, "changed": changed, "removed": removed, "unchanged": len(current) - len(added) - len(changed)}
+
+
+def companion_paths(output_dir, web_path, digest):
+    """web_path 的预压缩副本与内容哈希别名中实际存在的那些。"""
+    candidates = [web_path + suffix for suffix in precompress.ENCODING_SUFFIXES.values()]
+    if digest and web_path.split("/", 1)[0] in generate_index.HASHED_ASSET_DIRS:
+        candidates.append(generate_index.hashed_alias_path(web_path, digest))
+    return [path for path in candidates if os.path.isfile(os.path.join(output_dir, *path.split("/")))]
+
+
+def build_upload_list(output_dir, delta, current):
+    """新增 / 变更文件及其副本与别名，加上校验和文件本身；按路径排序去重。"""
+    upload = set()
+    for web_path in delta["added"] + delta["changed"]:
+        upload.add(web_path)
+        upload.update(companion_paths(output_dir, web_path, current[web_path]))
+    checksum_path = generate_index.CHECKSUM_FILENAME
+    if os.path.isfile(os.path.join(output_dir, checksum_path)):
+        upload.add(checksum_path)
+        upload.update(companion_paths(output_dir, checksum_path, None))
+    return sorted(upload)
+
+
+def build_removed_list(delta, previous):
+    """删除的文件，连同它们的内容哈希别名。"""
+    removed = set(delta["removed"])
+    for web_path in delta["removed"]:
+        if web_path.split("/", 1)[0] in generate_index.HASHED_ASSET_DIRS:
+            removed.add(generate_index.hashed_alias_path(web_path, previous[web_path]))
+    return sorted(removed)
+
+
+def _song_of(web_path):
+    """返回 (类别, 歌曲 ID 或头像名, 难度)；与歌曲无关的文件返回 None。"""
+    parts = web_path.split("/")
+    top = parts[0]
+    stem = os.path.splitext(parts[-1])[0]
+    if top == "chart" and len(parts) == 3:
+        folder = parts[1]
+        return "chart", folder[:-2] if folder.endswith(".0") else folder, stem
+    if top == "music" and len(parts) == 2:
+        return "music", stem, None
+    if top in ART_DIRS and len(parts) == 2:
+        return top, stem, None
+    return None
+
+
+def summarize_changes(delta, previous, current):
+    """按歌曲汇总：{"new_songs", "removed_songs", "charts": {歌曲: [难度]}, "art": {目录: [名称]}, "music": [歌曲], "other": n}。"""
+    def songs(paths):
+        return {song for song in (_song_of(path) for path in paths) if song and song[0] == "chart"}
+
+    previous_songs = {song for _, song, _ in songs(previous)}
+    current_songs = {song for _, song, _ in songs(current)}
+    new_songs = current_songs - previous_songs
+    summary = {
+        "new_songs": sorted(new_songs),
+        "removed_songs": sorted(previous_songs - current_songs),
+        "charts": {},
+        "art": {},
+        "music": [],
+        "other": 0,
+    }
+    for web_path in delta["added"] + delta["changed"]:
+        parsed = _song_of(web_path)
+        if parsed is None:
+            summary["other"] += 1
+            continue
+        category, name, difficulty = parsed
+        if category != "avatar" and name in new_songs:
+            continue
+        if category == "chart":
+            summary["charts"].setdefault(name, []).append(difficulty)
+        elif category == "music":
+            summary["music"].append(name)
+        else:
+            summary["art"].setdefault(category, []).append(name)
+    for difficulties in summary["charts"].values():
+        difficulties.sort()
+    summary["music"].sort()
+    for names in summary["art"].values():
+        names.sort()
+    return summary
+
+
+def _limited(items):
+    items = list(items)
+    if len(items) <= CHANGELOG_ITEM_LIMIT:
+        return items
+    return items[:CHANGELOG_ITEM_LIMIT] + [f"…… 另有 {len(items) - CHANGELOG_ITEM_LIMIT} 项"]
+
+
+def format_changelog(delta, summary, upload_bytes):
+    lines = [
+        f"# 资源更新：新增 {len(delta['added'])}，变更 {len(delta['changed'])}，删除 {len(delta['removed'])}",
+        "",
+        f"需上传 {upload_bytes / 1024 / 1024:.1f} MB。",
+    ]
+
+    def section(title, items):
+        if items:
+            lines.extend(["", f"## {title}", ""])
+            lines.extend(f"- {item}" for item in _limited(items))
+
+    section("新曲目", summary["new_songs"])
+    section("移除曲目", summary["removed_songs"])
+    section("谱面更新", [f"{song}：{', '.join(diffs)}" for song, diffs in sorted(summary["charts"].items())])
+    section("曲绘 / 头像更新", [f"{folder}：{', '.join(names)}" for folder, names in sorted(summary["art"].items())])
+    section("音乐更新", summary["music"])
+    if summary["other"]:
+        lines.extend(["", f"其他文件（索引、元数据等）变更 {summary['other']} 个。"])
+    return "\n".join(lines) + "\n"
+
+
+def build_delta(output_dir, previous_source, delta_dir=DEFAULT_DELTA_DIR):
+    """
+    生成增量清单与变更日志，返回 delta dict；缺少本次或上次清单时返回 None（应整站上传）。
+    """
+    current = load_checksums(os.path.join(output_dir, generate_index.CHECKSUM_FILENAME))
+    if current is None:
+        print(f"  [skip] {output_dir} 中没有 {generate_index.CHECKSUM_FILENAME}")
+        return None
+    previous = load_checksums(previous_source)
+    if previous is None:
+        print(f"  [skip] 找不到上次的校验和 ({previous_source})，需要整站上传")
+        return None
+
+    delta = diff_checksums(previous, current)
+    upload = build_upload_list(output_dir, delta, current)
+    removed = build_removed_list(delta, previous)
+    upload_bytes = sum(os.path.getsize(os.path.join(output_dir, *path.split("/"))) for path in upload)
+    total_bytes = sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _dirs, names in os.walk(output_dir)
+        for name in names
+        if not generate_index.is_hidden_web_path(os.path.relpath(os.path.join(root, name), output_dir).replace(os.sep, "/"))
+    )
+    summary = summarize_changes(delta, previous, current)
+    result = {
+        "previous": previous_source,
+        **delta,
+        "upload": upload,
+        "delete": removed,
+        "upload_bytes": upload_bytes,
+        "total_bytes": total_bytes,
+        "summary": summary,
+    }
+
+    os.makedirs(delta_dir, exist_ok=True)
+    with open(os.path.join(delta_dir, DELTA_FILENAME), "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    with open(os.path.join(delta_dir, UPLOAD_LIST_FILENAME), "w", encoding="utf-8") as f:
+        f.write("".join(f"{path}\n" for path in upload))
+    with open(os.path.join(delta_dir, REMOVED_LIST_FILENAME), "w", encoding="utf-8") as f:
+        f.write("".join(f"{path}\n" for path in removed))
+    with open(os.path.join(delta_dir, CHANGELOG_FILENAME), "w", encoding="utf-8") as f:
+        f.write(format_changelog(delta, summary, upload_bytes))
+    return result
+
+
+def main(argv):
+    output_dir = argv[0] if argv else "output"
+    previous_source = argv[1] if len(argv) > 1 else os.environ.get("DEPLOY_PREVIOUS")
+    if not previous_source:
+        print("未指定上次部署的校验和 (DEPLOY_PREVIOUS)，跳过增量计算")
+        return 0
+    delta_dir = os.environ.get("DEPLOY_DELTA_DIR", DEFAULT_DELTA_DIR)
+    result = build_delta(output_dir, previous_source, delta_dir)
+    if result is None:
+        return 0
+    print(
+        f"部署增量: 新增 {len(result['added'])}，变更 {len(result['changed'])}，删除 {len(result['removed'])}，"
+        f"未变 {result['unchanged']}；需上传 {len(result['upload'])} 个文件 "
+        f"{result['upload_bytes'] / 1024 / 1024:.1f} MB / 全站 {result['total_bytes'] / 1024 / 1024:.1f} MB → {delta_dir}"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
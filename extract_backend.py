@@ -0,0 +1,391 @@
+"""可替换的资源提取后端，以及两种引擎的并排基准测试。
+
+  unitypy  gameInformation.py + resource.py（Python / UnityPy）
+  phiinfo  PhiInfo.CLI（.NET）导出后由 translate.py 映射为站点目录
+
+两者都把结果写成相同的站点目录结构（info/、chart/、music/、illustration*/、avatar/），
+后续阶段不关心来源。资产按类别划分：image（曲绘、头像）、audio（音乐）、chart（谱面）。
+
+PhiInfo.CLI 没有按 key 过滤的参数，分片通过“分片安装包”实现：按 catalog 把 bundle 按大小
+均衡分成 N 份，每份复制一个只含本分片 bundle（其余文件原样保留）的 APK，N 个 export 子进程
+并行运行后合并 asset/ 目录；info/ 取第一个分片的结果。只导出部分类别时同样用这种方式裁掉
+其余类别的 bundle。
+
+基准测试在子进程中分别运行各后端（python main.py extract ...），用 os.wait4 取得
+CPU 时间与峰值内存（含 dotnet 等已回收的孙进程），并逐文件比较产物：
+谱面按 JSON 内容、图片按像素、音乐按字节。
+"""
+import heapq
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from zipfile import ZipFile
+
+CATEGORIES = ("image", "audio", "chart")
+CATEGORY_DIRS = {
+    "image": ("illustration", "illustrationBlur", "illustrationLowRes", "avatar"),
+    "audio": ("music",),
+    "chart": ("chart",),
+}
+# 类别 → resource.CONFIG 中的开关
+RESOURCE_CONFIG_KEYS = {
+    "image": ("avatar", "illustration", "illustrationBlur", "illustrationLowRes"),
+    "audio": ("music",),
+    "chart": ("chart",),
+}
+BUNDLE_DIR = "assets/aa/Android/"
+PHIINFO_CLI = os.environ.get(
+    "PHIINFO_CLI",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "PhiInfo.CLI", "PhiInfo.CLI.dll"),
+)
+PHIINFO_IMAGE_FORMAT = "Png"
+# 每个类别最多列出这么多不一致的文件
+PARITY_SAMPLE_LIMIT = 10
+
+
+def parse_categories(raw_value):
+    """"image,chart" → ("image", "chart")；空值表示全部类别，未知类别报错。"""
+    if not raw_value:
+        return CATEGORIES
+    categories = []
+    for token in raw_value.replace(" ", ",").split(","):
+        token = token.strip().lower()
+        if not token:
+            continue
+        if token not in CATEGORIES:
+            raise ValueError(f"未知资产类别: {token}（可选 {', '.join(CATEGORIES)}）")
+        if token not in categories:
+            categories.append(token)
+    return tuple(categories) or CATEGORIES
+
+
+def key_category(key):
+    """catalog key（已去掉 Assets/Tracks/ 前缀）所属类别，不需要导出的 key 返回 None。"""
+    if key.startswith("avatar."):
+        return "image"
+    filename = key.replace("\\", "/").rsplit("/", 1)[-1]
+    if filename.startswith("Chart_"):
+        return "chart"
+    if filename.startswith("music"):
+        return "audio"
+    if "Illustration" in filename:
+        return "image"
+    return None
+
+
+def assign_shards(weights, shards):
+    """把 {bundle: 字节数} 按从大到小依次分给当前最轻的分片，返回 [set(bundle)]。"""
+    heap = [(0, i) for i in range(max(1, shards))]
+    result = [set() for _ in heap]
+    for bundle, weight in sorted(weights.items(), key=lambda item: (-item[1], item[0])):
+        load, i = heapq.heappop(heap)
+        result[i].add(bundle)
+        heapq.heappush(heap, (load + weight, i))
+    return result
+
+
+def write_shard_package(apk_path, target_path, dropped_bundles):
+    """复制 APK，跳过 dropped_bundles 中的 bundle；其余条目保持原压缩方式。"""
+    with ZipFile(apk_path) as src, ZipFile(target_path, "w") as dst:
+        for info in src.infolist():
+            if info.filename.startswith(BUNDLE_DIR) and info.filename[len(BUNDLE_DIR):] in dropped_bundles:
+                continue
+            with src.open(info) as reader, dst.open(info, "w") as writer:
+                shutil.copyfileobj(reader, writer, 1024 * 1024)
+
+
+def _merge_tree(src_dir, dst_dir):
+    """把 src_dir 下的文件移动到 dst_dir 的对应位置（覆盖同名文件）。"""
+    for root, _dirs, files in os.walk(src_dir):
+        target_root = os.path.join(dst_dir, os.path.relpath(root, src_dir))
+        os.makedirs(target_root, exist_ok=True)
+        for name in files:
+            os.replace(os.path.join(root, name), os.path.join(target_root, name))
+
+
+class ExtractBackend:
+    """提取后端接口：把 APK 中指定类别的资产与 info 写成站点目录结构，返回统计 dict。"""
+
+    name = ""
+
+    def extract(self, apk_path, output_dir, categories=CATEGORIES):
+        raise NotImplementedError
+
+
+class UnityPyBackend(ExtractBackend):
+    name = "unitypy"
+
+    def extract(self, apk_path, output_dir, categories=CATEGORIES):
+        import gameInformation
+        import resource
+
+        gameInformation.extract_game_info(apk_path, output_dir)
+        wanted = {key for category in categories for key in RESOURCE_CONFIG_KEYS[category]}
+        saved = dict(resource.CONFIG)
+        resource.CONFIG.update({key: key in wanted for key in resource.CONFIG})
+        try:
+            return resource.extract_resources(apk_path, output_dir) or {}
+        finally:
+            resource.CONFIG.update(saved)
+
+
+class PhiInfoBackend(ExtractBackend):
+    name = "phiinfo"
+
+    def __init__(self, cli=PHIINFO_CLI, shards=1, dotnet="dotnet", image_format=PHIINFO_IMAGE_FORMAT):
+        self.cli = cli
+        self.shards = max(1, shards)
+        self.dotnet = dotnet
+        self.image_format = image_format
+
+    def export_command(self, package_path, output_dir):
+        return [self.dotnet, self.cli, "-p", package_path, "--image-format", self.image_format, "export", "-o", output_dir]
+
+    def plan_shards(self, apk_path, categories):
+        """返回 (各分片保留的 bundle 集合, 所有已知 bundle)；catalog 缺失时返回 (None, None)。"""
+        import resource
+
+        entries = resource.load_catalog_entries(apk_path)
+        if entries is None:
+            return None, None
+        known = {bundle for _, bundle in entries}
+        with ZipFile(apk_path) as apk:
+            sizes = {info.filename[len(BUNDLE_DIR):]: info.file_size for info in apk.infolist() if info.filename.startswith(BUNDLE_DIR)}
+        weights = {bundle: sizes.get(bundle, 0) for key, bundle in entries if key_category(key) in categories}
+        return assign_shards(weights, self.shards), known
+
+    def extract(self, apk_path, output_dir, categories=CATEGORIES):
+        import translate
+
+        os.makedirs(output_dir, exist_ok=True)
+        if self.shards == 1 and set(categories) == set(CATEGORIES):
+            subprocess.run(self.export_command(apk_path, output_dir), check=True)
+            translate.main(output_dir)
+            return {"shards": 1}
+
+        shard_bundles, known = self.plan_shards(apk_path, categories)
+        if shard_bundles is None:
+            raise RuntimeError("找不到 catalog.json，无法分片")
+        with tempfile.TemporaryDirectory(prefix="phiinfo-shards-", dir=os.path.dirname(os.path.abspath(output_dir))) as work_dir:
+            processes = []
+            for i, bundles in enumerate(shard_bundles):
+                package_path = os.path.join(work_dir, f"shard-{i}.apk")
+                # 本分片之外的已知 bundle 都裁掉，catalog 之外的 bundle 原样保留
+                write_shard_package(apk_path, package_path, known - bundles)
+                shard_output = os.path.join(work_dir, f"shard-{i}")
+                processes.append((shard_output, subprocess.Popen(self.export_command(package_path, shard_output))))
+            failed = [i for i, (_, process) in enumerate(processes) if process.wait() != 0]
+            if failed:
+                raise RuntimeError(f"PhiInfo 分片导出失败: {failed}")
+
+            for i, (shard_output, _) in enumerate(processes):
+                _merge_tree(os.path.join(shard_output, "asset"), os.path.join(output_dir, "asset"))
+                if i == 0 and os.path.isdir(os.path.join(shard_output, "info")):
+                    _merge_tree(os.path.join(shard_output, "info"), os.path.join(output_dir, "info"))
+        translate.main(output_dir)
+        return {"shards": len(shard_bundles), "bundles": sum(len(bundles) for bundles in shard_bundles)}
+
+
+def resolve_shards(shards=None):
+    """命令行给出的分片数优先，否则读 PHIINFO_SHARDS；非法值回落到 1。"""
+    if shards is not None:
+        return max(1, shards)
+    from resource import _get_int_env
+    return _get_int_env("PHIINFO_SHARDS", 1, min_value=1)
+
+
+def get_backend(name, shards=1):
+    if name == UnityPyBackend.name:
+        return UnityPyBackend()
+    if name == PhiInfoBackend.name:
+        return PhiInfoBackend(shards=shards)
+    raise ValueError(f"未知提取后端: {name}（可选 unitypy、phiinfo）")
+
+
+# ---------------- 产物一致性 ----------------
+def _list_files(root):
+    files = set()
+    for dirpath, _dirs, names in os.walk(root):
+        for name in names:
+            files.add(os.path.relpath(os.path.join(dirpath, name), root).replace(os.sep, "/"))
+    return files
+
+
+def _equivalent(category, path_a, path_b):
+    """内容不同的文件是否等价：谱面比较 JSON，图片比较像素。"""
+    if category == "chart":
+        try:
+            with open(path_a, "r", encoding="utf-8") as fa, open(path_b, "r", encoding="utf-8") as fb:
+                return json.load(fa) == json.load(fb)
+        except (OSError, ValueError):
+            return False
+    if category == "image":
+        from PIL import Image
+
+        try:
+            with Image.open(path_a) as image_a, Image.open(path_b) as image_b:
+                return image_a.size == image_b.size and image_a.convert("RGBA").tobytes() == image_b.convert("RGBA").tobytes()
+        except OSError:
+            return False
+    return False
+
+
+def compare_outputs(dir_a, dir_b, categories=CATEGORIES):
+    """
+    逐类别比较两个站点目录，返回
+    {类别: {"only_a", "only_b", "identical", "equivalent", "different", "samples"}}。
+    """
+    report = {}
+    for category in categories:
+        result = {"only_a": 0, "only_b": 0, "identical": 0, "equivalent": 0, "different": 0, "samples": []}
+        for subdir in CATEGORY_DIRS[category]:
+            files_a = _list_files(os.path.join(dir_a, subdir))
+            files_b = _list_files(os.path.join(dir_b, subdir))
+            result["only_a"] += len(files_a - files_b)
+            result["only_b"] += len(files_b - files_a)
+            for rel in sorted(files_a & files_b):
+                path_a = os.path.join(dir_a, subdir, rel)
+                path_b = os.path.join(dir_b, subdir, rel)
+                with open(path_a, "rb") as fa, open(path_b, "rb") as fb:
+                    same = fa.read() == fb.read()
+                if same:
+                    result["identical"] += 1
+                elif _equivalent(category, path_a, path_b):
+                    result["equivalent"] += 1
+                else:
+                    result["different"] += 1
+                    if len(result["samples"]) < PARITY_SAMPLE_LIMIT:
+                        result["samples"].append(f"{subdir}/{rel}")
+        report[category] = result
+    return report
+
+
+def parity_ok(result):
+    return result["only_a"] == 0 and result["only_b"] == 0 and result["different"] == 0
+
+
+# ---------------- 基准测试 ----------------
+def run_measured(command):
+    """运行子进程，返回 {"wall", "cpu", "max_rss_mb", "returncode"}；CPU 与内存来自 os.wait4。"""
+    started = time.perf_counter()
+    process = subprocess.Popen(command)
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return {
+        "wall": round(time.perf_counter() - started, 3),
+        "cpu": round(usage.ru_utime + usage.ru_stime, 3),
+        "max_rss_mb": round(usage.ru_maxrss / 1024, 1),
+        "returncode": process.returncode,
+    }
+
+
+def extract_command(backend, apk_path, output_dir, categories, shards):
+    main_py = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+    return [
+        sys.executable, main_py, "extract", apk_path,
+        "--backend", backend,
+        "--shards", str(shards),
+        "--categories", ",".join(categories),
+        "--output", output_dir,
+    ]
+
+
+def recommend(runs, parity):
+    """每个类别推荐耗时最短的后端；产物不一致的类别仍给出推荐，但标注需要人工确认。"""
+    recommendations = {}
+    for category, by_backend in runs.items():
+        finished = {name: run for name, run in by_backend.items() if run["returncode"] == 0}
+        if not finished:
+            continue
+        best = min(finished, key=lambda name: finished[name]["wall"])
+        recommendations[category] = {"backend": best, "parity": parity_ok(parity[category]) if category in parity else None}
+    return recommendations
+
+
+def benchmark(apk_path, work_dir, backends=("unitypy", "phiinfo"), categories=CATEGORIES, shards=1, per_category=False):
+    """
+    在 work_dir/<后端>[/<类别>] 下分别运行各后端并比较产物，返回报告 dict。
+    per_category 为真时每个类别单独运行一次，用于按类别挑选更快的引擎。
+    """
+    groups = [(category,) for category in categories] if per_category else [tuple(categories)]
+    runs = {}
+    parity = {}
+    for group in groups:
+        label = group[0] if per_category else "all"
+        outputs = {}
+        for backend in backends:
+            output_dir = os.path.join(work_dir, backend, label)
+            shutil.rmtree(output_dir, ignore_errors=True)
+            print(f"[benchmark] {backend} ({label}) ...", flush=True)
+            runs.setdefault(label, {})[backend] = run_measured(extract_command(backend, apk_path, output_dir, group, shards))
+            outputs[backend] = output_dir
+        if len(backends) >= 2:
+            parity.update(compare_outputs(outputs[backends[0]], outputs[backends[1]], group))
+    report = {"apk": apk_path, "backends": list(backends), "shards": shards, "runs": runs, "parity": parity}
+    if per_category:
+        report["recommendations"] = recommend(runs, parity)
+    return report
+
+
+def format_benchmark(report):
+    backends = report["backends"]
+    lines = []
+    for label, by_backend in report["runs"].items():
+        for backend in backends:
+            run = by_backend.get(backend)
+            if run is None:
+                continue
+            status = "ok" if run["returncode"] == 0 else f"exit {run['returncode']}"
+            lines.append(f"  {label:<6} {backend:<8} wall {run['wall']:>8.1f}s  cpu {run['cpu']:>8.1f}s  peak {run['max_rss_mb']:>8.1f} MB  {status}")
+    if len(backends) >= 2:
+        lines.append(f"  产物一致性（{backends[0]} vs {backends[1]}）:")
+        for category, result in report["parity"].items():
+            lines.append(
+                f"    {category:<6} 相同 {result['identical']}，等价 {result['equivalent']}，不同 {result['different']}，"
+                f"仅 {backends[0]} {result['only_a']}，仅 {backends[1]} {result['only_b']}"
+            )
+            for sample in result["samples"]:
+                lines.append(f"      - {sample}")
+    for category, choice in report.get("recommendations", {}).items():
+        note = "" if choice["parity"] else "（产物不一致，需确认）"
+        lines.append(f"  推荐 {category}: {choice['backend']}{note}")
+    return "\n".join(lines)
+
+
+def main(argv):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="对比 UnityPy 与 PhiInfo.CLI 的提取耗时、资源占用与产物一致性")
+    parser.add_argument("apk", nargs="?", default="game.apk")
+    parser.add_argument("--work-dir", default=os.environ.get("EXTRACT_BENCHMARK_DIR", "benchmark-output"))
+    parser.add_argument("--categories", default="")
+    parser.add_argument("--shards", type=int, default=None, help="PhiInfo 并行分片数（默认读 PHIINFO_SHARDS）")
+    parser.add_argument("--per-category", action="store_true", help="每个类别单独运行，按类别推荐引擎")
+    args = parser.parse_args(argv)
+    return run_benchmark(args.apk, args.work_dir, args.categories, resolve_shards(args.shards), args.per_category)
+
+
+def run_benchmark(apk_path, work_dir, categories="", shards=1, per_category=False):
+    """执行基准并打印、保存报告（main.py benchmark 子命令与本模块命令行共用）。"""
+    report = benchmark(
+        apk_path,
+        work_dir,
+        categories=parse_categories(categories),
+        shards=shards,
+        per_category=per_category,
+    )
+    print(format_benchmark(report))
+    os.makedirs(work_dir, exist_ok=True)
+    report_path = os.path.join(work_dir, "benchmark.json")
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"基准报告: {report_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
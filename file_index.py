@@ -0,0 +1,202 @@
+"""files.json 的紧凑分片格式：按资源类型分片、前缀压缩、内容哈希命名，并提供版本间增量。
+
+目录结构（位于站点根目录下的 index/）：
+  manifest.json            短缓存，描述当前各分片的哈希与可用增量
+  <hash>.json              分片，内容不变则文件名不变，可 immutable 缓存
+  delta-<from>-<to>.json   旧分片 → 新分片的增量（新增/删除路径）
+"""
+import hashlib
+import json
+import os
+
+from precompress import ENCODING_SUFFIXES
+
+INDEX_DIR_NAME = "index"
+MANIFEST_FILENAME = "manifest.json"
+FORMAT_VERSION = 1
+# 每个分片保留多少个历史版本的增量
+DEFAULT_DELTA_HISTORY = 3
+ROOT_SHARD_NAME = "_root"
+PRECOMPRESSED_SUFFIXES = tuple(ENCODING_SUFFIXES.values())
+
+
+def front_encode(paths):
+    """前缀压缩：[共享前缀长度, 剩余后缀, ...] 平铺成一维数组。paths 需已排序。"""
+    encoded = []
+    previous = ""
+    for path in paths:
+        shared = 0
+        limit = min(len(previous), len(path))
+        while shared < limit and previous[shared] == path[shared]:
+            shared += 1
+        encoded.extend((shared, path[shared:]))
+        previous = path
+    return encoded
+
+
+def front_decode(encoded):
+    paths = []
+    previous = ""
+    for i in range(0, len(encoded), 2):
+        previous = previous[:encoded[i]] + encoded[i + 1]
+        paths.append(previous)
+    return paths
+
+
+def shard_name_for_path(web_path):
+    if "/" not in web_path:
+        return ROOT_SHARD_NAME
+    return web_path.split("/", 1)[0]
+
+
+def split_into_shards(paths):
+    shards = {}
+    for path in sorted(paths):
+        shards.setdefault(shard_name_for_path(path), []).append(path)
+    return shards
+
+
+def _dump_compact(data):
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _short_hash(data):
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def encode_shard(name, paths):
+    """返回 (哈希, 文件内容)。"""
+    payload = _dump_compact({"v": FORMAT_VERSION, "type": name, "p": front_encode(paths)})
+    return _short_hash(payload), payload
+
+
+def encode_delta(name, from_hash, to_hash, old_paths, new_paths):
+    old_set = set(old_paths)
+    new_set = set(new_paths)
+    return _dump_compact({
+        "v": FORMAT_VERSION,
+        "type": name,
+        "from": from_hash,
+        "to": to_hash,
+        "add": front_encode(sorted(new_set - old_set)),
+        "remove": front_encode(sorted(old_set - new_set)),
+    })
+
+
+def apply_delta(paths, delta):
+    removed = set(front_decode(delta["remove"]))
+    result = {path for path in paths if path not in removed}
+    result.update(front_decode(delta["add"]))
+    return sorted(result)
+
+
+def _read_json(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def load_previous_versions(index_dir):
+    """
+    从旧的 index/ 目录恢复每个分片的历史路径集合：{分片名: [(哈希, 路径列表), ...]}，新版本在前。
+
+    上一版的分片直接解码；更早的版本由上一版的增量反推，所以旧目录里只需要
+    manifest、当前分片和增量文件。
+    """
+    manifest = _read_json(os.path.join(index_dir, MANIFEST_FILENAME))
+    if not manifest or manifest.get("v") != FORMAT_VERSION:
+        return {}
+
+    history = {}
+    for name, info in manifest.get("shards", {}).items():
+        shard = _read_json(os.path.join(index_dir, info["file"]))
+        if not shard:
+            continue
+        current = front_decode(shard["p"])
+        versions = [(info["hash"], current)]
+        for from_hash, delta_file in info.get("deltas", {}).items():
+            delta = _read_json(os.path.join(index_dir, delta_file))
+            if not delta:
+                continue
+            # 增量是 from → 上一版，反向应用即可得到 from 版本的路径集合。
+            reverse = {"add": delta["remove"], "remove": delta["add"]}
+            versions.append((from_hash, apply_delta(current, reverse)))
+        history[name] = versions
+    return history
+
+
+def write_compact_index(output_dir, paths, previous_index_dir=None, delta_history=DEFAULT_DELTA_HISTORY):
+    """
+    生成 index/ 目录并返回 manifest。
+
+    previous_index_dir 指向上一次部署的 index/（默认复用 output 中已有的），
+    用于生成增量；不在新 manifest 中引用的旧文件会被清理。
+    """
+    index_dir = os.path.join(output_dir, INDEX_DIR_NAME)
+    previous = load_previous_versions(previous_index_dir or index_dir)
+    os.makedirs(index_dir, exist_ok=True)
+
+    files = {}
+    manifest_shards = {}
+    for name, shard_paths in split_into_shards(paths).items():
+        shard_hash, payload = encode_shard(name, shard_paths)
+        shard_file = f"{shard_hash}.json"
+        files[shard_file] = payload
+
+        deltas = {}
+        for old_hash, old_paths in previous.get(name, [])[:delta_history]:
+            if old_hash == shard_hash or old_hash in deltas:
+                continue
+            delta_file = f"delta-{old_hash}-{shard_hash}.json"
+            files[delta_file] = encode_delta(name, old_hash, shard_hash, old_paths, shard_paths)
+            deltas[old_hash] = delta_file
+
+        manifest_shards[name] = {
+            "file": shard_file,
+            "hash": shard_hash,
+            "count": len(shard_paths),
+            "deltas": deltas,
+        }
+
+    version_hash = _short_hash(_dump_compact({name: info["hash"] for name, info in sorted(manifest_shards.items())}))
+    manifest = {"v": FORMAT_VERSION, "version": version_hash, "shards": manifest_shards}
+    files[MANIFEST_FILENAME] = _dump_compact(manifest)
+
+    for filename, payload in files.items():
+        target = os.path.join(index_dir, filename)
+        # 内容哈希命名的文件已存在即无需重写，保持 mtime 不变。
+        if filename != MANIFEST_FILENAME and os.path.exists(target):
+            continue
+        with open(target, "wb") as f:
+            f.write(payload)
+
+    for filename in os.listdir(index_dir):
+        # 预压缩副本跟随源文件，由 precompress 负责清理
+        source_name = filename
+        for suffix in PRECOMPRESSED_SUFFIXES:
+            if filename.endswith(suffix):
+                source_name = filename[:-len(suffix)]
+        if source_name not in files:
+            os.remove(os.path.join(index_dir, filename))
+
+    return manifest
+
+
+def index_size_report(index_dir, manifest):
+    shard_bytes = sum(
+        os.path.getsize(os.path.join(index_dir, info["file"]))
+        for info in manifest["shards"].values()
+    )
+    delta_bytes = [
+        os.path.getsize(os.path.join(index_dir, delta_file))
+        for info in manifest["shards"].values()
+        for delta_file in info["deltas"].values()
+    ]
+    return {
+        "manifest": os.path.getsize(os.path.join(index_dir, MANIFEST_FILENAME)),
+        "shards": shard_bytes,
+        "deltas": len(delta_bytes),
+        "delta_bytes": sum(delta_bytes),
+    }
@@ -0,0 +1,286 @@
+"""字体分片索引：解析 cn-font-split 生成的 result.css，得到 码点 → woff2 分片 的映射。
+
+产物 font-shards.json（站点根目录）：
+  {"version": 1, "fonts": {family: {"css", "dir", "shards": [文件名], "runs": [...], "info": [分片序号]}}}
+runs 为按码点排序、互不重叠的区间，每个区间三个整数 (gap, span, shard)：
+  start = 上一区间的 end + 1 + gap（首个区间以 -1 为上一 end），end = start + span。
+差分后绝大多数数字只有一两位，比直接写码点小得多；前端解码后二分即可查到任意字符所在分片。
+info 为歌曲名、Tips、收藏品标题等 info/ 文本所需的最小分片集合。
+另外按 index.html 首屏文字计算所需分片，在页面中注入 <link rel="preload">。
+"""
+import bisect
+import html
+import json
+import os
+import re
+import sys
+from urllib.parse import quote, unquote
+
+FONT_INDEX_FILENAME = "font-shards.json"
+FONT_CSS_FILENAME = "result.css"
+INDEX_VERSION = 1
+# 需要统计字符的 info 文本（歌曲名、Tips、收藏品标题）
+DEFAULT_TEXT_SOURCES = ("info/info.tsv", "info/tips.txt", "info/collection.tsv")
+DEFAULT_PRELOAD_LIMIT = 6
+PRELOAD_BEGIN_MARKER = "<!-- BEGIN generated:font-preload -->"
+PRELOAD_END_MARKER = "<!-- END generated:font-preload -->"
+
+FONT_FACE_RE = re.compile(r"@font-face\s*\{([^}]*)\}")
+FAMILY_RE = re.compile(r"font-family\s*:\s*[\"']?([^\"';]+)[\"']?")
+URL_RE = re.compile(r"url\(\s*[\"']?([^\"')]+)[\"']?\s*\)")
+RANGE_RE = re.compile(r"unicode-range\s*:\s*([^;]+)")
+STYLESHEET_RE = re.compile(r"<link\b[^>]*rel=[\"']stylesheet[\"'][^>]*>", re.IGNORECASE)
+HREF_RE = re.compile(r"href=[\"']([^\"']+)[\"']")
+SCRIPT_STYLE_RE = re.compile(r"<(script|style|head)\b.*?</\1>", re.IGNORECASE | re.DOTALL)
+TAG_RE = re.compile(r"<[^>]+>")
+
+
+def parse_unicode_range(value):
+    """解析 unicode-range，返回 [(起, 止)]；支持 U+4E00、U+4E00-9FFF 与 U+4?? 通配写法。"""
+    ranges = []
+    for token in value.split(","):
+        token = token.strip().upper()
+        if not token.startswith("U+"):
+            continue
+        token = token[2:]
+        if "-" in token:
+            start, end = token.split("-", 1)
+        elif "?" in token:
+            start, end = token.replace("?", "0"), token.replace("?", "F")
+        else:
+            start = end = token
+        try:
+            ranges.append((int(start, 16), int(end, 16)))
+        except ValueError:
+            continue
+    return ranges
+
+
+def parse_font_css(css_text):
+    """返回 [{"family", "url", "ranges"}]，每个 @font-face 一项。"""
+    faces = []
+    for block in FONT_FACE_RE.findall(css_text):
+        family = FAMILY_RE.search(block)
+        urls = [url for url in URL_RE.findall(block) if url.lower().endswith(".woff2")]
+        unicode_range = RANGE_RE.search(block)
+        if not (family and urls and unicode_range):
+            continue
+        faces.append({
+            "family": family.group(1).strip(),
+            "url": urls[0][2:] if urls[0].startswith("./") else urls[0],
+            "ranges": parse_unicode_range(unicode_range.group(1)),
+        })
+    return faces
+
+
+def build_family_index(faces, css_web_path):
+    """把同一字体的 @font-face 合并为 {"css", "dir", "shards", "ranges"}，相邻同分片区间合并。"""
+    shards = []
+    shard_ids = {}
+    ranges = []
+    for face in faces:
+        shard = shard_ids.setdefault(face["url"], len(shards))
+        if shard == len(shards):
+            shards.append(face["url"])
+        ranges.extend([start, end, shard] for start, end in face["ranges"])
+    ranges.sort()
+    merged = []
+    for start, end, shard in ranges:
+        if merged and merged[-1][2] == shard and merged[-1][1] + 1 >= start:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end, shard])
+    return {"css": css_web_path, "dir": os.path.dirname(css_web_path), "shards": shards, "ranges": merged}
+
+
+def discover_fonts(site_dir):
+    """扫描站点根目录下各子目录中的 result.css，返回 {family: 索引}。"""
+    fonts = {}
+    for entry in sorted(os.scandir(site_dir), key=lambda e: e.name):
+        css_path = os.path.join(entry.path, FONT_CSS_FILENAME)
+        if not entry.is_dir() or not os.path.isfile(css_path):
+            continue
+        with open(css_path, "r", encoding="utf-8") as f:
+            faces = parse_font_css(f.read())
+        by_family = {}
+        for face in faces:
+            by_family.setdefault(face["family"], []).append(face)
+        for family, family_faces in by_family.items():
+            fonts[family] = build_family_index(family_faces, f"{entry.name}/{FONT_CSS_FILENAME}")
+    return fonts
+
+
+def encode_runs(ranges):
+    runs = []
+    previous_end = -1
+    for start, end, shard in ranges:
+        runs.extend((start - previous_end - 1, end - start, shard))
+        previous_end = end
+    return runs
+
+
+def decode_runs(runs):
+    ranges = []
+    previous_end = -1
+    for i in range(0, len(runs), 3):
+        start = previous_end + 1 + runs[i]
+        previous_end = start + runs[i + 1]
+        ranges.append([start, previous_end, runs[i + 2]])
+    return ranges
+
+
+def _shard_lookup(family_index):
+    """返回 codepoint → 分片序号（不在任何分片中时为 None）的查找函数。"""
+    ranges = family_index["ranges"]
+    starts = [start for start, _, _ in ranges]
+
+    def lookup(codepoint):
+        i = bisect.bisect_right(starts, codepoint) - 1
+        if i >= 0 and ranges[i][1] >= codepoint:
+            return ranges[i][2]
+        return None
+
+    return lookup
+
+
+def shards_for_codepoints(family_index, codepoints):
+    """返回覆盖 codepoints 所需的最小分片序号集合（区间互不重叠，每个字符只属于一个分片）。"""
+    lookup = _shard_lookup(family_index)
+    return {shard for shard in map(lookup, codepoints) if shard is not None}
+
+
+def text_codepoints(text):
+    return {ord(ch) for ch in text if not ch.isspace()}
+
+
+def collect_text_codepoints(site_dir, sources=DEFAULT_TEXT_SOURCES):
+    codepoints = set()
+    for rel_path in sources:
+        path = os.path.join(site_dir, *rel_path.split("/"))
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                codepoints |= text_codepoints(f.read())
+        except (OSError, UnicodeDecodeError):
+            continue
+    return codepoints
+
+
+def html_visible_text(page):
+    return html.unescape(TAG_RE.sub(" ", SCRIPT_STYLE_RE.sub(" ", page)))
+
+
+def linked_font_css(page):
+    """页面通过 <link rel="stylesheet"> 引入的 result.css 的 Web 路径。"""
+    paths = []
+    for tag in STYLESHEET_RE.findall(page):
+        href = HREF_RE.search(tag)
+        path = unquote(href.group(1)) if href else ""
+        if path.endswith("/" + FONT_CSS_FILENAME):
+            # 站点根目录的绝对路径与 ./ 前缀等价；../ 指向站点之外，保持原样不会匹配
+            paths.append(path[1:] if path.startswith("/") else path.removeprefix("./"))
+    return paths
+
+
+def replace_preload_block(page, links):
+    """移除旧的 preload 区块，并在 </head> 所在行之前插入新的区块。"""
+    begin = page.find(PRELOAD_BEGIN_MARKER)
+    if begin >= 0:
+        line_start = page.rfind("\n", 0, begin) + 1
+        end = page.find(PRELOAD_END_MARKER, begin) + len(PRELOAD_END_MARKER)
+        if page[end:end + 1] == "\n":
+            end += 1
+        page = page[:line_start] + page[end:]
+
+    head_end = page.lower().find("</head>")
+    if not links or head_end < 0:
+        return page
+    line_start = page.rfind("\n", 0, head_end) + 1
+    block = "".join(f"  {line}\n" for line in (PRELOAD_BEGIN_MARKER, *links, PRELOAD_END_MARKER))
+    return page[:line_start] + block + page[line_start:]
+
+
+def build_preload_links(fonts, page, limit):
+    """index.html 首屏文字所用分片的 preload 标签，所有字体合计按首屏出现次数排序并截断到 limit 个。"""
+    visible = html_visible_text(page)
+    ranked = []
+    linked = set(linked_font_css(page))
+    for family, family_index in fonts.items():
+        if family_index["css"] not in linked:
+            continue
+        lookup = _shard_lookup(family_index)
+        counts = {}
+        for ch in visible:
+            shard = None if ch.isspace() else lookup(ord(ch))
+            if shard is not None:
+                counts[shard] = counts.get(shard, 0) + 1
+        ranked.extend((-count, family, shard) for shard, count in counts.items())
+    links = []
+    for _, family, shard in sorted(ranked)[:limit]:
+        href = quote(f"{fonts[family]['dir']}/{fonts[family]['shards'][shard]}")
+        links.append(f'<link rel="preload" href="{href}" as="font" type="font/woff2" crossorigin>')
+    return links
+
+
+def generate_font_index(site_dir, text_sources=DEFAULT_TEXT_SOURCES, page_filename="index.html", preload_limit=DEFAULT_PRELOAD_LIMIT):
+    """
+    生成 font-shards.json 并更新页面 preload，返回摘要 dict；站点中没有字体分片时返回 None。
+    """
+    fonts = discover_fonts(site_dir)
+    if not fonts:
+        return None
+
+    codepoints = collect_text_codepoints(site_dir, text_sources)
+    summary = {"fonts": {}, "text_codepoints": len(codepoints), "preload": 0}
+    for family, family_index in fonts.items():
+        needed = sorted(shards_for_codepoints(family_index, codepoints))
+        family_index["info"] = needed
+        summary["fonts"][family] = (len(needed), len(family_index["shards"]))
+
+    index = {
+        family: {
+            "css": family_index["css"],
+            "dir": family_index["dir"],
+            "shards": family_index["shards"],
+            "runs": encode_runs(family_index["ranges"]),
+            "info": family_index["info"],
+        }
+        for family, family_index in fonts.items()
+    }
+    with open(os.path.join(site_dir, FONT_INDEX_FILENAME), "w", encoding="utf-8") as f:
+        json.dump({"version": INDEX_VERSION, "fonts": index}, f, ensure_ascii=False, separators=(",", ":"))
+
+    page_path = os.path.join(site_dir, page_filename)
+    if os.path.exists(page_path):
+        with open(page_path, "r", encoding="utf-8") as f:
+            page = f.read()
+        links = build_preload_links(fonts, page, preload_limit)
+        updated = replace_preload_block(page, links)
+        if updated != page:
+            with open(page_path, "w", encoding="utf-8") as f:
+                f.write(updated)
+        summary["preload"] = len(links)
+    return summary
+
+
+def preload_limit_from_env():
+    """FONT_PRELOAD_LIMIT，非法值回落到 DEFAULT_PRELOAD_LIMIT，负数按 0 处理。"""
+    raw = os.environ.get("FONT_PRELOAD_LIMIT", "")
+    try:
+        return max(0, int(raw))
+    except ValueError:
+        return DEFAULT_PRELOAD_LIMIT
+
+
+def main(argv):
+    site_dir = argv[0] if argv else "output"
+    summary = generate_font_index(site_dir, preload_limit=preload_limit_from_env())
+    if summary is None:
+        print("未找到字体分片 (result.css)，跳过")
+        return
+    for family, (needed, total) in summary["fonts"].items():
+        print(f"  - {family}: info 文本需要 {needed}/{total} 个分片")
+    print(f"字体分片索引: {os.path.join(site_dir, FONT_INDEX_FILENAME)}，preload {summary['preload']} 个")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
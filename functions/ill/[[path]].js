@@ -0,0 +1,51 @@
+// Cloudflare Pages Function：/ill/* 随机曲绘入口。
+// 查找表由 generate_index 写入 info/ill-table.json，每次请求均匀随机挑一张，
+// 因此新增曲绘不需要再追加 _redirects 规则。
+
+export const TABLE_PATH = "/info/ill-table.json";
+const TABLE_TTL_MS = 60 * 1000;
+
+let cachedTable = null;
+let cachedAt = 0;
+
+export function isValidTable(table) {
+  return Boolean(
+    table &&
+      typeof table.prefix === "string" &&
+      typeof table.suffix === "string" &&
+      Array.isArray(table.items) &&
+      table.items.length > 0
+  );
+}
+
+export function pickIllustration(table, random = Math.random) {
+  if (!isValidTable(table)) return null;
+  const index = Math.min(table.items.length - 1, Math.floor(random() * table.items.length));
+  return `/${table.prefix}${table.items[index]}${table.suffix}`;
+}
+
+async function loadTable(context, now) {
+  if (cachedTable && now - cachedAt < TABLE_TTL_MS) return cachedTable;
+
+  const response = await context.env.ASSETS.fetch(new URL(TABLE_PATH, context.request.url));
+  if (!response.ok) return null;
+
+  const table = await response.json();
+  if (!isValidTable(table)) return null;
+  cachedTable = table;
+  cachedAt = now;
+  return table;
+}
+
+export async function onRequestGet(context) {
+  const table = await loadTable(context, Date.now());
+  const target = pickIllustration(table);
+  if (!target) return new Response("Not Found", { status: 404 });
+
+  const asset = await context.env.ASSETS.fetch(new URL(target, context.request.url));
+  const response = new Response(asset.body, asset);
+  // 同一 URL 每次都要重新抽取，禁止浏览器和 CDN 缓存这一层。
+  response.headers.set("Cache-Control", "no-store");
+  response.headers.set("X-Illustration-Path", encodeURI(target));
+  return response;
+}
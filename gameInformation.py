@@ -3,7 +3,9 @@ import os
 import sys
 import zipfile
 import csv
-from UnityPy import Environment
+from functools import lru_cache
+
+TYPETREE_PATH = "typetree.json"
 
 
 def _sanitize_song_id(song_id):
@@ -27,6 +29,12 @@ def _to_fixed_4_difficulty(difficulty_values):
         values.append("")
     return values
 
+@lru_cache(maxsize=4)
+def load_typetree(path=TYPETREE_PATH):
+    """解析 typetree.json；常驻进程 (watch.py) 中只解析一次。"""
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
 # 适配自动化：不再依赖 sys.argv，而是封装成函数供 main.py 调用
 def extract_game_info(apk_path, output_root="output"):
     print("--- 开始提取游戏基础信息 (GameInformation) ---")
@@ -36,12 +44,13 @@ def extract_game_info(apk_path, output_root="output"):
     os.makedirs(info_dir, exist_ok=True)
 
     # 加载 typetree (确保 typetree.json 在项目根目录)
-    if not os.path.exists("typetree.json"):
+    if not os.path.exists(TYPETREE_PATH):
         print("错误：找不到 typetree.json，无法解析数据！")
         return
 
-    with open("typetree.json", encoding='utf-8') as f:
-        typetree = json.load(f)
+    typetree = load_typetree(TYPETREE_PATH)
+
+    from UnityPy import Environment
 
     env = Environment()
     with zipfile.ZipFile(apk_path) as apk:
@@ -3,13 +3,39 @@ import json
 import shutil
 import hashlib
 import random
+import re
 import math
 from itertools import cycle
 
+import asset_deploy
+import file_index
+import font_shards
+import hash_cache
+import precompress
+
 # === 配置区域 ===
 OUTPUT_DIR = "output"
 JSON_INDEX_FILENAME = "files.json"
 CHECKSUM_FILENAME = "checksums.sha256"
+REDIRECTS_FILENAME = "_redirects"
+ROUTES_FILENAME = "_routes.json"
+ILL_TABLE_WEB_PATH = "info/ill-table.json"
+HEADERS_FILENAME = "_headers"
+ASSET_MANIFEST_FILENAME = "asset-manifest.json"
+# 内容寻址别名目录：h/<sha256 前 16 位>.<扩展名>，内容不变则 URL 不变
+HASHED_ALIAS_DIR = "h"
+HASHED_ALIAS_HASH_LENGTH = 16
+# 需要生成内容哈希别名的资源目录
+HASHED_ASSET_DIRS = (
+    "avatar",
+    "chart",
+    "illustration",
+    "illustrationBlur",
+    "illustrationLowRes",
+    "lilith",
+    "music",
+    "phira",
+)
 MANUAL_ASSETS_DIR = "manual_assets"
 
 # 要迁移的静态文件列表
@@ -20,6 +46,8 @@ STATIC_FILES_TO_COPY = [
     "favicon.svg",
     os.path.join("assets", "index.css"),
     os.path.join("assets", "search.js"),
+    os.path.join("assets", "search-engine.js"),
+    os.path.join("assets", "search-worker.js"),
 ]
 
 STATIC_FILE_WEB_PATHS = {
@@ -30,11 +58,43 @@ STATIC_FILE_WEB_PATHS = {
 METADATA_FILE_WEB_PATHS = {
     JSON_INDEX_FILENAME,
     CHECKSUM_FILENAME,
-    "_redirects",
+    REDIRECTS_FILENAME,
+    ROUTES_FILENAME,
+    ILL_TABLE_WEB_PATH,
+    ASSET_MANIFEST_FILENAME,
+    precompress.PRECOMPRESS_MANIFEST_FILENAME,
+    font_shards.FONT_INDEX_FILENAME,
     "version.txt",
     "info/version.txt",
 }
 
+# Cloudflare Pages 对 _redirects 的限制
+REDIRECTS_STATIC_RULE_LIMIT = 2000
+REDIRECTS_DYNAMIC_RULE_LIMIT = 100
+REDIRECTS_LINE_LENGTH_LIMIT = 1000
+# 曲绘虚拟入口默认最多占用的静态规则数，可用 ILL_REDIRECT_BUDGET 覆盖
+DEFAULT_ILL_REDIRECT_BUDGET = 1024
+ILL_REDIRECT_SECTION = "illustration"
+# /ill/ 随机入口的实现方式：redirects 为静态 _redirects 规则，
+# edge 为 functions/ill 下的 Pages Function 查表随机，规则数恒为 0。
+ILL_RANDOM_MODES = ("redirects", "edge")
+
+
+# 由索引阶段自己生成的目录，不进入搜索索引
+GENERATED_DIR_WEB_PREFIXES = (
+    f"{file_index.INDEX_DIR_NAME}/",
+    f"{HASHED_ALIAS_DIR}/",
+    "avatar-atlas/",
+)
+
+# Cloudflare Pages 对 _headers 的规则数限制
+HEADERS_RULE_LIMIT = 100
+HEADERS_SECTION = "cache"
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+SHORT_CACHE_CONTROL = "public, max-age=300, stale-while-revalidate=86400"
+DEFAULT_ASSET_CACHE_CONTROL = "public, max-age=2592000, stale-while-revalidate=2592000"
+CONTENT_HASHED_NAME_RE = re.compile(r"^[0-9a-f]{16,64}\.[0-9a-z]+$")
+
 
 def is_hidden_web_path(web_path):
     """判断 Web 路径是否包含隐藏目录或隐藏文件。"""
@@ -49,28 +109,6 @@ def calculate_sha256(filepath):
             sha256_hash.update(byte_block)
     return sha256_hash.hexdigest()
 
-def copy_missing_files(source_dir, target_dir):
-    copied_count = 0
-    skipped_count = 0
-
-    for root, dirs, files in os.walk(source_dir):
-        for file in files:
-            source_path = os.path.join(root, file)
-            relative_path = os.path.relpath(source_path, source_dir)
-            target_path = os.path.join(target_dir, relative_path)
-
-            parent_dir = os.path.dirname(target_path)
-            if parent_dir:
-                os.makedirs(parent_dir, exist_ok=True)
-
-            if os.path.exists(target_path):
-                skipped_count += 1
-                continue
-
-            shutil.copy2(source_path, target_path)
-            copied_count += 1
-
-    return copied_count, skipped_count
 
 def _collect_illustration_files(file_list_for_search, extension):
     suffix = f".{extension.lower()}"
@@ -85,8 +123,9 @@ def _build_group_redirect_rules(
     group_prefix,
     request_extension,
     hash_length=2,
-    min_groups=2,
+    min_groups=1,
     fixed_num_groups=None,
+    max_groups=None,
     rng=None,
 ):
     files = list(source_files)
@@ -101,6 +140,10 @@ def _build_group_redirect_rules(
     if num_groups is None:
         num_groups = math.ceil(len(files) / capacity_per_group)
     num_groups = max(min_groups, num_groups)
+    if max_groups is not None:
+        num_groups = min(num_groups, max_groups)
+    if num_groups <= 0:
+        return [], 0, capacity_per_group
 
     img_iterator = cycle(files)
     rules = []
@@ -115,7 +158,18 @@ def _build_group_redirect_rules(
     return rules, num_groups, capacity_per_group
 
 
-def build_illustration_redirect_rules(file_list_for_search, hash_length=2, min_groups=2, rng=None):
+def build_illustration_redirect_rules(
+    file_list_for_search,
+    hash_length=2,
+    min_groups=1,
+    rule_budget=None,
+    rng=None,
+):
+    """
+    生成 /ill/{group}/{hex}.jpg 虚拟入口。
+
+    rule_budget 限制静态规则总数，超出预算的分组会被裁掉。
+    """
     illustration_img_files = _collect_illustration_files(file_list_for_search, "png")
     img_ext = "png"
     if not illustration_img_files:
@@ -124,6 +178,10 @@ def build_illustration_redirect_rules(file_list_for_search, hash_length=2, min_g
     if not illustration_img_files:
         return [], {}
 
+    max_groups = None
+    if rule_budget is not None:
+        max_groups = max(0, rule_budget) // (16 ** hash_length)
+
     new_rules = []
     ill_rules, num_groups, capacity_per_group = _build_group_redirect_rules(
         illustration_img_files,
@@ -131,17 +189,23 @@ def build_illustration_redirect_rules(file_list_for_search, hash_length=2, min_g
         "jpg",
         hash_length=hash_length,
         min_groups=min_groups,
+        max_groups=max_groups,
         rng=rng,
     )
+    if not ill_rules:
+        return [], {}
+
     new_rules.append(
-        f"\n# === Auto-generated illustration redirects ({len(illustration_img_files)} {img_ext} files, {num_groups} groups) ==="
+        f"# === Auto-generated illustration redirects ({len(illustration_img_files)} {img_ext} files, {num_groups} groups) ==="
     )
     new_rules.extend(ill_rules)
 
+    reachable = min(len(illustration_img_files), num_groups * capacity_per_group)
     return new_rules, {
         "png_count": len(illustration_img_files),
         "num_groups": num_groups,
         "capacity_per_group": capacity_per_group,
+        "reachable_count": reachable,
     }
 
 
@@ -163,15 +227,377 @@ def remove_generated_illustration_redirects(content):
     return "\n".join(filtered_lines).rstrip()
 
 
-def generate_site_resources():
+def build_illustration_table(file_list_for_search):
+    """
+    生成 /ill/ 随机入口用的查找表：公共前后缀只存一次，条目去重排序。
+    条目保留原文件名的大小写；扩展名大小写不一致时后缀留空、扩展名留在条目里。
+    """
+    illustration_img_files = _collect_illustration_files(file_list_for_search, "png")
+    if not illustration_img_files:
+        illustration_img_files = _collect_illustration_files(file_list_for_search, "webp")
+    prefix = "illustration/"
+    names = {path[len(prefix):] for path in illustration_img_files}
+    suffix = os.path.splitext(min(names))[1] if names else ".png"
+    if not all(name.endswith(suffix) for name in names):
+        suffix = ""
+    items = sorted(name[:len(name) - len(suffix)] for name in names)
+    return {"version": 1, "prefix": prefix, "suffix": suffix, "items": items}
+
+
+def get_ill_random_mode():
+    mode = os.environ.get("ILL_RANDOM_MODE", "").strip().lower()
+    return mode if mode in ILL_RANDOM_MODES else ILL_RANDOM_MODES[0]
+
+
+def update_ill_routes(output_dir, mode):
+    """
+    edge 模式写出 _routes.json，只让 /ill/* 进入 Function，其余静态资源不产生调用计费；
+    其他模式删掉遗留的 _routes.json，否则 Function 仍会拦截 /ill/*。
+    """
+    routes_path = os.path.join(output_dir, ROUTES_FILENAME)
+    if mode == "edge":
+        with open(routes_path, "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "include": ["/ill/*"], "exclude": []}, f)
+    elif os.path.exists(routes_path):
+        os.remove(routes_path)
+
+
+def build_illustration_fallback_rules(hash_length=2):
+    """
+    曲绘虚拟入口的兜底动态规则：不存在的分组 302 到第 1 组的同名入口，
+    第 1 组里不存在的入口再落到首个入口，因此分组数变化后旧链接也不会 404。
+    规则按先匹配先生效：/ill/1/* 必须排在前面，否则 /ill/1/<缺失> 会被 :group 规则重定向回自身。
+    """
+    return [
+        f"/ill/1/* /ill/1/{0:0{hash_length}x}.jpg 302",
+        "/ill/:group/:entry /ill/1/:entry 302",
+    ]
+
+
+def _section_markers(section_name):
+    return (
+        f"# >>> somnia-xtower:{section_name} >>>",
+        f"# <<< somnia-xtower:{section_name} <<<",
+    )
+
+
+def has_marked_section(content, section_name):
+    begin_marker, end_marker = _section_markers(section_name)
+    begin = content.find(begin_marker)
+    return begin != -1 and content.find(end_marker, begin + len(begin_marker)) != -1
+
+
+def replace_marked_section(content, section_name, lines):
+    """
+    用 lines 替换 content 中属于 section_name 的自动生成区块，其余内容原样保留。
+
+    区块不存在时追加到末尾；lines 为空时删除整个区块。
+    _redirects 与 _headers 都使用 # 注释，因此共用同一套标记。
+    """
+    begin_marker, end_marker = _section_markers(section_name)
+    block = "\n".join([begin_marker, *lines, end_marker]) if lines else ""
+
+    if has_marked_section(content, section_name):
+        begin = content.find(begin_marker)
+        end = content.find(end_marker, begin + len(begin_marker)) + len(end_marker)
+        if not block:
+            # 连同区块后的换行和追加时补的空行一起删掉，避免留下空行。
+            if content[end:end + 1] == "\n":
+                end += 1
+            elif begin > 0 and content[begin - 1:begin] == "\n":
+                begin -= 1
+            if begin >= 2 and content[begin - 2:begin] == "\n\n":
+                begin -= 1
+        return content[:begin] + block + content[end:]
+
+    base = content.rstrip()
+    if not block:
+        return base + "\n" if base else ""
+    if base:
+        return f"{base}\n\n{block}\n"
+    return f"{block}\n"
+
+
+def replace_redirect_section(content, section_name, rules):
+    """
+    用 rules 替换 _redirects 中属于 section_name 的区块，其余内容原样保留。
+
+    找不到区块标记时视为旧版文件：先清理历史自动规则，再把新区块追加到末尾。
+    """
+    if not has_marked_section(content, section_name):
+        content = remove_generated_illustration_redirects(content)
+    return replace_marked_section(content, section_name, rules)
+
+
+def summarize_redirect_rules(content):
+    """统计 _redirects 中的静态/动态规则数量与最长行，用于对照平台上限。"""
+    static_count = 0
+    dynamic_count = 0
+    max_line_length = 0
+    for line in content.splitlines():
+        stripped = line.strip()
+        if not stripped or stripped.startswith("#"):
+            continue
+        max_line_length = max(max_line_length, len(stripped))
+        source = stripped.split(maxsplit=1)[0]
+        if "*" in source or ":" in source:
+            dynamic_count += 1
+        else:
+            static_count += 1
+    return {
+        "static": static_count,
+        "dynamic": dynamic_count,
+        "max_line_length": max_line_length,
+    }
+
+
+def format_redirect_limit_report(summary):
+    lines = []
+    for label, used, limit in (
+        ("静态规则", summary["static"], REDIRECTS_STATIC_RULE_LIMIT),
+        ("动态规则", summary["dynamic"], REDIRECTS_DYNAMIC_RULE_LIMIT),
+        ("最长行字符数", summary["max_line_length"], REDIRECTS_LINE_LENGTH_LIMIT),
+    ):
+        ratio = used / limit if limit else 0
+        warning = "  <-- 接近平台上限" if ratio >= 0.9 else ""
+        lines.append(f"  - {label}: {used}/{limit} ({ratio:.0%}){warning}")
+    return lines
+
+
+def _get_ill_redirect_budget():
+    raw = os.environ.get("ILL_REDIRECT_BUDGET", "")
+    try:
+        return max(0, int(raw))
+    except ValueError:
+        return DEFAULT_ILL_REDIRECT_BUDGET
+
+
+def _get_precompress_min_bytes():
+    raw = os.environ.get("PRECOMPRESS_MIN_BYTES", "")
+    try:
+        return max(0, int(raw))
+    except ValueError:
+        return precompress.DEFAULT_MIN_BYTES
+
+
+def update_illustration_redirects(redirects_path, file_list_for_search, rng=None, mode="redirects"):
+    """
+    在 _redirects 中就地更新曲绘虚拟入口区块，返回 (redirect_meta, 规则统计)。
+
+    edge 模式下随机入口由 Pages Function 处理，这里只清空区块。
+    """
+    existing_content = ""
+    if os.path.exists(redirects_path):
+        with open(redirects_path, "r", encoding="utf-8") as f:
+            existing_content = f.read()
+
+    # 预算扣除区块以外已占用的静态规则，保证整个文件不超过平台上限。
+    others = replace_redirect_section(existing_content, ILL_REDIRECT_SECTION, [])
+    remaining = REDIRECTS_STATIC_RULE_LIMIT - summarize_redirect_rules(others)["static"]
+    budget = max(0, min(_get_ill_redirect_budget(), remaining))
+
+    new_rules, redirect_meta = [], {}
+    if mode == "redirects":
+        new_rules, redirect_meta = build_illustration_redirect_rules(
+            file_list_for_search,
+            rule_budget=budget,
+            rng=rng,
+        )
+    if new_rules:
+        new_rules.extend(build_illustration_fallback_rules())
+    new_content = replace_redirect_section(existing_content, ILL_REDIRECT_SECTION, new_rules)
+    if new_content != existing_content:
+        with open(redirects_path, "w", encoding="utf-8") as f:
+            f.write(new_content)
+    redirect_meta["budget"] = budget
+    return redirect_meta, summarize_redirect_rules(new_content)
+
+
+def collect_file_hashes(output_dir, exclude_prefixes=(), exclude_suffixes=(), hash_cache=None):
+    """
+    计算 output 下所有公开文件的 SHA-256，返回 {web_path: hash}。
+    传入 hash_cache 时，大小与 mtime 未变的文件直接使用缓存中的哈希。
+    """
+    file_hashes = {}
+    for root, dirs, files in os.walk(output_dir):
+        for file in files:
+            full_path = os.path.join(root, file)
+            relative_path = os.path.relpath(full_path, output_dir).replace("\\", "/")
+
+            # 我们要校验所有公开文件，但隐藏目录和 checksum 文件本身不能包含进去。
+            if (
+                file == CHECKSUM_FILENAME
+                or is_hidden_web_path(relative_path)
+                or relative_path.startswith(exclude_prefixes)
+                or relative_path.endswith(exclude_suffixes)
+            ):
+                continue
+
+            if hash_cache is not None:
+                file_hashes[relative_path] = hash_cache.sha256(relative_path, full_path)
+            else:
+                file_hashes[relative_path] = calculate_sha256(full_path)
+    return file_hashes
+
+
+def write_checksum_file(checksum_path, file_hashes):
+    # 格式化: hash  filename，并按文件名排序，让文件更整洁
+    checksum_entries = [
+        f"{file_hash}  {relative_path}"
+        for relative_path, file_hash in sorted(file_hashes.items())
+    ]
+    with open(checksum_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(checksum_entries))
+
+
+def hashed_alias_path(web_path, file_hash):
+    extension = os.path.splitext(web_path)[1].lower()
+    return f"{HASHED_ALIAS_DIR}/{file_hash[:HASHED_ALIAS_HASH_LENGTH]}{extension}"
+
+
+def build_asset_manifest(file_hashes):
+    """生成 {原路径: 内容哈希别名}，只覆盖 HASHED_ASSET_DIRS 中的资源。"""
+    return {
+        web_path: hashed_alias_path(web_path, file_hash)
+        for web_path, file_hash in sorted(file_hashes.items())
+        if web_path.split("/", 1)[0] in HASHED_ASSET_DIRS
+    }
+
+
+def link_or_copy(source_path, target_path):
+    """优先硬链接（零拷贝），跨设备或文件系统不支持时回退为复制。"""
+    try:
+        os.link(source_path, target_path)
+    except OSError:
+        shutil.copy2(source_path, target_path)
+
+
+def sync_hashed_aliases(output_dir, asset_manifest):
+    """按清单补齐 h/ 下的别名文件并删除不再引用的旧别名，返回 (新增, 删除)。"""
+    alias_dir = os.path.join(output_dir, HASHED_ALIAS_DIR)
+    os.makedirs(alias_dir, exist_ok=True)
+
+    wanted = {}
+    for web_path, alias in asset_manifest.items():
+        wanted.setdefault(alias, web_path)
+
+    created = 0
+    for alias, web_path in wanted.items():
+        target_path = os.path.join(output_dir, *alias.split("/"))
+        if os.path.exists(target_path):
+            continue
+        link_or_copy(os.path.join(output_dir, *web_path.split("/")), target_path)
+        created += 1
+
+    removed = 0
+    for filename in os.listdir(alias_dir):
+        if f"{HASHED_ALIAS_DIR}/{filename}" not in wanted:
+            os.remove(os.path.join(alias_dir, filename))
+            removed += 1
+    return created, removed
+
+
+def _header_rule_paths(content):
+    return {
+        line.strip()
+        for line in content.splitlines()
+        if line.strip() and not line.startswith((" ", "\t")) and not line.lstrip().startswith("#")
+    }
+
+
+def is_content_hashed_dir(dir_path):
+    """
+    目录内绝大多数文件名本身就是内容哈希（如字体分片 <md5>.woff2）时视为内容寻址目录。
+    """
+    names = [entry.name for entry in os.scandir(dir_path) if entry.is_file()]
+    hashed = sum(1 for name in names if CONTENT_HASHED_NAME_RE.match(name))
+    return hashed > 0 and hashed >= len(names) * 0.9
+
+
+def content_hashed_extensions(dir_path):
+    """
+    内容寻址目录中可以 immutable 缓存的扩展名：该扩展名下的文件名全部是内容哈希。
+    同目录的 result.css、index.html 等非哈希文件不在其列，仍走默认缓存。
+    """
+    if not is_content_hashed_dir(dir_path):
+        return ()
+    hashed, plain = set(), set()
+    for entry in os.scandir(dir_path):
+        if entry.is_file():
+            extension = os.path.splitext(entry.name)[1][1:].lower()
+            (hashed if CONTENT_HASHED_NAME_RE.match(entry.name) else plain).add(extension)
+    return tuple(sorted(hashed - plain))
+
+
+def build_generated_header_rules(base_content, top_level_dirs, with_aliases, hashed_dirs=None):
+    """
+    根据实际产物生成 _headers 规则：hashed_dirs（目录 → 全为哈希文件名的扩展名）中的
+    哈希文件 immutable 一年，HASHED_ASSET_DIRS 中未被手写规则覆盖的目录使用默认的 30 天 + 重新验证。
+    """
+    existing = _header_rule_paths(base_content)
+    rules = []
+
+    def add(path, cache_control):
+        if path in existing:
+            return
+        rules.append(path)
+        # Pages 会把所有匹配规则的同名头拼接起来，先去掉 /* 等规则继承来的值
+        rules.append("  ! Cache-Control")
+        rules.append(f"  Cache-Control: {cache_control}")
+        rules.append("")
+
+    if with_aliases:
+        add(f"/{HASHED_ALIAS_DIR}/*", IMMUTABLE_CACHE_CONTROL)
+    add(f"/{ASSET_MANIFEST_FILENAME}", SHORT_CACHE_CONTROL)
+    for dirname, extensions in sorted((hashed_dirs or {}).items()):
+        for extension in extensions:
+            add(f"/{dirname}/*.{extension}", IMMUTABLE_CACHE_CONTROL)
+    for dirname in sorted(set(top_level_dirs) & set(HASHED_ASSET_DIRS)):
+        add(f"/{dirname}/*", DEFAULT_ASSET_CACHE_CONTROL)
+
+    while rules and not rules[-1]:
+        rules.pop()
+    return rules
+
+
+def count_header_rules(content):
+    return len(_header_rule_paths(content))
+
+
+def _hashed_aliases_enabled():
+    return os.environ.get("ASSET_HASHED_ALIASES", "").lower() in ("1", "true", "yes")
+
+
+def deploy_manual_assets():
+    """
+    把 manual_assets 中缺失的文件补齐到 output（不覆盖已有文件）。
+    文件哈希来自 asset_deploy 的哈希清单（源码树之外），新放置的文件直接登记到哈希缓存，校验和阶段不再读取。
+    """
+    if os.path.isdir(MANUAL_ASSETS_DIR):
+        print(f"\n[Step 1] 部署手动资源目录: {MANUAL_ASSETS_DIR} -> {OUTPUT_DIR}")
+        files, manifest_stats = asset_deploy.refresh_manifest(MANUAL_ASSETS_DIR)
+        print(
+            f"  - 哈希清单: {manifest_stats['files']} 个文件，git blob 校验 {manifest_stats['by_blob']}，"
+            f"size/mtime 校验 {manifest_stats['by_stat']}，重新哈希 {manifest_stats['rehashed']}"
+            + ("，已更新清单" if manifest_stats["written"] else "")
+        )
+        hashes = hash_cache.HashCache(OUTPUT_DIR)
+        counts = asset_deploy.deploy_manifest_files(MANUAL_ASSETS_DIR, OUTPUT_DIR, files, hash_cache=hashes)
+        hashes.save()
+        print(
+            f"  - 兜底补齐文件: reflink {counts['reflink']}，硬链接 {counts['hardlink']}，复制 {counts['copy']}，"
+            f"跳过同名文件: {counts['skipped']}"
+        )
+
+
+def generate_site_resources(with_manual_assets=True):
+    """with_manual_assets=False 时跳过第 1 步（pipeline 中已作为独立阶段提前执行）。"""
     print("--- 开始生成网站索引与静态文件 ---")
     os.makedirs(OUTPUT_DIR, exist_ok=True)
     
     # 1. 部署手动资源 (Manual Assets)
-    if os.path.isdir(MANUAL_ASSETS_DIR):
-        print(f"\n[Step 1] 部署手动资源目录: {MANUAL_ASSETS_DIR} -> {OUTPUT_DIR}")
-        copied_count, skipped_count = copy_missing_files(MANUAL_ASSETS_DIR, OUTPUT_DIR)
-        print(f"  - 兜底补齐文件: {copied_count}，跳过同名文件: {skipped_count}")
+    if with_manual_assets:
+        deploy_manual_assets()
 
     # 2. 复制静态文件 (覆盖 manual_assets)
     print("\n[Step 2] 部署静态文件...")
@@ -187,6 +613,17 @@ def generate_site_resources():
         else:
             print(f"  - 警告: 静态文件 {source_path} 不存在，跳过。")
 
+    # 2.5 字体分片索引：码点 → woff2 分片，以及首页首屏文字的 preload
+    font_summary = font_shards.generate_font_index(
+        OUTPUT_DIR,
+        preload_limit=font_shards.preload_limit_from_env(),
+    )
+    if font_summary:
+        print(f"\n[Step 2.5] 已生成字体分片索引: {font_shards.FONT_INDEX_FILENAME} (info 文本 {font_summary['text_codepoints']} 个字符)")
+        for family, (needed, total) in font_summary["fonts"].items():
+            print(f"  - {family}: 需要 {needed}/{total} 个分片")
+        print(f"  - index.html preload: {font_summary['preload']} 个分片")
+
     # 3. 生成 files.json
     print("\n[Step 3] 正在生成文件索引 (files.json)...")
     file_list_for_search = []
@@ -201,6 +638,8 @@ def generate_site_resources():
             if (
                 web_path in STATIC_FILE_WEB_PATHS
                 or web_path in METADATA_FILE_WEB_PATHS
+                or web_path.startswith(GENERATED_DIR_WEB_PREFIXES)
+                or precompress.is_precompressed_sibling(web_path)
                 or is_hidden_web_path(web_path)
             ):
                 continue
@@ -213,63 +652,158 @@ def generate_site_resources():
         json.dump(file_list_for_search, f, ensure_ascii=False)
     print(f"已生成搜索索引: {json_path} (共 {len(file_list_for_search)} 个资源条目)")
 
+    # 紧凑分片索引，上一版 index/ 目录可通过 FILES_INDEX_PREVIOUS_DIR 指定以生成增量
+    previous_index_dir = os.environ.get("FILES_INDEX_PREVIOUS_DIR") or None
+    index_manifest = file_index.write_compact_index(
+        OUTPUT_DIR,
+        file_list_for_search,
+        previous_index_dir=previous_index_dir,
+    )
+    index_dir = os.path.join(OUTPUT_DIR, file_index.INDEX_DIR_NAME)
+    report = file_index.index_size_report(index_dir, index_manifest)
+    print(
+        f"已生成分片索引: {index_dir} ({len(index_manifest['shards'])} 个分片, "
+        f"分片 {report['shards']} 字节, 清单 {report['manifest']} 字节, "
+        f"增量 {report['deltas']} 个共 {report['delta_bytes']} 字节, "
+        f"files.json {os.path.getsize(json_path)} 字节)"
+    )
+
     # 3.5 生成 illustration 虚拟入口
-    print("\n正在生成 illustration 虚拟入口 (_redirects)...")
-    new_rules, redirect_meta = build_illustration_redirect_rules(
+    ill_random_mode = get_ill_random_mode()
+    print(f"\n正在生成 illustration 虚拟入口 (模式: {ill_random_mode})...")
+    ill_table = build_illustration_table(file_list_for_search)
+    ill_table_path = os.path.join(OUTPUT_DIR, *ILL_TABLE_WEB_PATH.split("/"))
+    os.makedirs(os.path.dirname(ill_table_path), exist_ok=True)
+    with open(ill_table_path, "w", encoding="utf-8") as f:
+        json.dump(ill_table, f, ensure_ascii=False, separators=(",", ":"))
+    print(f"  - 已生成查找表: {ill_table_path} ({len(ill_table['items'])} 个曲绘)")
+
+    update_ill_routes(OUTPUT_DIR, ill_random_mode)
+
+    redirects_path = os.path.join(OUTPUT_DIR, REDIRECTS_FILENAME)
+    redirect_meta, redirect_summary = update_illustration_redirects(
+        redirects_path,
         file_list_for_search,
         rng=random.Random(0),
+        mode=ill_random_mode,
     )
 
-    if new_rules:
+    if "num_groups" in redirect_meta:
         print(f"  - 找到 {redirect_meta['png_count']} 个 png 曲绘文件")
         print(
-            f"  - 将生成 {redirect_meta['num_groups']} 个分组 (每组 {redirect_meta['capacity_per_group']} 个入口)"
+            f"  - 将生成 {redirect_meta['num_groups']} 个分组 (每组 {redirect_meta['capacity_per_group']} 个入口，预算 {redirect_meta['budget']} 条)"
         )
-        redirects_path = os.path.join(OUTPUT_DIR, "_redirects")
-
-        # 读取现有内容 (如果有)
-        existing_content = ""
-        if os.path.exists(redirects_path):
-            with open(redirects_path, "r", encoding="utf-8") as f:
-                existing_content = f.read()
-            existing_content = remove_generated_illustration_redirects(existing_content)
-
-        # 写入合并后的内容
-        with open(redirects_path, "w", encoding="utf-8") as f:
-            if existing_content:
-                f.write(existing_content + "\n")
-            f.write("\n".join(new_rules))
-
+        if redirect_meta["reachable_count"] < redirect_meta["png_count"]:
+            print(
+                f"  - 警告: 规则预算不足，仅 {redirect_meta['reachable_count']} 个曲绘可通过 /ill/ 访问"
+            )
         print(f"  - 已更新 _redirects 文件")
+    elif ill_random_mode == "edge":
+        print("  - 随机入口由 functions/ill 处理，_redirects 中不再生成曲绘规则")
     else:
-        print("  - 未找到 illustration/*.png，跳过虚拟入口生成。")
-
-    # 3. 生成校验和文件
+        print("  - 未找到 illustration/*.png 或规则预算不足，跳过虚拟入口生成。")
+    for line in format_redirect_limit_report(redirect_summary):
+        print(line)
+
+    # 4. 内容哈希清单 / 别名与 _headers
+    print(f"\n正在计算文件哈希...")
+    alias_prefix = f"{HASHED_ALIAS_DIR}/"
+    # 预压缩副本的哈希由压缩阶段直接给出，这里不再读取
+    hashes = hash_cache.HashCache(OUTPUT_DIR)
+    file_hashes = collect_file_hashes(
+        OUTPUT_DIR,
+        exclude_prefixes=(alias_prefix,),
+        exclude_suffixes=tuple(precompress.ENCODING_SUFFIXES.values()),
+        hash_cache=hashes,
+    )
+    hashes.save(keep=file_hashes)
+    print(f"  - 哈希缓存: 复用 {hashes.hits}，重新计算 {hashes.misses}")
+    source_hashes = dict(file_hashes)
+
+    asset_manifest = build_asset_manifest(file_hashes)
+    manifest_path = os.path.join(OUTPUT_DIR, ASSET_MANIFEST_FILENAME)
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(asset_manifest, f, ensure_ascii=False, separators=(",", ":"))
+    # 预压缩需要按新清单的内容判断是否变化
+    source_hashes[ASSET_MANIFEST_FILENAME] = calculate_sha256(manifest_path)
+    print(f"已生成哈希清单: {manifest_path} (共 {len(asset_manifest)} 个资源)")
+
+    with_aliases = _hashed_aliases_enabled()
+    if with_aliases:
+        created, removed = sync_hashed_aliases(OUTPUT_DIR, asset_manifest)
+        print(f"  - 内容哈希别名: 新增 {created}，清理 {removed}")
+        for web_path, alias in asset_manifest.items():
+            file_hashes[alias] = file_hashes[web_path]
+    elif os.path.isdir(os.path.join(OUTPUT_DIR, HASHED_ALIAS_DIR)):
+        shutil.rmtree(os.path.join(OUTPUT_DIR, HASHED_ALIAS_DIR))
+
+    # 文本类产物的 .br / .zst 预压缩副本
+    encodings = precompress.available_encodings()
+    precompress_min_bytes = _get_precompress_min_bytes()
+    precompressed, sibling_hashes, precompress_stats = precompress.precompress_outputs(
+        OUTPUT_DIR,
+        source_hashes,
+        min_bytes=precompress_min_bytes,
+        encodings=encodings,
+    )
+    file_hashes.update(sibling_hashes)
+    if encodings:
+        encoded_summary = ", ".join(
+            f"{encoding} {size} 字节" for encoding, size in precompress_stats["encoded_bytes"].items()
+        )
+        print(
+            f"  - 预压缩: 新压缩 {precompress_stats['compressed']}，复用 {precompress_stats['reused']}，"
+            f"原始 {precompress_stats['source_bytes']} 字节 -> {encoded_summary}"
+        )
+    else:
+        print("  - 预压缩: 未安装 brotli / zstandard，跳过")
+
+    headers_path = os.path.join(OUTPUT_DIR, HEADERS_FILENAME)
+    headers_content = ""
+    if os.path.exists(headers_path):
+        with open(headers_path, "r", encoding="utf-8") as f:
+            headers_content = f.read()
+    top_level_dirs = {
+        entry.name
+        for entry in os.scandir(OUTPUT_DIR)
+        if entry.is_dir() and not is_hidden_web_path(entry.name)
+    }
+    hashed_dirs = {
+        dirname: content_hashed_extensions(os.path.join(OUTPUT_DIR, dirname))
+        for dirname in top_level_dirs - {HASHED_ALIAS_DIR, file_index.INDEX_DIR_NAME}
+    }
+    base_headers = replace_marked_section(headers_content, HEADERS_SECTION, [])
+    header_rules = build_generated_header_rules(
+        base_headers,
+        top_level_dirs,
+        with_aliases,
+        hashed_dirs=hashed_dirs,
+    )
+    precompressed_rules = precompress.build_precompressed_header_rules(
+        precompressed,
+        extra_extensions=(".sha256",),
+        encodings=encodings,
+    )
+    if header_rules and precompressed_rules:
+        header_rules.append("")
+    header_rules.extend(precompressed_rules)
+    headers_content = replace_marked_section(headers_content, HEADERS_SECTION, header_rules)
+    with open(headers_path, "w", encoding="utf-8") as f:
+        f.write(headers_content)
+    rule_count = count_header_rules(headers_content)
+    print(f"  - 已更新 _headers: {rule_count}/{HEADERS_RULE_LIMIT} 条规则")
+
+    # 清单与 _headers 刚被改写，单独补算哈希
+    for web_path in (ASSET_MANIFEST_FILENAME, HEADERS_FILENAME, precompress.PRECOMPRESS_MANIFEST_FILENAME):
+        file_hashes[web_path] = calculate_sha256(os.path.join(OUTPUT_DIR, web_path))
+
+    # 5. 生成校验和文件
     print(f"\n正在生成终极校验和文件 ({CHECKSUM_FILENAME})...")
-    checksum_entries = []
-    
-    # 再次遍历 output 目录，这次包含所有文件
-    for root, dirs, files in os.walk(OUTPUT_DIR):
-        for file in files:
-            full_path = os.path.join(root, file)
-            relative_path = os.path.relpath(full_path, OUTPUT_DIR).replace("\\", "/")
-
-            # 我们要校验所有公开文件，但隐藏目录和 checksum 文件本身不能包含进去。
-            if file == CHECKSUM_FILENAME or is_hidden_web_path(relative_path):
-                continue
-            
-            # 计算哈希
-            file_hash = calculate_sha256(full_path)
-            
-            # 格式化: hash  filename
-            checksum_entries.append(f"{file_hash}  {relative_path}")
-
-    # 按文件名排序，让文件更整洁
-    checksum_entries.sort(key=lambda x: x.split("  ", 1)[1])
-    
     checksum_path = os.path.join(OUTPUT_DIR, CHECKSUM_FILENAME)
-    with open(checksum_path, "w", encoding="utf-8") as f:
-        f.write("\n".join(checksum_entries))
+    write_checksum_file(checksum_path, file_hashes)
+    if encodings:
+        # 校验和文件不能列出自身的压缩副本，单独压缩即可
+        precompress.write_siblings(checksum_path, encodings)
     print(f"已生成校验和文件: {checksum_path}")
 
 if __name__ == "__main__":
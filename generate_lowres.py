@@ -1,17 +1,32 @@
 """补齐 lilith 目录（WebP + AVIF）+ 确保 illustrationLowRes 为 PNG。
 
+LILITH_FORMATS / RESPONSIVE_FORMATS 中的质量为固定模式下的取值；IMAGE_QUALITY_MODE=ssim 时
+改为按图搜索（见 quality_search），源文件哈希作为缓存键。
+
 流程说明（PhiInfo 输出 PNG 后调用）：
   1. illustrationLowRes/*.png 已存在（PhiInfo 直接输出 PNG），无需转换
   2. illustration/*.png   → lilith/ill/*.webp + *.avif
   3. illustrationLowRes/*.png → lilith/illLow/*.webp + *.avif
   4. illustrationBlur/*.png   → lilith/illBlur/*.webp + *.avif
+  5. illustration/*.png   → lilith/w<宽度>/*.webp + *.avif（宽度阶梯，见 ILLUSTRATION_WIDTHS）
+                          + lilith/srcset/*.json（每首歌的可用变体及字节数）
+
+宽度阶梯与步骤 2 共用同一次解码，每个宽度只缩放一次、各格式共用；不放大，源图不够宽的档位跳过。
 """
+import json
 import os
 import sys
+import threading
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from PIL import Image
 
+import quality_search
+from hash_cache import sha256_file
+from image_export import PreparedImage
+
 OUTPUT_DIR = "output"
+DEFAULT_ILLUSTRATION_WIDTHS = (256, 512, 1024)
+SRCSET_DIR = "srcset"
 
 # 各子目录的编码参数
 LILITH_FORMATS = {
@@ -21,36 +36,183 @@ LILITH_FORMATS = {
 }
 
 
-def _encode_one(src_path: str, dst_dir: str, formats: dict) -> dict:
-    """处理单张 PNG，返回 {ext: count}。"""
+# 宽度阶梯的编码参数
+RESPONSIVE_FORMATS = {"webp": {"quality": 80, "method": 6}, "avif": {"quality": 55}}
+
+_quality_tuner_lock = threading.Lock()
+_quality_tuners = {}
+
+
+def get_quality_tuner():
+    """IMAGE_QUALITY_MODE=ssim 时按 OUTPUT_DIR 共用一个 QualityTuner，否则返回 None（各目录固定质量）。"""
+    with _quality_tuner_lock:
+        if OUTPUT_DIR not in _quality_tuners:
+            _quality_tuners[OUTPUT_DIR] = quality_search.tuner_from_env(OUTPUT_DIR)
+        return _quality_tuners[OUTPUT_DIR]
+
+
+def _save_kwargs(tuner, image, ext, kwargs, source_key):
+    return kwargs if tuner is None else tuner.save_kwargs(image, ext, kwargs, source_key=source_key)
+
+
+def parse_widths(raw_value: str | None) -> tuple[int, ...]:
+    """解析 ILLUSTRATION_WIDTHS（逗号分隔的像素宽度）；未设置时用默认阶梯，"none" / "0" 关闭。"""
+    if raw_value is None or not raw_value.strip():
+        return DEFAULT_ILLUSTRATION_WIDTHS
+    if raw_value.strip().lower() in ("none", "off", "0"):
+        return ()
+    widths = set()
+    for token in raw_value.split(","):
+        token = token.strip()
+        if not token:
+            continue
+        try:
+            width = int(token)
+        except ValueError:
+            print(f"  [warn] ILLUSTRATION_WIDTHS 中的无效宽度: {token}", flush=True)
+            continue
+        if width > 0:
+            widths.add(width)
+    return tuple(sorted(widths))
+
+
+ILLUSTRATION_WIDTHS = parse_widths(os.environ.get("ILLUSTRATION_WIDTHS"))
+
+
+def scaled_size(source_size: tuple[int, int], width: int) -> tuple[int, int]:
+    source_width, source_height = source_size
+    return width, max(1, round(source_height * width / source_width))
+
+
+def ladder_widths(source_width: int, widths=None) -> list[int]:
+    """源图宽度下实际生成的档位（不放大）。"""
+    return [width for width in (ILLUSTRATION_WIDTHS if widths is None else widths) if width < source_width]
+
+
+def _ladder_dir(width: int) -> str:
+    return os.path.join(OUTPUT_DIR, "lilith", f"w{width}")
+
+
+def _srcset_path(song_id: str) -> str:
+    return os.path.join(OUTPUT_DIR, "lilith", SRCSET_DIR, f"{song_id}.json")
+
+
+def _ladder_complete(song_id: str) -> bool:
+    """宽度阶梯与 srcset 清单是否都已存在；源图尺寸只读 PNG 头部。"""
+    if not ILLUSTRATION_WIDTHS:
+        return True
+    if not os.path.exists(_srcset_path(song_id)):
+        return False
+    with Image.open(os.path.join(OUTPUT_DIR, "illustration", f"{song_id}.png")) as img:
+        source_width = img.width
+    return all(
+        os.path.exists(os.path.join(_ladder_dir(width), f"{song_id}.{ext}"))
+        for width in ladder_widths(source_width)
+        for ext in RESPONSIVE_FORMATS
+    )
+
+
+def _encode_ladder(prepared: PreparedImage, song_id: str, source_key: str | None = None) -> dict:
+    """把已解码的整图按宽度阶梯缩放并编码，返回 {ext: count}。"""
+    tuner = get_quality_tuner()
+    counts = {ext: 0 for ext in RESPONSIVE_FORMATS}
+    source = prepared.convert("RGBA")
+    for width in ladder_widths(source.width):
+        dst_dir = _ladder_dir(width)
+        pending = [ext for ext in RESPONSIVE_FORMATS if not os.path.exists(os.path.join(dst_dir, f"{song_id}.{ext}"))]
+        if not pending:
+            continue
+        os.makedirs(dst_dir, exist_ok=True)
+        # reducing_gap 先做整数倍缩小再 Lanczos，大幅缩小时快很多且肉眼无差别
+        resized = PreparedImage(source.resize(scaled_size(source.size, width), Image.LANCZOS, reducing_gap=3.0))
+        for ext in pending:
+            dst_path = os.path.join(dst_dir, f"{song_id}.{ext}")
+            try:
+                out = resized.convert("RGB" if ext == "avif" else "RGBA")
+                kwargs = _save_kwargs(tuner, out, ext, RESPONSIVE_FORMATS[ext], source_key and f"{source_key}@w{width}")
+                out.save(dst_path, ext.upper(), **kwargs)
+                counts[ext] += 1
+            except Exception as e:
+                print(f"  [warn] 编码 {dst_path} 失败: {e}", flush=True)
+    return counts
+
+
+def write_srcset_manifest(song_id: str) -> dict | None:
+    """
+    汇总 song_id 已存在的曲绘变体，写入 lilith/srcset/<song_id>.json 并返回：
+    {"song", "width", "height", "variants": [{"path", "format", "width", "height", "bytes"}]}，
+    variants 按宽度、字节数从小到大排列，消费方取第一个宽度够用的即可。
+    """
+    source_path = os.path.join(OUTPUT_DIR, "illustration", f"{song_id}.png")
+    if not os.path.exists(source_path):
+        return None
+    with Image.open(source_path) as img:
+        source_size = img.size
+
+    candidates = [(f"illustration/{song_id}.png", "png", source_size)]
+    candidates += [(f"lilith/ill/{song_id}.{ext}", ext, source_size) for ext in LILITH_FORMATS["ill"]]
+    for width in ladder_widths(source_size[0]):
+        size = scaled_size(source_size, width)
+        candidates += [(f"lilith/w{width}/{song_id}.{ext}", ext, size) for ext in RESPONSIVE_FORMATS]
+
+    variants = []
+    for web_path, ext, (width, height) in candidates:
+        path = os.path.join(OUTPUT_DIR, *web_path.split("/"))
+        if os.path.exists(path):
+            variants.append({"path": web_path, "format": ext, "width": width, "height": height, "bytes": os.path.getsize(path)})
+    variants.sort(key=lambda variant: (variant["width"], variant["bytes"]))
+    manifest = {"song": song_id, "width": source_size[0], "height": source_size[1], "variants": variants}
+
+    manifest_path = _srcset_path(song_id)
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, separators=(",", ":"))
+    return manifest
+
+
+def _encode_one(src_path: str, dst_dir: str, formats: dict, ladder: bool = False) -> dict:
+    """处理单张 PNG，返回 {ext: count}；ladder=True 时顺带生成宽度阶梯与 srcset 清单。"""
     fname = os.path.basename(src_path)
     song_id = fname[:-4]
     counts = {ext: 0 for ext in formats}
 
     try:
-        img = Image.open(src_path).convert("RGBA")
+        img = Image.open(src_path)
+        img.load()
     except Exception as e:
         return {"__error__": f"跳过 {fname}: {e}"}
 
+    # 各格式共用转换结果：源图本身是 RGBA 时不再拷贝，AVIF 所需的 RGB 只转换一次
+    prepared = PreparedImage(img)
+    tuner = get_quality_tuner()
+    # 质量搜索结果按源文件哈希缓存，源图不变就不再试编码
+    source_key = sha256_file(src_path) if tuner is not None else None
     for ext, kwargs in formats.items():
         dst_path = os.path.join(dst_dir, f"{song_id}.{ext}")
         if os.path.exists(dst_path):
             continue
         try:
-            # WebP 支持 RGBA 直接保存，无需 copy；AVIF 需要转 RGB
-            if ext == "avif":
-                out = img.convert("RGB")
-            else:
-                out = img
-            out.save(dst_path, ext.upper(), **kwargs)
+            out = prepared.convert("RGB" if ext == "avif" else "RGBA")
+            out.save(dst_path, ext.upper(), **_save_kwargs(tuner, out, ext, kwargs, source_key))
             counts[ext] += 1
         except Exception as e:
             print(f"  [warn] 编码 {dst_path} 失败: {e}", flush=True)
 
+    if ladder and ILLUSTRATION_WIDTHS:
+        for ext, n in _encode_ladder(prepared, song_id, source_key).items():
+            counts[f"w/{ext}"] = counts.get(f"w/{ext}", 0) + n
+        write_srcset_manifest(song_id)
+
     img.close()
     return counts
 
 
+def _needs_encode(song_id: str, dst_dir: str, formats: dict, ladder: bool) -> bool:
+    if not all(os.path.exists(os.path.join(dst_dir, f"{song_id}.{ext}")) for ext in formats):
+        return True
+    return ladder and not _ladder_complete(song_id)
+
+
 def _convert_to_lilith(src_subdir: str, lilith_subdir: str, max_workers: int | None = None):
     """将 src_subdir/*.png 并行转换为 lilith/{lilith_subdir}/*.webp + *.avif"""
     src_dir = os.path.join(OUTPUT_DIR, src_subdir)
@@ -60,6 +222,7 @@ def _convert_to_lilith(src_subdir: str, lilith_subdir: str, max_workers: int | N
     os.makedirs(dst_dir, exist_ok=True)
 
     formats = LILITH_FORMATS[lilith_subdir]
+    ladder = lilith_subdir == "ill"
 
     # 收集待处理的 PNG 文件
     tasks = []
@@ -67,7 +230,7 @@ def _convert_to_lilith(src_subdir: str, lilith_subdir: str, max_workers: int | N
         if not fname.lower().endswith(".png"):
             continue
         src_path = os.path.join(src_dir, fname)
-        if all(os.path.exists(os.path.join(dst_dir, f"{fname[:-4]}.{ext}")) for ext in formats):
+        if not _needs_encode(fname[:-4], dst_dir, formats, ladder):
             continue  # 所有格式都已存在，跳过
         tasks.append(src_path)
 
@@ -82,21 +245,75 @@ def _convert_to_lilith(src_subdir: str, lilith_subdir: str, max_workers: int | N
 
     total_counts = {ext: 0 for ext in formats}
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = {executor.submit(_encode_one, src, dst_dir, formats): src for src in tasks}
+        futures = {executor.submit(_encode_one, src, dst_dir, formats, ladder): src for src in tasks}
         for future in as_completed(futures):
             result = future.result()
             if "__error__" in result:
                 print(f"  [warn] {result['__error__']}", flush=True)
             else:
                 for ext, n in result.items():
-                    total_counts[ext] += n
+                    total_counts[ext] = total_counts.get(ext, 0) + n
 
     for ext, n in total_counts.items():
-        print(f"  lilith/{lilith_subdir}: {n} .{ext}")
+        if ext.startswith("w/"):
+            print(f"  lilith/w*: {n} .{ext[2:]}（宽度阶梯 {', '.join(map(str, ILLUSTRATION_WIDTHS))}）")
+        else:
+            print(f"  lilith/{lilith_subdir}: {n} .{ext}")
 
 
-if __name__ == "__main__":
+# 源目录 → lilith 子目录
+LILITH_SOURCES = (
+    ("illustration", "ill"),
+    ("illustrationLowRes", "illLow"),
+    ("illustrationBlur", "illBlur"),
+)
+
+
+def list_lilith_songs():
+    """所有存在源 PNG 的歌曲 ID。"""
+    songs = set()
+    for src_subdir, _ in LILITH_SOURCES:
+        src_dir = os.path.join(OUTPUT_DIR, src_subdir)
+        if os.path.isdir(src_dir):
+            songs.update(fname[:-4] for fname in os.listdir(src_dir) if fname.lower().endswith(".png"))
+    return sorted(songs)
+
+
+def encode_song(song_id: str) -> dict:
+    """为单首歌补齐三个 lilith 子目录，返回 {ext: count}；供 pipeline 按歌曲调度。"""
+    total_counts = {}
+    for src_subdir, lilith_subdir in LILITH_SOURCES:
+        src_path = os.path.join(OUTPUT_DIR, src_subdir, f"{song_id}.png")
+        if not os.path.exists(src_path):
+            continue
+        dst_dir = os.path.join(OUTPUT_DIR, "lilith", lilith_subdir)
+        formats = LILITH_FORMATS[lilith_subdir]
+        ladder = lilith_subdir == "ill"
+        if not _needs_encode(song_id, dst_dir, formats, ladder):
+            continue
+        os.makedirs(dst_dir, exist_ok=True)
+        result = _encode_one(src_path, dst_dir, formats, ladder)
+        if "__error__" in result:
+            raise RuntimeError(result["__error__"])
+        for ext, n in result.items():
+            total_counts[ext] = total_counts.get(ext, 0) + n
+    return total_counts
+
+
+def save_quality_cache():
+    """把本次质量搜索的结果写回缓存；按歌曲调度时由 pipeline 在全部歌曲完成后调用。"""
+    tuner = get_quality_tuner()
+    if tuner is not None:
+        tuner.save()
+        print(f"  {tuner.summary()}")
+
+
+def main():
     workers = int(os.environ.get("LOWRES_WORKERS", "0")) or None
-    _convert_to_lilith("illustration", "ill", max_workers=workers)
-    _convert_to_lilith("illustrationLowRes", "illLow", max_workers=workers)
-    _convert_to_lilith("illustrationBlur", "illBlur", max_workers=workers)
+    for src_subdir, lilith_subdir in LILITH_SOURCES:
+        _convert_to_lilith(src_subdir, lilith_subdir, max_workers=workers)
+    save_quality_cache()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""output 下文件的 SHA-256 缓存（output/.hash-cache.json）。
+
+写文件时已知内容哈希的阶段（如 resource 流式模式）直接登记，generate_index 计算校验和时
+按 (size, mtime_ns) 命中缓存即可跳过读取；未命中的文件照常计算并补进缓存。
+缓存文件位于隐藏路径，不会被发布。
+"""
+import hashlib
+import json
+import os
+import threading
+
+HASH_CACHE_FILENAME = ".hash-cache.json"
+
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class HashCache:
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, HASH_CACHE_FILENAME)
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        if isinstance(data, dict):
+            self.entries = {
+                rel_path: entry
+                for rel_path, entry in data.items()
+                if isinstance(entry, dict) and {"sha256", "size", "mtime_ns"} <= entry.keys()
+            }
+
+    def _full_path(self, rel_path):
+        return os.path.join(self.output_dir, *rel_path.split("/"))
+
+    def record(self, rel_path, digest, full_path=None):
+        """登记刚写入文件的哈希（调用方保证 digest 对应写入的内容）。"""
+        stat = os.stat(full_path or self._full_path(rel_path))
+        with self._lock:
+            self.entries[rel_path] = {"sha256": digest, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    def sha256(self, rel_path, full_path=None):
+        """文件未变（大小与 mtime 一致）时返回缓存的哈希，否则重新计算并更新缓存。"""
+        full_path = full_path or self._full_path(rel_path)
+        stat = os.stat(full_path)
+        with self._lock:
+            entry = self.entries.get(rel_path)
+        if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            with self._lock:
+                self.hits += 1
+            return entry["sha256"]
+        digest = sha256_file(full_path)
+        with self._lock:
+            self.misses += 1
+            self.entries[rel_path] = {"sha256": digest, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        return digest
+
+    def save(self, keep=None):
+        """写回缓存；keep 给出时只保留其中的路径（丢弃已删除文件的条目）。"""
+        with self._lock:
+            entries = self.entries if keep is None else {k: v for k, v in self.entries.items() if k in keep}
+            self.entries = dict(entries)
+            os.makedirs(self.output_dir, exist_ok=True)
+            with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(entries, f, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+            os.replace(self.path + ".tmp", self.path)
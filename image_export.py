@@ -1,8 +1,12 @@
+from __future__ import annotations
+
 import os
 from io import BytesIO
-from typing import Callable, Iterable, Iterator, Sequence
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator, Sequence
 
-from PIL import Image
+# Pillow 在首次编码/探测格式时再导入，解析格式配置不需要它。
+if TYPE_CHECKING:
+    from PIL import Image
 
 DEFAULT_IMAGE_FORMATS: tuple[str, ...] = ("png", "webp")
 SUPPORTED_FORMATS: tuple[str, ...] = ("png", "webp", "jpeg", "avif")
@@ -44,6 +48,8 @@ def is_format_save_supported(fmt: str) -> bool:
     pil_format = PIL_SAVE_FORMAT.get(fmt)
     if not pil_format:
         return False
+    from PIL import Image
+
     Image.init()
     return pil_format in Image.SAVE
 
@@ -116,22 +122,87 @@ def _get_save_kwargs(fmt: str) -> dict[str, int]:
     return {}
 
 
-def _prepare_image_for_format(image: Image.Image, fmt: str) -> Image.Image:
-    if fmt == "jpeg":
-        # JPEG 不支持透明通道，统一铺白底后写入。
-        rgba = image.convert("RGBA")
-        background = Image.new("RGB", rgba.size, (255, 255, 255))
-        background.paste(rgba, mask=rgba.split()[-1])
-        return background
-    return image
+def _load_numpy():
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def flatten_alpha_array(rgba, background: int = 255):
+    """
+    把 (h, w, 4) uint8 的 RGBA 数组按 alpha 合成到纯色底上，返回 (h, w, 3) uint8。
+    整数运算与舍入和 Pillow 的 paste(mask=alpha) 完全一致，只分配一个 uint16 工作数组。
+    """
+    np = _load_numpy()
+    out = rgba[..., :3].astype(np.uint16)
+    alpha = rgba[..., 3:4].astype(np.uint16)
+    out *= alpha
+    np.subtract(255, alpha, out=alpha)
+    alpha *= background
+    out += alpha
+    # DIV255：(v + 128 + ((v + 128) >> 8)) >> 8
+    out += 128
+    out += out >> 8
+    out >>= 8
+    return out.astype(np.uint8)
+
+
+class PreparedImage:
+    """
+    一张待编码的图片及其像素转换结果。各格式共享同一份 RGBA / RGB / 白底 RGB，
+    每种转换对每张图最多做一次；与原图模式相同时直接复用原图，不做拷贝。
+    """
+
+    def __init__(self, image: Image.Image):
+        self.image = image
+        self._converted: dict[str, Image.Image] = {image.mode: image}
+
+    def convert(self, mode: str) -> Image.Image:
+        converted = self._converted.get(mode)
+        if converted is None:
+            converted = self._converted[mode] = self.image.convert(mode)
+        return converted
+
+    def flattened(self) -> Image.Image:
+        """铺白底后的 RGB 图（JPEG 不支持透明通道）。"""
+        flattened = self._converted.get("flattened")
+        if flattened is not None:
+            return flattened
+        if self.image.mode in ("RGB", "L"):
+            flattened = self.convert("RGB")
+        else:
+            from PIL import Image
+
+            rgba = self.convert("RGBA")
+            np = _load_numpy()
+            if np is not None:
+                flattened = Image.fromarray(flatten_alpha_array(np.asarray(rgba)))
+            else:
+                flattened = Image.new("RGB", rgba.size, (255, 255, 255))
+                flattened.paste(rgba, mask=rgba.getchannel("A"))
+        self._converted["flattened"] = flattened
+        return flattened
+
+    def for_format(self, fmt: str) -> Image.Image:
+        return self.flattened() if fmt == "jpeg" else self.image
+
+
+def _prepare_image_for_format(image: Image.Image | PreparedImage, fmt: str) -> Image.Image:
+    prepared = image if isinstance(image, PreparedImage) else PreparedImage(image)
+    return prepared.for_format(fmt)
 
 
 def iter_image_variant_payloads(
-    image: Image.Image,
+    image: Image.Image | PreparedImage,
     base_relative_path_no_ext: str,
     export_formats: Iterable[str],
     logger: Callable[[str], None] | None = print,
+    quality_tuner=None,
 ) -> Iterator[tuple[str, BytesIO]]:
+    # 同一张图的各格式共用转换结果；调用方可传入 PreparedImage 在多组输出间继续共用
+    prepared = image if isinstance(image, PreparedImage) else PreparedImage(image)
     for fmt in export_formats:
         normalized = normalize_format_token(fmt)
         pil_format = PIL_SAVE_FORMAT.get(normalized)
@@ -144,8 +215,12 @@ def iter_image_variant_payloads(
         output = BytesIO()
         target_path = f"{base_relative_path_no_ext}.{extension}"
         try:
-            prepared = _prepare_image_for_format(image, normalized)
-            prepared.save(output, pil_format, **_get_save_kwargs(normalized))
+            image_for_format = _prepare_image_for_format(prepared, normalized)
+            save_kwargs = _get_save_kwargs(normalized)
+            # quality_search.QualityTuner：按目标 SSIM 为这张图单独选质量
+            if quality_tuner is not None:
+                save_kwargs = quality_tuner.save_kwargs(image_for_format, normalized, save_kwargs)
+            image_for_format.save(output, pil_format, **save_kwargs)
             output.seek(0)
             yield target_path, output
         except Exception as exc:
@@ -1,15 +1,14 @@
+import argparse
 import os
 import sys
 import shutil
 import time
 import subprocess
-import platform
 
-# 引入你的功能模块
-import gameInformation
-import resource
-import phira 
-import generate_index
+# 各阶段模块（UnityPy、Pillow、numpy 等依赖较重）都在对应子命令里按需导入，
+# `python main.py <子命令>` 与 `import main` 不会加载用不到的依赖。
+APK_FILENAME = "game.apk"
+OUTPUT_DIR = "output"
 
 def flush_print(msg):
     """强制刷新打印，确保 GitHub Actions 日志实时显示"""
@@ -20,14 +19,28 @@ def check_environment():
     if shutil.which("aria2c") is None:
         flush_print("警告: 未找到 aria2c，下载速度可能会受限 (GitHub Actions 环境建议安装)")
 
-def download_apk(url, filename):
-    """使用 Aria2 下载 APK (多线程断点续传)"""
+def file_md5(path):
+    import hashlib
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def download_apk(url, filename, expected_md5=None):
+    """使用 Aria2 下载 APK (多线程断点续传)；给出 expected_md5 时校验下载结果"""
     flush_print(f"--- [Step 1] 开始下载 APK: {url} ---")
     
     if not url:
         flush_print("错误: 下载链接为空！")
         return False
 
+    # 删除上一版的 APK 与 aria2 控制文件：否则 aria2c 会把新版本另存为 game.1.apk，
+    # 下面的大小检查却在旧文件上通过，导致重建的是旧版本
+    for stale in (filename, filename + ".aria2"):
+        if os.path.exists(stale):
+            os.remove(stale)
+
     # 构建 aria2c 命令
     # -x 16: 16线程
     # -s 16: 16连接
@@ -36,6 +49,7 @@ def download_apk(url, filename):
         "aria2c", "-x", "16", "-s", "16", "-k", "1M",
         "--user-agent=Mozilla/5.0", 
         "--console-log-level=warn",
+        "--allow-overwrite=true", "--auto-file-renaming=false",
         "-o", filename, 
         url
     ]
@@ -44,8 +58,7 @@ def download_apk(url, filename):
         # 调用系统命令下载
         subprocess.run(cmd, check=True)
         if os.path.exists(filename) and os.path.getsize(filename) > 1024:
-            flush_print("下载成功！")
-            return True
+            return _verify_download(filename, expected_md5)
         else:
             flush_print("下载命令执行完毕，但文件似乎无效。")
             return False
@@ -62,46 +75,35 @@ def download_apk(url, filename):
                 with open(filename, 'wb') as f:
                     for chunk in r.iter_content(chunk_size=8192):
                         f.write(chunk)
-            return True
+            return _verify_download(filename, expected_md5)
         except Exception as e:
             flush_print(f"Requests 下载也失败了: {e}")
             return False
 
-def main():
-    start_time = time.time()
-    
-    # === 配置 ===
-    APK_FILENAME = "game.apk"
-    OUTPUT_DIR = "output"
-    
-    # 优先从环境变量获取链接 (GitHub Actions 传入)，如果没有则尝试读取 input 参数
-    # 注意：在 Actions yaml 里我们会把 inputs 映射到环境变量
-    APK_URL = os.environ.get('APK_DOWNLOAD_URL')
-
-    # === 初始化 ===
-    check_environment()
-    
-    # 清理旧的 output 目录，确保干净构建
-    if os.path.exists(OUTPUT_DIR):
-        flush_print(f"清理旧目录: {OUTPUT_DIR}")
-        shutil.rmtree(OUTPUT_DIR)
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
+def _verify_download(filename, expected_md5):
+    if expected_md5:
+        actual = file_md5(filename)
+        if actual.lower() != expected_md5.lower():
+            flush_print(f"下载的文件 MD5 不匹配: 期望 {expected_md5}，实际 {actual}")
+            return False
+    flush_print("下载成功！")
+    return True
 
-    # === 1. 下载 ===
-    if not APK_URL:
-        flush_print("警告: 环境变量 APK_DOWNLOAD_URL 未设置。如果你在本地已有 game.apk，将直接使用。")
-        if not os.path.exists(APK_FILENAME):
-            flush_print("错误: 本地找不到 game.apk 且未提供下载链接，退出。")
-            sys.exit(1)
-    else:
-        if not download_apk(APK_URL, APK_FILENAME):
-            sys.exit(1)
+def run_build_stages(apk_path, output_dir):
+    """下载之后的全部构建步骤；资源提取失败时返回 False。build 与 watch 常驻模式共用。"""
+    import avatar_atlas
+    import chart_format
+    import chart_stats
+    import gameInformation
+    import generate_index
+    import phira
+    import resource
 
     # === 2. 提取信息 (GameInfo) ===
     flush_print("\n--- [Step 2] 提取游戏文本信息 (GameInfo) ---")
     try:
         # 调用 gameInformation.py 中的函数
-        gameInformation.extract_game_info(APK_FILENAME, OUTPUT_DIR)
+        gameInformation.extract_game_info(apk_path, output_dir)
     except Exception as e:
         flush_print(f"!! 提取 GameInfo 失败: {e}")
         # Info 失败通常不影响资源提取，继续运行
@@ -110,18 +112,53 @@ def main():
     flush_print("\n--- [Step 3] 提取图片与音乐 (Resource) ---")
     try:
         # 调用 resource.py 中的函数
-        resource.extract_resources(APK_FILENAME, OUTPUT_DIR)
+        resource_stats = resource.extract_resources(apk_path, output_dir)
     except Exception as e:
         flush_print(f"!! 提取资源失败: {e}")
-        sys.exit(1) # 资源提取失败则是严重错误
+        return False
+    # RESOURCE_STREAMING=1 时谱面后处理与 Phira 打包已在提取时按歌曲完成
+    streamed = bool(resource_stats and resource_stats.get("streamed_songs"))
+
+    # === 3.5 谱面后处理 (可选) ===
+    # CHART_POSTPROCESS=minify,binary（或 1/all）：规范化压缩 JSON 并导出二进制谱面，需在打包 pez 前执行
+    chart_modes = chart_format.parse_postprocess_modes(os.environ.get("CHART_POSTPROCESS"))
+    if chart_modes and streamed:
+        flush_print("\n--- [Step 3.5] 谱面后处理已在流式提取中完成 ---")
+    elif chart_modes:
+        flush_print(f"\n--- [Step 3.5] 谱面后处理 ({', '.join(chart_modes)}) ---")
+        try:
+            flush_print(chart_format.format_postprocess_stats(chart_format.postprocess_charts(output_dir, chart_modes)))
+        except Exception as e:
+            flush_print(f"!! 谱面后处理失败: {e}")
+
+    # === 3.6 谱面统计表 (info/chart_stats.csv) ===
+    if chart_stats.np is None:
+        flush_print("\n--- [Step 3.6] 跳过谱面统计 (缺少 numpy) ---")
+    else:
+        flush_print("\n--- [Step 3.6] 生成谱面统计表 ---")
+        try:
+            total, computed, reused = chart_stats.build_chart_stats(output_dir, os.environ.get("CHART_STATS_PREVIOUS"))
+            flush_print(f"谱面统计: {total} 行 (重新计算 {computed}，复用 {reused})")
+        except Exception as e:
+            flush_print(f"!! 谱面统计失败: {e}")
 
     # === 4. 打包 Phira (.pez) ===
-    flush_print("\n--- [Step 4] 打包 Phira 资源 (.pez) ---")
+    if streamed and resource_stats["pez"]:
+        flush_print(f"\n--- [Step 4] Phira 已在流式提取中打包 ({resource_stats['pez']} 个) ---")
+    else:
+        flush_print("\n--- [Step 4] 打包 Phira 资源 (.pez) ---")
+        try:
+            # phira.py 会自动扫描 output_dir 并将结果写回 output_dir/phira
+            phira.generate_phira_packages()
+        except Exception as e:
+            flush_print(f"!! Phira 打包失败: {e}")
+
+    # === 4.5 头像图集 (avatar-atlas/) ===
+    flush_print("\n--- [Step 4.5] 生成头像图集 ---")
     try:
-        # phira.py 会自动扫描 OUTPUT_DIR 并将结果写回 OUTPUT_DIR/phira
-        phira.generate_phira_packages()
+        avatar_atlas.main([output_dir])
     except Exception as e:
-        flush_print(f"!! Phira 打包失败: {e}")
+        flush_print(f"!! 头像图集生成失败: {e}")
 
     # === 5. 生成索引 (Index) ===
     # 允许在 CI 中先跳过索引，待 PhiInfo 等后处理完成后再统一生成
@@ -135,10 +172,185 @@ def main():
         except Exception as e:
             flush_print(f"!! 生成索引失败: {e}")
 
+    return True
+
+def build():
+    start_time = time.time()
+    
+    # 优先从环境变量获取链接 (GitHub Actions 传入)，如果没有则尝试读取 input 参数
+    # 注意：在 Actions yaml 里我们会把 inputs 映射到环境变量
+    APK_URL = os.environ.get('APK_DOWNLOAD_URL')
+
+    # === 初始化 ===
+    check_environment()
+    
+    # 清理旧的 output 目录，确保干净构建
+    if os.path.exists(OUTPUT_DIR):
+        flush_print(f"清理旧目录: {OUTPUT_DIR}")
+        shutil.rmtree(OUTPUT_DIR)
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+    # === 1. 下载 ===
+    if not APK_URL:
+        flush_print("警告: 环境变量 APK_DOWNLOAD_URL 未设置。如果你在本地已有 game.apk，将直接使用。")
+        if not os.path.exists(APK_FILENAME):
+            flush_print("错误: 本地找不到 game.apk 且未提供下载链接，退出。")
+            sys.exit(1)
+    else:
+        if not download_apk(APK_URL, APK_FILENAME):
+            sys.exit(1)
+
+    if not run_build_stages(APK_FILENAME, OUTPUT_DIR):
+        sys.exit(1) # 资源提取失败则是严重错误
+
     # === 结束 ===
     elapsed = time.time() - start_time
     flush_print(f"\n=== 所有任务完成！耗时: {elapsed:.2f} 秒 ===")
     flush_print(f"输出目录: {os.path.abspath(OUTPUT_DIR)}")
 
+# ---------------- 子命令 ----------------
+def _cmd_build(_args):
+    build()
+
+
+def _cmd_info(args):
+    import gameInformation
+    gameInformation.extract_game_info(args.apk, OUTPUT_DIR)
+
+
+def _cmd_resource(args):
+    import resource
+    resource.extract_resources(args.apk, OUTPUT_DIR)
+
+
+def _cmd_extract(args):
+    import extract_backend
+    backend = extract_backend.get_backend(args.backend, shards=extract_backend.resolve_shards(args.shards))
+    categories = extract_backend.parse_categories(args.categories)
+    flush_print(f"--- 提取后端: {backend.name}，类别: {', '.join(categories)} ---")
+    backend.extract(args.apk, args.output, categories)
+
+
+def _cmd_benchmark(args):
+    import extract_backend
+    sys.exit(extract_backend.run_benchmark(
+        args.apk, args.work_dir, args.categories, extract_backend.resolve_shards(args.shards), args.per_category
+    ))
+
+
+def _cmd_translate(_args):
+    import translate
+    translate.main()
+
+
+def _cmd_lowres(_args):
+    import generate_lowres
+    generate_lowres.main()
+
+
+def _cmd_charts(args):
+    import chart_format
+    chart_format.main(["--benchmark"] if args.benchmark else [])
+
+
+def _cmd_chart_stats(_args):
+    import chart_stats
+    chart_stats.main([OUTPUT_DIR])
+
+
+def _cmd_phira(_args):
+    import phira
+    phira.generate_phira_packages()
+
+
+def _cmd_atlas(_args):
+    import avatar_atlas
+    sys.exit(avatar_atlas.main([OUTPUT_DIR]))
+
+
+def _cmd_index(_args):
+    import generate_index
+    generate_index.generate_site_resources()
+
+
+def _cmd_delta(args):
+    import deploy_delta
+    sys.exit(deploy_delta.main([OUTPUT_DIR] + ([args.previous] if args.previous else [])))
+
+
+def _cmd_sync(args):
+    import asset_sync
+    sys.exit(asset_sync.run(args.output, args.target, git_index=args.git_index))
+
+
+def _cmd_pipeline(_args):
+    import pipeline
+    sys.exit(pipeline.main([]))
+
+
+def _cmd_taptap(_args):
+    import taptap
+    taptap.main()
+
+
+def _cmd_watch(args):
+    import watch
+    watch.main(["--once"] if args.once else [])
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Somnia Xtower 资源构建工具，不带子命令时执行完整流程 (build)。")
+    subparsers = parser.add_subparsers(dest="command")
+
+    def add(name, handler, help_text):
+        sub = subparsers.add_parser(name, help=help_text)
+        sub.set_defaults(handler=handler)
+        return sub
+
+    add("build", _cmd_build, "完整流程：下载 APK → 提取 → 谱面后处理 → Phira → 索引")
+    add("info", _cmd_info, "提取游戏文本信息 (GameInformation)").add_argument("apk", nargs="?", default=APK_FILENAME)
+    add("resource", _cmd_resource, "用 UnityPy 提取图片 / 音乐 / 谱面").add_argument("apk", nargs="?", default=APK_FILENAME)
+    extract = add("extract", _cmd_extract, "用指定后端 (unitypy / phiinfo) 提取资源，产出相同的站点目录")
+    extract.add_argument("apk", nargs="?", default=APK_FILENAME)
+    extract.add_argument("--backend", default=os.environ.get("EXTRACT_BACKEND", "unitypy"), choices=("unitypy", "phiinfo"))
+    extract.add_argument("--shards", type=int, default=None, help="PhiInfo 并行分片数（默认读 PHIINFO_SHARDS）")
+    extract.add_argument("--categories", default="", help="只提取部分类别：image,audio,chart")
+    extract.add_argument("--output", default=OUTPUT_DIR)
+    benchmark = add("benchmark", _cmd_benchmark, "对比两种提取后端的耗时、CPU、峰值内存与产物一致性")
+    benchmark.add_argument("apk", nargs="?", default=APK_FILENAME)
+    benchmark.add_argument("--work-dir", default=os.environ.get("EXTRACT_BENCHMARK_DIR", "benchmark-output"))
+    benchmark.add_argument("--categories", default="", help="只测部分类别：image,audio,chart")
+    benchmark.add_argument("--shards", type=int, default=None, help="PhiInfo 并行分片数（默认读 PHIINFO_SHARDS）")
+    benchmark.add_argument("--per-category", action="store_true", help="每个类别单独运行，按类别推荐引擎")
+    add("translate", _cmd_translate, "将 PhiInfo 导出结果翻译为站点目录结构")
+    add("lowres", _cmd_lowres, "补齐 lilith WebP / AVIF")
+    add("charts", _cmd_charts, "谱面压缩与二进制导出 (CHART_POSTPROCESS)").add_argument(
+        "--benchmark", action="store_true", help="对比 json.load 与二进制谱面的加载耗时"
+    )
+    add("chart-stats", _cmd_chart_stats, "生成 info/chart_stats.csv")
+    add("phira", _cmd_phira, "打包 Phira (.pez)")
+    add("atlas", _cmd_atlas, "把 avatar/*.png 打包为头像图集与坐标索引（增量）")
+    add("index", _cmd_index, "生成 files.json / index / _redirects / _headers / checksums")
+    add("delta", _cmd_delta, "对比上次部署的 checksums.sha256，生成上传清单与变更日志").add_argument(
+        "previous", nargs="?", help="上次的 checksums.sha256 / 所在目录 / URL，默认取 DEPLOY_PREVIOUS"
+    )
+    sync = add("sync", _cmd_sync, "按校验和清单把 output/ 增量同步到 asset-xtower 检出目录")
+    sync.add_argument("target", help="asset-xtower 检出目录")
+    sync.add_argument("--output", default=OUTPUT_DIR)
+    sync.add_argument("--git-index", action="store_true", help="同步后只为变动的路径更新 git 索引")
+    add("pipeline", _cmd_pipeline, "按 DAG 并行执行 translate 之后的各阶段，输出关键路径报告")
+    add("taptap", _cmd_taptap, "查询 TapTap 最新版本与下载链接")
+    add("watch", _cmd_watch, "常驻轮询 TapTap，新版本增量构建").add_argument(
+        "--once", action="store_true", help="只检查一次"
+    )
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    handler = getattr(args, "handler", _cmd_build)
+    handler(args)
+
+
 if __name__ == "__main__":
     main()
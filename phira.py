@@ -1,6 +1,7 @@
 import os
 import shutil
 import zipfile
+from io import BytesIO
 from zipfile import ZipFile, ZipInfo
 
 BASE_DIR = "output"
@@ -33,6 +34,21 @@ def add_file_deterministic(zip_obj, file_path, arcname, compress_type=None):
     with open(file_path, "rb") as src, zip_obj.open(zinfo, "w") as dest:
         shutil.copyfileobj(src, dest, length=1024 * 1024)
 
+def add_source_deterministic(zip_obj, source, arcname, compress_type=None):
+    """source 为文件路径或内存中的 bytes，均以固定时间戳写入 Zip"""
+    if not isinstance(source, (bytes, bytearray, memoryview)):
+        add_file_deterministic(zip_obj, source, arcname, compress_type)
+        return
+
+    if compress_type is None:
+        compress_type = _choose_compress_type(arcname)
+
+    zinfo = ZipInfo(filename=arcname)
+    zinfo.date_time = FIXED_TIME
+    zinfo.compress_type = compress_type
+    zinfo.external_attr = 0o644 << 16
+    zip_obj.writestr(zinfo, bytes(source))
+
 def add_text_deterministic(zip_obj, text_content, arcname, compress_type=zipfile.ZIP_DEFLATED):
     """将文本以固定的时间戳写入 Zip"""
     zinfo = ZipInfo(filename=arcname)
@@ -41,16 +57,18 @@ def add_text_deterministic(zip_obj, text_content, arcname, compress_type=zipfile
     zinfo.external_attr = 0o644 << 16
     zip_obj.writestr(zinfo, text_content)
 
-def generate_phira_packages():
-    print("--- 开始打包 Phira (.pez) 文件 (确定性打包模式) ---")
+def prepare_phira_dir():
     if os.path.exists(PHIRA_DIR):
         shutil.rmtree(PHIRA_DIR)
     os.makedirs(PHIRA_DIR, exist_ok=True)
     for level in LEVELS:
         os.makedirs(os.path.join(PHIRA_DIR, level), exist_ok=True)
 
+
+def load_song_infos(base_dir=BASE_DIR):
+    """读取 info.tsv / difficulty.tsv，返回 {song_id: info}；缺文件时返回 None。"""
     infos = {}
-    info_path = os.path.join(BASE_DIR, "info", "info.tsv")
+    info_path = os.path.join(base_dir, "info", "info.tsv")
     try:
         with open(info_path, "r", encoding="utf8") as f:
             for line in f:
@@ -59,9 +77,9 @@ def generate_phira_packages():
                 infos[line[0]] = {"Name": line[1], "Composer": line[2], "Illustrator": line[3], "Chater": line[4:]}
     except FileNotFoundError:
         print(f"错误：找不到 info.tsv ({info_path})")
-        return
+        return None
 
-    diff_path = os.path.join(BASE_DIR, "info", "difficulty.tsv")
+    diff_path = os.path.join(base_dir, "info", "difficulty.tsv")
     try:
         with open(diff_path, "r", encoding="utf8") as f:
             for line in f:
@@ -71,54 +89,108 @@ def generate_phira_packages():
                     infos[line[0]]["difficulty"] = line[1:]
     except FileNotFoundError:
         print(f"错误：找不到 difficulty.tsv ({diff_path})")
-        return
+        return None
+    return infos
 
-    packaged_count = 0
+
+def iter_song_levels(info):
+    """依次给出 (level_index, level, difficulty_value)。"""
+    for level_index, difficulty_value in enumerate(info["difficulty"]):
+        if level_index >= len(LEVELS) or level_index >= len(info["Chater"]):
+            continue
+        yield level_index, LEVELS[level_index], difficulty_value
+
+
+def write_pez(target, song_id, info, level_index, difficulty_value, chart, picture, music):
+    """target 为 .pez 路径或 BytesIO；chart / picture / music 为文件路径或 bytes。"""
+    level = LEVELS[level_index]
+    with ZipFile(target, "w", compression=zipfile.ZIP_STORED) as pez:
+        # 1. 写入 info.txt (使用固定时间)
+        info_txt_content = (f"#\nName: {info['Name']}\nSong: {song_id}.ogg\nPicture: {song_id}.png\n"
+                            f"Chart: {song_id}.json\nLevel: {level} Lv.{difficulty_value}\n"
+                            f"Composer: {info['Composer']}\nIllustrator: {info['Illustrator']}\n"
+                            f"Charter: {info['Chater'][level_index]}")
+        add_text_deterministic(pez, info_txt_content, "info.txt", compress_type=zipfile.ZIP_DEFLATED)
+
+        # 2. 写入资源文件 (使用固定时间)
+        add_source_deterministic(pez, chart, f"{song_id}.json", compress_type=zipfile.ZIP_DEFLATED)
+        add_source_deterministic(pez, picture, f"{song_id}.png", compress_type=zipfile.ZIP_STORED)
+        add_source_deterministic(pez, music, f"{song_id}.ogg", compress_type=zipfile.ZIP_STORED)
+
+
+def pez_relative_path(song_id, level):
+    return f"phira/{level}/{song_id}-{level}.pez"
+
+
+def package_song(song_id, info):
+    """打包一首歌的全部难度，返回 (生成数量, 缺失原因列表)。"""
     missing_parts_log = []
+    if "difficulty" not in info:
+        return 0, missing_parts_log
 
-    for song_id, info in infos.items():
-        if "difficulty" not in info:
+    src_img = os.path.join(BASE_DIR, "illustrationLowRes", f"{song_id}.png")
+    src_music = os.path.join(BASE_DIR, "music", f"{song_id}.ogg")
+    if not (os.path.exists(src_img) and os.path.exists(src_music)):
+        missing_parts_log.append(f"Song '{song_id}': 缺失零件")
+        return 0, missing_parts_log
+
+    chart_dir = os.path.join(BASE_DIR, "chart", f"{song_id}.0")
+    packaged_count = 0
+
+    for level_index, level, difficulty_value in iter_song_levels(info):
+        src_chart = os.path.join(chart_dir, f"{level}.json")
+        if not os.path.exists(src_chart):
+            missing_parts_log.append(f"Song '{song_id}' Level '{level}': 缺失零件")
             continue
-        
-        src_img = os.path.join(BASE_DIR, "illustrationLowRes", f"{song_id}.png")
-        src_music = os.path.join(BASE_DIR, "music", f"{song_id}.ogg")
-        if not (os.path.exists(src_img) and os.path.exists(src_music)):
-            reason = f"Song '{song_id}': 缺失零件"
-            missing_parts_log.append(reason)
+
+        pez_filename = f"{song_id}-{level}.pez"
+        pez_path = os.path.join(PHIRA_DIR, level, pez_filename)
+        try:
+            write_pez(pez_path, song_id, info, level_index, difficulty_value, src_chart, src_img, src_music)
+            packaged_count += 1
+        except Exception as e:
+            print(f"!! 打包 {pez_filename} 失败: {e}")
+    return packaged_count, missing_parts_log
+
+
+def build_song_pez_payloads(song_id, info, charts, picture, music):
+    """
+    在内存中打包一首歌，charts 为 {level: chart bytes}。
+    返回 ([(相对 output 的路径, pez bytes)], 缺失原因列表)；与 package_song 产出的文件逐字节一致。
+    """
+    missing_parts_log = []
+    if "difficulty" not in info:
+        return [], missing_parts_log
+    if picture is None or music is None:
+        missing_parts_log.append(f"Song '{song_id}': 缺失零件")
+        return [], missing_parts_log
+
+    payloads = []
+    for level_index, level, difficulty_value in iter_song_levels(info):
+        chart = charts.get(level)
+        if chart is None:
+            missing_parts_log.append(f"Song '{song_id}' Level '{level}': 缺失零件")
             continue
+        buffer = BytesIO()
+        write_pez(buffer, song_id, info, level_index, difficulty_value, chart, picture, music)
+        payloads.append((pez_relative_path(song_id, level), buffer.getvalue()))
+    return payloads, missing_parts_log
+
+
+def generate_phira_packages():
+    print("--- 开始打包 Phira (.pez) 文件 (确定性打包模式) ---")
+    prepare_phira_dir()
+    infos = load_song_infos()
+    if infos is None:
+        return
 
-        chart_dir = os.path.join(BASE_DIR, "chart", f"{song_id}.0")
-
-        for level_index, difficulty_value in enumerate(info["difficulty"]):
-            if level_index >= len(LEVELS) or level_index >= len(info["Chater"]):
-                continue
-            level = LEVELS[level_index]
-            
-            src_chart = os.path.join(chart_dir, f"{level}.json")
-            if not os.path.exists(src_chart):
-                reason = f"Song '{song_id}' Level '{level}': 缺失零件"
-                missing_parts_log.append(reason)
-                continue
-
-            pez_filename = f"{song_id}-{level}.pez"
-            pez_path = os.path.join(PHIRA_DIR, level, pez_filename)
-            try:
-                with ZipFile(pez_path, "w", compression=zipfile.ZIP_STORED) as pez:
-                    # 1. 写入 info.txt (使用固定时间)
-                    info_txt_content = (f"#\nName: {info['Name']}\nSong: {song_id}.ogg\nPicture: {song_id}.png\n"
-                                        f"Chart: {song_id}.json\nLevel: {level} Lv.{difficulty_value}\n"
-                                        f"Composer: {info['Composer']}\nIllustrator: {info['Illustrator']}\n"
-                                        f"Charter: {info['Chater'][level_index]}")
-                    add_text_deterministic(pez, info_txt_content, "info.txt", compress_type=zipfile.ZIP_DEFLATED)
-
-                    # 2. 写入资源文件 (使用固定时间)
-                    add_file_deterministic(pez, src_chart, f"{song_id}.json", compress_type=zipfile.ZIP_DEFLATED)
-                    add_file_deterministic(pez, src_img, f"{song_id}.png", compress_type=zipfile.ZIP_STORED)
-                    add_file_deterministic(pez, src_music, f"{song_id}.ogg", compress_type=zipfile.ZIP_STORED)
-                    
-                    packaged_count += 1
-            except Exception as e:
-                print(f"!! 打包 {pez_filename} 失败: {e}")
+    packaged_count = 0
+    missing_parts_log = []
+
+    for song_id, info in infos.items():
+        count, missing = package_song(song_id, info)
+        packaged_count += count
+        missing_parts_log.extend(missing)
 
     if packaged_count == 0 and missing_parts_log:
         print("\n--- Phira 打包失败原因分析 (抽样) ---")
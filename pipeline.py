@@ -0,0 +1,359 @@
+"""阶段级 DAG 调度：按声明的输入 / 输出并行执行互不依赖的阶段，并记录关键路径。
+
+阶段分两种：
+  - 普通阶段：run() 执行一次；
+  - 按歌曲阶段：items() 给出歌曲列表，run_item(song) 逐首执行。若声明了 streams，
+    则上游按歌曲阶段完成某首歌后，该歌曲在下游立即开始，不必等上游全部结束。
+
+inputs / streams 中的名字对应其他阶段的 outputs。inputs 全部产出后阶段才会启动；
+上游失败时下游标记为 blocked 并跳过。
+"""
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+OUTPUT_DIR = "output"
+DEFAULT_REPORT_PATH = "pipeline-report.json"
+
+
+class Stage:
+    def __init__(self, name, run=None, inputs=(), outputs=(), items=None, run_item=None, streams=()):
+        if (run is None) == (run_item is None):
+            raise ValueError(f"阶段 {name} 需要且只能指定 run 或 run_item 之一")
+        if run_item is not None and items is None:
+            raise ValueError(f"按歌曲阶段 {name} 缺少 items")
+        self.name = name
+        self.run = run
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs) or (name,)
+        self.items = items
+        self.run_item = run_item
+        self.streams = tuple(streams)
+
+    @property
+    def per_item(self):
+        return self.run_item is not None
+
+
+class _StageState:
+    def __init__(self):
+        self.status = "pending"
+        self.started = None
+        self.finished = None
+        self.error = None
+        self.items = None
+        self.dispatched = set()
+        self.done = set()
+        self.failed = {}
+        self.skipped = set()
+
+
+def _producers(stages):
+    producers = {}
+    for stage in stages:
+        for output in stage.outputs:
+            if output in producers:
+                raise ValueError(f"产出 {output} 被多个阶段声明: {producers[output].name}, {stage.name}")
+            producers[output] = stage
+    for stage in stages:
+        for name in stage.inputs + stage.streams:
+            if name not in producers:
+                raise ValueError(f"阶段 {stage.name} 的输入 {name} 没有任何阶段产出")
+    return producers
+
+
+def run_stages(stages, max_workers=None, logger=print):
+    """执行 DAG，返回报告 dict（各阶段耗时、关键路径、总耗时）。"""
+    producers = _producers(stages)
+    states = {stage.name: _StageState() for stage in stages}
+    origin = time.perf_counter()
+    lock = threading.Lock()
+
+    def now():
+        return time.perf_counter() - origin
+
+    def upstream(stage, names):
+        return {producers[name].name for name in names}
+
+    def is_finished(name):
+        return states[name].status in ("done", "failed", "blocked")
+
+    def item_ready(stage, item):
+        """streams 上游都已处理完该歌曲（或上游已整体结束）时可以开始。"""
+        for name in upstream(stage, stage.streams):
+            state = states[name]
+            if item in state.failed or item in state.skipped or state.status in ("failed", "blocked"):
+                return None
+            if state.status == "done" or item in state.done:
+                continue
+            return False
+        return True
+
+    def run_whole(stage):
+        state = states[stage.name]
+        with lock:
+            state.started = now()
+        stage.run()
+
+    def run_one(stage, item):
+        state = states[stage.name]
+        with lock:
+            if state.started is None:
+                state.started = now()
+        stage.run_item(item)
+
+    with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count() or 4) as executor:
+        futures = {}
+
+        def finish(stage, status, error=None):
+            state = states[stage.name]
+            state.status = status
+            state.error = error
+            if state.started is None:
+                state.started = now()
+            state.finished = now()
+            detail = f": {error}" if error else ""
+            logger(f"[pipeline] {stage.name} {status} ({state.finished - state.started:.2f}s){detail}")
+
+        def schedule():
+            for stage in stages:
+                state = states[stage.name]
+                if state.status == "pending":
+                    deps = upstream(stage, stage.inputs) | upstream(stage, stage.streams)
+                    if any(states[name].status in ("failed", "blocked") for name in deps):
+                        finish(stage, "blocked")
+                        continue
+                    if not all(states[name].status == "done" for name in upstream(stage, stage.inputs)):
+                        continue
+                    state.status = "running"
+                    if not stage.per_item:
+                        futures[executor.submit(run_whole, stage)] = (stage, None)
+                        continue
+                    try:
+                        state.items = list(stage.items())
+                    except Exception as e:
+                        finish(stage, "failed", e)
+                        continue
+                    logger(f"[pipeline] {stage.name} 开始，共 {len(state.items)} 项")
+
+                if state.status == "running" and stage.per_item:
+                    for item in state.items:
+                        if item in state.dispatched:
+                            continue
+                        ready = item_ready(stage, item)
+                        if ready is None:
+                            state.dispatched.add(item)
+                            state.skipped.add(item)
+                        elif ready:
+                            state.dispatched.add(item)
+                            futures[executor.submit(run_one, stage, item)] = (stage, item)
+                    settled = len(state.done) + len(state.failed) + len(state.skipped)
+                    if settled == len(state.items):
+                        finish(stage, "failed" if state.failed and not state.done else "done")
+
+        schedule()
+        while futures:
+            completed, _ = wait(list(futures), return_when=FIRST_COMPLETED)
+            for future in completed:
+                stage, item = futures.pop(future)
+                state = states[stage.name]
+                error = future.exception()
+                if item is None:
+                    finish(stage, "failed" if error else "done", error)
+                elif error:
+                    state.failed[item] = error
+                    logger(f"[pipeline] {stage.name} [{item}] 失败: {error}")
+                else:
+                    state.done.add(item)
+            schedule()
+
+    for stage in stages:
+        if not is_finished(stage.name):
+            finish_time = now()
+            states[stage.name].status = "blocked"
+            states[stage.name].started = states[stage.name].started or finish_time
+            states[stage.name].finished = finish_time
+
+    return build_report(stages, states, producers, now())
+
+
+def critical_path(stages, states, producers):
+    """从最晚结束的阶段回溯，每步选择结束最晚的上游，得到决定总耗时的阶段链。"""
+    by_name = {stage.name: stage for stage in stages}
+    finished = [stage.name for stage in stages if states[stage.name].finished is not None]
+    if not finished:
+        return []
+    current = max(finished, key=lambda name: states[name].finished)
+    path = [current]
+    while True:
+        stage = by_name[current]
+        parents = {producers[name].name for name in stage.inputs + stage.streams}
+        parents = [name for name in parents if states[name].finished is not None]
+        if not parents:
+            break
+        current = max(parents, key=lambda name: states[name].finished)
+        path.append(current)
+    return list(reversed(path))
+
+
+def build_report(stages, states, producers, total_seconds):
+    report_stages = {}
+    for stage in stages:
+        state = states[stage.name]
+        entry = {
+            "status": state.status,
+            "start": round(state.started or 0.0, 3),
+            "end": round(state.finished or 0.0, 3),
+            "seconds": round((state.finished or 0.0) - (state.started or 0.0), 3),
+        }
+        if stage.per_item:
+            entry["items"] = len(state.items or ())
+            entry["failed_items"] = sorted(str(item) for item in state.failed)
+            entry["skipped_items"] = sorted(str(item) for item in state.skipped)
+        if state.error:
+            entry["error"] = str(state.error)
+        report_stages[stage.name] = entry
+
+    path = critical_path(stages, states, producers)
+    return {
+        "total_seconds": round(total_seconds, 3),
+        "stage_seconds": round(sum(entry["seconds"] for entry in report_stages.values()), 3),
+        "critical_path": path,
+        "critical_path_seconds": [report_stages[name]["seconds"] for name in path],
+        "stages": report_stages,
+    }
+
+
+def format_report(report):
+    lines = [
+        f"总耗时 {report['total_seconds']:.2f}s，各阶段耗时合计 {report['stage_seconds']:.2f}s",
+        "关键路径: " + " → ".join(
+            f"{name} ({seconds:.2f}s)" for name, seconds in zip(report["critical_path"], report["critical_path_seconds"])
+        ),
+    ]
+    for name, entry in report["stages"].items():
+        extra = f"，{entry['items']} 项" if "items" in entry else ""
+        lines.append(f"  {name:<14} {entry['status']:<8} {entry['start']:>8.2f}s → {entry['end']:>8.2f}s{extra}")
+    return "\n".join(lines)
+
+
+# ---------------- 站点构建 DAG（PhiInfo 导出之后） ----------------
+def build_site_stages(output_dir=OUTPUT_DIR, chart_modes=()):
+    """
+    translate → {lilith 编码, 谱面后处理 → 谱面统计, Phira 打包, manual_assets} → 索引 → 部署增量。
+    Phira 按歌曲流式跟随谱面后处理；各阶段模块按需导入。
+    """
+    def translate_run():
+        import translate
+        translate.main()
+
+    def lilith_items():
+        import generate_lowres
+        return generate_lowres.list_lilith_songs()
+
+    def lilith_item(song_id):
+        import generate_lowres
+        generate_lowres.encode_song(song_id)
+
+    def lilith_cache_run():
+        import generate_lowres
+        generate_lowres.save_quality_cache()
+
+    def chart_items():
+        from chart_stats import song_id_from_folder
+        chart_root = os.path.join(output_dir, "chart")
+        if not os.path.isdir(chart_root):
+            return []
+        return sorted(song_id_from_folder(folder) for folder in os.listdir(chart_root))
+
+    def chart_item(song_id):
+        import chart_format
+        stats = chart_format.postprocess_song_charts(output_dir, f"{song_id}.0", chart_modes)
+        if stats["errors"]:
+            raise RuntimeError(f"{stats['errors']} 个谱面处理失败")
+
+    def chart_stats_run():
+        import chart_stats
+        if chart_stats.np is None:
+            print("[pipeline] 缺少 numpy，跳过谱面统计")
+            return
+        chart_stats.main([output_dir])
+
+    phira_infos = {}
+
+    def phira_items():
+        import phira
+        phira.prepare_phira_dir()
+        phira_infos.clear()
+        phira_infos.update(phira.load_song_infos() or {})
+        return sorted(phira_infos)
+
+    def phira_item(song_id):
+        import phira
+        phira.package_song(song_id, phira_infos[song_id])
+
+    def manual_assets_run():
+        import generate_index
+        generate_index.deploy_manual_assets()
+
+    def index_run():
+        import generate_index
+        generate_index.generate_site_resources(with_manual_assets=False)
+
+    def avatar_atlas_run():
+        import avatar_atlas
+        avatar_atlas.main([output_dir])
+
+    def delta_run():
+        import deploy_delta
+        deploy_delta.main([output_dir])
+
+    stages = [
+        Stage("translate", translate_run, outputs=("assets", "info", "charts_raw")),
+        Stage("lilith", inputs=("assets",), items=lilith_items, run_item=lilith_item),
+        # IMAGE_QUALITY_MODE=ssim 时质量搜索结果在全部歌曲编码完成后一次写回
+        Stage("lilith_cache", lilith_cache_run, inputs=("lilith",)),
+    ]
+    if chart_modes:
+        stages.append(Stage("charts", inputs=("charts_raw",), items=chart_items, run_item=chart_item))
+    else:
+        stages.append(Stage("charts", lambda: None, inputs=("charts_raw",)))
+    stages += [
+        Stage("chart_stats", chart_stats_run, inputs=("charts",)),
+        Stage("phira", inputs=("assets", "info"), streams=("charts",), items=phira_items, run_item=phira_item),
+        # manual_assets 只补齐缺失文件，需等 translate 落盘后再执行，避免抢先占位
+        Stage("manual_assets", manual_assets_run, inputs=("info",)),
+        # 头像可能由 manual_assets 补齐，需等它完成再装箱
+        Stage("avatar_atlas", avatar_atlas_run, inputs=("assets", "manual_assets")),
+        Stage("index", index_run, inputs=("lilith", "chart_stats", "phira", "manual_assets", "avatar_atlas")),
+        # DEPLOY_PREVIOUS 指向上次部署的 checksums.sha256 时生成只含变更文件的上传清单
+        Stage("delta", delta_run, inputs=("index",)),
+    ]
+    return stages
+
+
+def main(argv):
+    import chart_format
+
+    chart_modes = chart_format.parse_postprocess_modes(os.environ.get("CHART_POSTPROCESS"))
+    from resource import _get_int_env
+
+    workers = _get_int_env("PIPELINE_WORKERS", 0, min_value=0) or None
+    report = run_stages(build_site_stages(OUTPUT_DIR, chart_modes), max_workers=workers)
+    print(format_report(report), flush=True)
+
+    report_path = os.environ.get("PIPELINE_REPORT", DEFAULT_REPORT_PATH)
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    failed = [name for name, entry in report["stages"].items() if entry["status"] != "done"]
+    if failed:
+        print(f"!! 以下阶段未完成: {', '.join(failed)}", flush=True)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,193 @@
+"""为文本类产物生成 .br / .zst 预压缩副本，静态托管与自建源站可直接返回压缩后的字节。"""
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+PRECOMPRESS_MANIFEST_FILENAME = "precompressed.json"
+# 只压缩文本类文件；图片、音频、.pez 本身已压缩
+PRECOMPRESS_EXTENSIONS = (".json", ".sha256", ".txt", ".tsv", ".csv", ".css", ".js", ".html", ".svg")
+DEFAULT_MIN_BYTES = 1024
+ENCODING_SUFFIXES = {
+    "br": ".br",
+    "zstd": ".zst",
+}
+CONTENT_TYPES = {
+    ".json": "application/json; charset=utf-8",
+    ".sha256": "text/plain; charset=utf-8",
+    ".txt": "text/plain; charset=utf-8",
+    ".tsv": "text/tab-separated-values; charset=utf-8",
+    ".csv": "text/csv; charset=utf-8",
+    ".css": "text/css; charset=utf-8",
+    ".js": "text/javascript; charset=utf-8",
+    ".html": "text/html; charset=utf-8",
+    ".svg": "image/svg+xml",
+}
+
+
+def available_encodings():
+    encodings = []
+    if brotli is not None:
+        encodings.append("br")
+    if zstandard is not None:
+        encodings.append("zstd")
+    return encodings
+
+
+def is_precompressed_sibling(web_path):
+    return web_path.endswith(tuple(ENCODING_SUFFIXES.values()))
+
+
+def should_precompress(web_path, size, min_bytes=DEFAULT_MIN_BYTES):
+    return (
+        size >= min_bytes
+        and web_path.lower().endswith(PRECOMPRESS_EXTENSIONS)
+        and not is_precompressed_sibling(web_path)
+    )
+
+
+def compress_bytes(data, encoding):
+    if encoding == "br":
+        return brotli.compress(data, quality=11)
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=19).compress(data)
+    raise ValueError(f"unknown encoding: {encoding}")
+
+
+def write_siblings(source_path, encodings):
+    """压缩单个文件并写出兄弟文件，返回 {编码: {size, sha256}}。"""
+    with open(source_path, "rb") as f:
+        data = f.read()
+    written = {}
+    for encoding in encodings:
+        compressed = compress_bytes(data, encoding)
+        # 压缩后没有变小就不提供该编码，避免客户端多下字节。
+        if len(compressed) >= len(data):
+            continue
+        with open(source_path + ENCODING_SUFFIXES[encoding], "wb") as f:
+            f.write(compressed)
+        written[encoding] = {"size": len(compressed), "sha256": hashlib.sha256(compressed).hexdigest()}
+    return written
+
+
+def _load_manifest(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _precompress_one(output_dir, web_path, source_hash, encodings, previous_entry):
+    """返回 (web_path, 清单条目, {兄弟文件路径: sha256}, 是否跳过)。"""
+    source_path = os.path.join(output_dir, *web_path.split("/"))
+    sibling_hashes = {}
+    entry = {"sha256": source_hash, "size": os.path.getsize(source_path)}
+
+    # 源文件未变且兄弟文件都还在时直接复用上次结果，不再压缩。
+    if previous_entry and previous_entry.get("sha256") == source_hash:
+        reusable = True
+        for encoding in encodings:
+            info = previous_entry.get(encoding)
+            sibling = source_path + ENCODING_SUFFIXES[encoding]
+            if not info or not os.path.exists(sibling):
+                reusable = False
+                break
+        if reusable:
+            for encoding in encodings:
+                entry[encoding] = previous_entry[encoding]
+                sibling_hashes[web_path + ENCODING_SUFFIXES[encoding]] = previous_entry[encoding]["sha256"]
+            return web_path, entry, sibling_hashes, True
+
+    for encoding, info in write_siblings(source_path, encodings).items():
+        entry[encoding] = info
+        sibling_hashes[web_path + ENCODING_SUFFIXES[encoding]] = info["sha256"]
+    return web_path, entry, sibling_hashes, False
+
+
+def precompress_outputs(output_dir, file_hashes, min_bytes=DEFAULT_MIN_BYTES, max_workers=None, encodings=None):
+    """
+    为 file_hashes 中的文本文件并行生成预压缩副本并写出清单。
+
+    file_hashes 为 {web_path: sha256}，通常来自索引阶段的哈希结果，
+    用于判断源文件是否变化。返回 (清单, {兄弟文件: sha256}, 统计)。
+    """
+    encodings = list(encodings if encodings is not None else available_encodings())
+    manifest_path = os.path.join(output_dir, PRECOMPRESS_MANIFEST_FILENAME)
+    # 即使当前没有可用编码器也要读旧清单，下面才能清理已过期的副本
+    previous = _load_manifest(manifest_path)
+
+    candidates = []
+    for web_path, source_hash in sorted(file_hashes.items()):
+        if web_path == PRECOMPRESS_MANIFEST_FILENAME:
+            continue
+        size = os.path.getsize(os.path.join(output_dir, *web_path.split("/")))
+        if should_precompress(web_path, size, min_bytes):
+            candidates.append((web_path, source_hash))
+
+    manifest = {}
+    sibling_hashes = {}
+    stats = {"compressed": 0, "reused": 0, "source_bytes": 0, "encoded_bytes": {enc: 0 for enc in encodings}}
+    if encodings and candidates:
+        with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count() or 4) as executor:
+            futures = [
+                executor.submit(_precompress_one, output_dir, web_path, source_hash, encodings, previous.get(web_path))
+                for web_path, source_hash in candidates
+            ]
+            for future in futures:
+                web_path, entry, hashes, reused = future.result()
+                if not any(encoding in entry for encoding in encodings):
+                    continue
+                manifest[web_path] = entry
+                sibling_hashes.update(hashes)
+                stats["reused" if reused else "compressed"] += 1
+                stats["source_bytes"] += entry["size"]
+                for encoding in encodings:
+                    if encoding in entry:
+                        stats["encoded_bytes"][encoding] += entry[encoding]["size"]
+
+    # 清理源文件已删除或不再满足条件时留下的旧副本
+    for web_path, entry in previous.items():
+        for encoding, suffix in ENCODING_SUFFIXES.items():
+            if encoding in entry and encoding not in manifest.get(web_path, {}):
+                sibling = os.path.join(output_dir, *web_path.split("/")) + suffix
+                if os.path.exists(sibling):
+                    os.remove(sibling)
+
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+    return manifest, sibling_hashes, stats
+
+
+def build_precompressed_header_rules(manifest, extra_extensions=(), encodings=None):
+    """直接请求 *.json.br 等副本时，告知浏览器按原类型解码。"""
+    pairs = {
+        (extension, encoding)
+        for extension in extra_extensions
+        for encoding in (encodings if encodings is not None else available_encodings())
+    }
+    for web_path, entry in manifest.items():
+        extension = os.path.splitext(web_path)[1].lower()
+        for encoding in ENCODING_SUFFIXES:
+            if encoding in entry:
+                pairs.add((extension, encoding))
+
+    rules = []
+    for extension, encoding in sorted(pairs):
+        rules.append(f"/*{extension}{ENCODING_SUFFIXES[encoding]}")
+        rules.append(f"  Content-Encoding: {encoding}")
+        rules.append(f"  Content-Type: {CONTENT_TYPES.get(extension, 'application/octet-stream')}")
+        rules.append("")
+    while rules and not rules[-1]:
+        rules.pop()
+    return rules
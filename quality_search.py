@@ -0,0 +1,217 @@
+"""按图片搜索编码质量：让每张图的 WebP / AVIF / JPEG 恰好达到目标 SSIM，而不是统一用固定质量。
+
+IMAGE_QUALITY_MODE=ssim 时启用（默认 fixed，行为不变）：
+  1. 把图缩小到最长边 QUALITY_PROBE_SIZE（默认 512）作为探针，只在探针上试编码；
+  2. 在该格式的质量区间内二分，找满足 SSIM ≥ IMAGE_TARGET_SSIM（默认 0.985）的最低质量，
+     试编码次数不超过 QUALITY_SEARCH_MAX_ENCODES（默认 6），用完时取已知满足目标的最低值；
+  3. 结果按 (源图哈希, 格式, 目标, 区间, 探针大小, 试编码上限, 其余编码参数) 缓存在
+     <输出目录>/.quality-cache.json（隐藏文件，不发布；QUALITY_CACHE_DIR 可指向输出目录之外，
+     跨整站重建保留），源图与参数不变的重建不再试编码。缓存在运行结束时由调用方 save() 一次写回。
+SSIM 在探针的亮度通道上按 8×8 窗口计算；平坦的曲绘会落到更低的质量，细节多的会升高。
+"""
+import hashlib
+import json
+import os
+import threading
+from io import BytesIO
+
+QUALITY_CACHE_FILENAME = ".quality-cache.json"
+QUALITY_CACHE_VERSION = 1
+DEFAULT_TARGET_SSIM = 0.985
+DEFAULT_MAX_ENCODES = 6
+DEFAULT_PROBE_SIZE = 512
+SSIM_WINDOW = 8
+# 各格式的搜索区间（含端点）
+QUALITY_BOUNDS = {
+    "webp": (40, 95),
+    "avif": (30, 90),
+    "jpeg": (50, 95),
+}
+PIL_SAVE_FORMAT = {"webp": "WEBP", "avif": "AVIF", "jpeg": "JPEG"}
+
+
+def ssim(reference, candidate, window=SSIM_WINDOW):
+    """两张同尺寸 "L" 图的平均 SSIM（均匀窗口，用积分图求局部均值与方差）。"""
+    import numpy as np
+
+    x = np.asarray(reference, dtype=np.float64)
+    y = np.asarray(candidate, dtype=np.float64)
+    window = max(1, min(window, x.shape[0], x.shape[1]))
+
+    def local_mean(values):
+        integral = np.zeros((values.shape[0] + 1, values.shape[1] + 1))
+        np.cumsum(np.cumsum(values, axis=0), axis=1, out=integral[1:, 1:])
+        total = integral[window:, window:] - integral[:-window, window:] - integral[window:, :-window] + integral[:-window, :-window]
+        return total / (window * window)
+
+    c1 = (0.01 * 255) ** 2
+    c2 = (0.03 * 255) ** 2
+    mu_x = local_mean(x)
+    mu_y = local_mean(y)
+    var_x = local_mean(x * x) - mu_x * mu_x
+    var_y = local_mean(y * y) - mu_y * mu_y
+    cov = local_mean(x * y) - mu_x * mu_y
+    score = ((2 * mu_x * mu_y + c1) * (2 * cov + c2)) / ((mu_x * mu_x + mu_y * mu_y + c1) * (var_x + var_y + c2))
+    return float(score.mean())
+
+
+def make_probe(image, probe_size=DEFAULT_PROBE_SIZE):
+    """缩小到最长边不超过 probe_size 的探针图（本身够小时原样返回）。"""
+    from PIL import Image
+
+    longest = max(image.size)
+    if longest <= probe_size:
+        return image
+    scale = probe_size / longest
+    size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    return image.resize(size, Image.BILINEAR, reducing_gap=2.0)
+
+
+def _luma(image):
+    """比较用的亮度图；带透明通道的按白底合成，与 JPEG 导出一致。"""
+    from image_export import PreparedImage
+
+    return PreparedImage(image).flattened().convert("L")
+
+
+def search_quality(image, fmt, target, bounds, max_encodes=DEFAULT_MAX_ENCODES, save_kwargs=None):
+    """
+    在 bounds=(lo, hi) 内二分找 SSIM ≥ target 的最低质量。image 应为已缩小的探针，且已是该格式要编码的模式。
+    返回 {"quality", "ssim", "encodes"}；连 hi 都达不到目标时返回 hi。
+    """
+    from PIL import Image
+
+    reference = _luma(image)
+    extra = {key: value for key, value in (save_kwargs or {}).items() if key != "quality"}
+    scores = {}
+
+    def score_at(quality):
+        output = BytesIO()
+        image.save(output, PIL_SAVE_FORMAT[fmt], quality=quality, **extra)
+        output.seek(0)
+        with Image.open(output) as decoded:
+            scores[quality] = ssim(reference, _luma(decoded))
+        return scores[quality]
+
+    lo, hi = bounds
+    best = hi
+    if score_at(hi) >= target:
+        # 不变式：best 满足目标，lo - 1 以下未知或不满足
+        while lo < best and len(scores) < max_encodes:
+            mid = (lo + best) // 2
+            if score_at(mid) >= target:
+                best = mid
+            else:
+                lo = mid + 1
+    return {"quality": best, "ssim": scores.get(best), "encodes": len(scores)}
+
+
+def image_digest(image):
+    """内存中图像的内容哈希（模式 + 尺寸 + 像素）。"""
+    digest = hashlib.sha256(f"{image.mode}:{image.width}x{image.height}:".encode("ascii"))
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+class QualityCache:
+    """缓存键 → 质量；多线程共用一个实例，只在内存中更新，save() 时整体写回。"""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.dirty = False
+        self._lock = threading.Lock()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        if isinstance(data, dict) and data.get("version") == QUALITY_CACHE_VERSION:
+            self.entries = data.get("entries", {})
+
+    def get(self, key):
+        with self._lock:
+            return self.entries.get(key)
+
+    def put(self, key, value):
+        with self._lock:
+            self.entries[key] = value
+            self.dirty = True
+
+    def save(self):
+        """有新条目时原子地写回缓存文件。"""
+        with self._lock:
+            if not self.dirty:
+                return
+            entries = dict(self.entries)
+            self.dirty = False
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"version": QUALITY_CACHE_VERSION, "entries": entries}, f, separators=(",", ":"), sort_keys=True)
+        os.replace(self.path + ".tmp", self.path)
+
+
+class QualityTuner:
+    def __init__(self, cache_dir, target=DEFAULT_TARGET_SSIM, max_encodes=DEFAULT_MAX_ENCODES, probe_size=DEFAULT_PROBE_SIZE):
+        self.cache = QualityCache(os.path.join(cache_dir, QUALITY_CACHE_FILENAME))
+        self.target = target
+        self.max_encodes = max_encodes
+        self.probe_size = probe_size
+        self.searches = 0
+        self.hits = 0
+        self.encodes = 0
+        self._lock = threading.Lock()
+
+    def save_kwargs(self, image, fmt, save_kwargs, source_key=None):
+        """
+        返回替换了 quality 的编码参数；fmt 不支持质量搜索时原样返回。
+        image 为实际要编码的图；source_key 为源文件哈希等稳定标识，缺省时对像素求哈希。
+        """
+        bounds = QUALITY_BOUNDS.get(fmt)
+        if bounds is None or "quality" not in save_kwargs:
+            return save_kwargs
+        extra = ",".join(f"{name}={value}" for name, value in sorted(save_kwargs.items()) if name != "quality")
+        key = (
+            f"{source_key or image_digest(image)}:{fmt}:{self.target}:{bounds[0]}-{bounds[1]}"
+            f":{self.probe_size}:{self.max_encodes}:{extra}"
+        )
+        cached = self.cache.get(key)
+        if cached is not None:
+            with self._lock:
+                self.hits += 1
+            return {**save_kwargs, "quality": cached["quality"]}
+
+        result = search_quality(make_probe(image, self.probe_size), fmt, self.target, bounds, self.max_encodes, save_kwargs)
+        self.cache.put(key, {"quality": result["quality"], "ssim": result["ssim"]})
+        with self._lock:
+            self.searches += 1
+            self.encodes += result["encodes"]
+        return {**save_kwargs, "quality": result["quality"]}
+
+    def save(self):
+        self.cache.save()
+
+    def summary(self):
+        return f"质量搜索 {self.searches} 次（试编码 {self.encodes} 次），缓存命中 {self.hits} 次，目标 SSIM {self.target}"
+
+
+def _env_number(name, default, cast):
+    raw = os.environ.get(name)
+    if not raw:
+        return default
+    try:
+        return cast(raw)
+    except ValueError:
+        return default
+
+
+def tuner_from_env(cache_dir):
+    """IMAGE_QUALITY_MODE=ssim 时返回 QualityTuner，否则返回 None（沿用固定质量）。"""
+    if os.environ.get("IMAGE_QUALITY_MODE", "fixed").strip().lower() != "ssim":
+        return None
+    return QualityTuner(
+        os.environ.get("QUALITY_CACHE_DIR") or cache_dir,
+        target=_env_number("IMAGE_TARGET_SSIM", DEFAULT_TARGET_SSIM, float),
+        max_encodes=max(1, _env_number("QUALITY_SEARCH_MAX_ENCODES", DEFAULT_MAX_ENCODES, int)),
+        probe_size=max(16, _env_number("QUALITY_PROBE_SIZE", DEFAULT_PROBE_SIZE, int)),
+    )
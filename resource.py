@@ -1,5 +1,8 @@
 import base64
+import hashlib
 import os
+import shutil
+import struct
 import sys
 import json
 import threading
@@ -7,18 +10,16 @@ import time
 from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
 from queue import Queue
+from functools import lru_cache
 from zipfile import ZipFile
 
-from UnityPy import Environment
-from UnityPy.classes import AudioClip, Sprite
-from UnityPy.enums import ClassIDType
-from image_export import iter_image_variant_payloads, resolve_export_formats
+import bundle_schedule
+import quality_search
+from hash_cache import HashCache
+from image_export import PreparedImage, iter_image_variant_payloads, resolve_export_formats
+from texture_cache import TextureCache
 
-try:
-    from fsb5 import FSB5
-except ImportError:
-    print("警告: 缺少 fsb5 模块，音频将无法解码。请运行 'pip install fsb5'。")
-    FSB5 = None
+# UnityPy / fsb5 导入较慢，只在真正提取资源时加载
 
 # ---------------- 配置区域 ----------------
 CONFIG = {
@@ -39,6 +40,8 @@ ILLUSTRATION_IMAGE_EXPORT_FORMATS = ("png",)
 LILITH_ILL_EXPORT_FORMATS = ("webp", "avif")
 LILITH_ILL_LOW_EXPORT_FORMATS = ("webp", "avif")
 LILITH_ILL_BLUR_EXPORT_FORMATS = ("webp", "avif")
+# IMAGE_QUALITY_MODE=ssim 时为 quality_search.QualityTuner
+QUALITY_TUNER = None
 
 
 def resolve_illustration_export_formats(raw_formats=None, support_checker=None, logger=print):
@@ -97,6 +100,15 @@ def resolve_lilith_ill_blur_export_formats(raw_formats=None, support_checker=Non
     return tuple(fmt for fmt in resolved_with_png if fmt != "png")
 
 # ---------------- 工具类与函数 ----------------
+@lru_cache(maxsize=1)
+def _load_fsb5():
+    try:
+        from fsb5 import FSB5
+    except ImportError:
+        print("警告: 缺少 fsb5 模块，音频将无法解码。请运行 'pip install fsb5'。")
+        return None
+    return FSB5
+
 class ByteReader:
     def __init__(self, data):
         self.data = data
@@ -121,24 +133,8 @@ def _get_int_env(name, default, min_value=1, max_value=None):
         value = min(max_value, value)
     return value
 
-def _should_keep_key(key):
-    if key.startswith("avatar."):
-        return CONFIG["avatar"]
-    normalized = key.replace("\\", "/")
-    if CONFIG["chart"] and "/Chart_" in normalized and normalized.endswith(".json"):
-        return True
-    if CONFIG["music"] and normalized.endswith(".0/music.wav"):
-        return True
-    if CONFIG["illustration"] and "Illustration." in normalized:
-        return True
-    if CONFIG["illustrationBlur"] and "IllustrationBlur." in normalized:
-        return True
-    if CONFIG["illustrationLowRes"] and "IllustrationLowRes." in normalized:
-        return True
-    return False
-
-def io_worker(stop_token, stats, stats_lock, log_every):
-    """消费者线程：专门负责写文件"""
+def io_worker(stop_token, stats, stats_lock, log_every, hash_cache=None):
+    """消费者线程：专门负责写文件。队列项带有内容哈希时登记到 hash_cache。"""
     created_dirs = set()
     local_written = 0
     while True:
@@ -147,7 +143,8 @@ def io_worker(stop_token, stats, stats_lock, log_every):
             queue_in.task_done()
             break
         
-        rel_path, resource = item
+        rel_path, resource = item[0], item[1]
+        digest = item[2] if len(item) > 2 else None
         full_path = os.path.join(OUTPUT_ROOT, rel_path)
         dir_path = os.path.dirname(full_path)
         if dir_path and dir_path not in created_dirs:
@@ -165,6 +162,8 @@ def io_worker(stop_token, stats, stats_lock, log_every):
                 if stats["write_errors"] <= 5:
                     print(f"Error writing {rel_path}: {e}", flush=True)
         else:
+            if digest and hash_cache is not None:
+                hash_cache.record(rel_path, digest, full_path)
             local_written += 1
             if log_every > 0 and (local_written % log_every) == 0:
                 with stats_lock:
@@ -177,115 +176,236 @@ def io_worker(stop_token, stats, stats_lock, log_every):
         with stats_lock:
             stats["written"] += local_written
 
-def process_object(key, obj, avatar_map):
+# 曲绘类资源：(CONFIG 键 / 输出目录, catalog key 中的标记)
+SPRITE_KINDS = (
+    ("illustration", "Illustration."),
+    ("illustrationBlur", "IllustrationBlur."),
+    ("illustrationLowRes", "IllustrationLowRes."),
+)
+# 每类资源需要反序列化的对象类型
+PLAN_CLASSES = {"avatar": ("Sprite",), "chart": ("TextAsset",), "music": ("AudioClip",)}
+
+
+def _sprite_outputs(kind, song_id):
+    if kind == "illustration":
+        return [(f"illustration/{song_id}", ILLUSTRATION_IMAGE_EXPORT_FORMATS), (f"lilith/ill/{song_id}", LILITH_ILL_EXPORT_FORMATS)]
+    if kind == "illustrationLowRes":
+        return [(f"illustrationLowRes/{song_id}", AVATAR_IMAGE_EXPORT_FORMATS), (f"lilith/illLow/{song_id}", LILITH_ILL_LOW_EXPORT_FORMATS)]
+    return [(f"{kind}/{song_id}", AVATAR_IMAGE_EXPORT_FORMATS), (f"lilith/illBlur/{song_id}", LILITH_ILL_BLUR_EXPORT_FORMATS)]
+
+
+def plan_bundle(key, avatar_map):
     """
-    处理单个资源对象。
+    只根据 catalog key 决定 bundle 中需要哪些对象、导出哪些变体，不打开 bundle。
+    返回 {"kind", "key", "classes": 对象类型名, "outputs": [(路径, 格式)]}；
+    图片类的路径不带扩展名，谱面 / 音乐的路径为最终文件名。没有任何启用的产物时返回 None。
     """
-    obj_type = obj.type.name
-    
-    # 1. 头像
-    if CONFIG["avatar"] and key.startswith("avatar.") and isinstance(obj, Sprite):
+    normalized = key.replace("\\", "/")
+    parts = normalized.split("/")
+    if key.startswith("avatar."):
+        if not CONFIG["avatar"]:
+            return None
         real_key = key[7:]
         if real_key != "Cipher1" and real_key in avatar_map:
             real_key = avatar_map[real_key]
+        kind, outputs = "avatar", [(f"avatar/{real_key}", AVATAR_IMAGE_EXPORT_FORMATS)]
+    elif "/Chart_" in normalized and normalized.endswith(".json"):
+        if not CONFIG["chart"]:
+            return None
+        diff = parts[-1].replace("Chart_", "").replace(".json", "")
+        kind, outputs = "chart", [(f"chart/{parts[-2]}/{diff}.json", ())]
+    elif normalized.endswith(".0/music.wav"):
+        if not CONFIG["music"] or _load_fsb5() is None:
+            return None
+        kind, outputs = "music", [(f"music/{parts[-2].replace('.0', '')}.ogg", ())]
+    else:
+        for kind, marker in SPRITE_KINDS:
+            if CONFIG[kind] and marker in key:
+                break
+        else:
+            return None
+        song_id = parts[-2].replace(".0", "")
+        outputs = [(base, tuple(formats)) for base, formats in _sprite_outputs(kind, song_id) if formats]
+    if not outputs:
+        return None
+    return {"kind": kind, "key": normalized, "classes": PLAN_CLASSES.get(kind, ("Sprite",)), "outputs": outputs}
 
-        for rel_path, payload in iter_image_variant_payloads(
-            obj.image,
-            f"avatar/{real_key}",
-            AVATAR_IMAGE_EXPORT_FORMATS,
-        ):
-            queue_in.put((rel_path, payload))
 
-    # 2. 谱面 json
-    elif CONFIG["chart"] and "/Chart_" in key and key.endswith(".json") and obj_type == "TextAsset":
-        try:
-            parts = key.replace("\\", "/").split("/")
-            song_id_folder = parts[-2] # e.g., "SongID.0"
-            diff = parts[-1].replace("Chart_", "").replace(".json", "")
-            
-            queue_in.put((f"chart/{song_id_folder}/{diff}.json", obj.script))
+def select_objects(objects, plan):
+    """
+    在反序列化之前挑出需要的对象：先按类型过滤，再优先取 container 路径与 key 对应的对象
+    （bundle 没有 container 信息或都对不上时保留全部同类型对象）。
+    """
+    candidates = [obj for obj in objects if obj.type.name in plan["classes"]]
+    suffix = plan["key"].lower()
+    matched = [obj for obj in candidates if (obj.container or "").replace("\\", "/").lower().endswith(suffix)]
+    return matched or candidates
 
-        except Exception as e:
-            print(f"处理谱面失败: {key}, 错误: {e}")
 
-    # 3. 曲绘
-    elif isinstance(obj, Sprite):
+def process_planned(plan, obj, emit, textures=None):
+    """按 plan 导出一个已反序列化的对象；textures 为 bundle 级纹理缓存，Sprite 从中裁剪。"""
+    kind = plan["kind"]
+    if kind == "chart":
         try:
-            subfolder = None
-            if CONFIG["illustration"] and "Illustration." in key:
-                subfolder = "illustration"
-            elif CONFIG["illustrationBlur"] and "IllustrationBlur." in key:
-                subfolder = "illustrationBlur"
-            elif CONFIG["illustrationLowRes"] and "IllustrationLowRes." in key:
-                subfolder = "illustrationLowRes"
-            
-            if subfolder:
-                parts = key.replace("\\", "/").split("/")
-                song_id = parts[-2].replace(".0", "")
-                if subfolder == "illustration":
-                    for rel_path, payload in iter_image_variant_payloads(
-                        obj.image,
-                        f"illustration/{song_id}",
-                        ILLUSTRATION_IMAGE_EXPORT_FORMATS,
-                    ):
-                        queue_in.put((rel_path, payload))
-
-                    for rel_path, payload in iter_image_variant_payloads(
-                        obj.image,
-                        f"lilith/ill/{song_id}",
-                        LILITH_ILL_EXPORT_FORMATS,
-                    ):
-                        queue_in.put((rel_path, payload))
-                elif subfolder == "illustrationLowRes":
-                    for rel_path, payload in iter_image_variant_payloads(
-                        obj.image,
-                        f"illustrationLowRes/{song_id}",
-                        AVATAR_IMAGE_EXPORT_FORMATS,
-                    ):
-                        queue_in.put((rel_path, payload))
-
-                    for rel_path, payload in iter_image_variant_payloads(
-                        obj.image,
-                        f"lilith/illLow/{song_id}",
-                        LILITH_ILL_LOW_EXPORT_FORMATS,
-                    ):
-                        queue_in.put((rel_path, payload))
-                else:
-                    for rel_path, payload in iter_image_variant_payloads(
-                        obj.image,
-                        f"{subfolder}/{song_id}",
-                        AVATAR_IMAGE_EXPORT_FORMATS,
-                    ):
-                        queue_in.put((rel_path, payload))
-
-                    for rel_path, payload in iter_image_variant_payloads(
-                        obj.image,
-                        f"lilith/illBlur/{song_id}",
-                        LILITH_ILL_BLUR_EXPORT_FORMATS,
-                    ):
-                        queue_in.put((rel_path, payload))
-
+            emit((plan["outputs"][0][0], obj.script))
         except Exception as e:
-            print(f"处理曲绘失败: {key}, 错误: {e}")
+            print(f"处理谱面失败: {plan['key']}, 错误: {e}")
 
-    # 4. 音乐
-    elif CONFIG["music"] and key.endswith(".0/music.wav") and isinstance(obj, AudioClip):
-        if not FSB5: return
+    elif kind == "music":
         try:
-            # 这里也统一使用 parts[-2] 提取，保持一致性
-            song_id_folder = key.replace("\\", "/").split("/")[-2]
-            song_id = song_id_folder.replace(".0", "")
-            rel_path = f"music/{song_id}.ogg"
-            
-            fsb = FSB5(obj.m_AudioData)
+            fsb = _load_fsb5()(obj.m_AudioData)
             if fsb.samples:
-                rebuilt_sample = fsb.rebuild_sample(fsb.samples[0])
-                queue_in.put((rel_path, rebuilt_sample))
+                emit((plan["outputs"][0][0], fsb.rebuild_sample(fsb.samples[0])))
         except Exception as e:
-            print(f"音频解码失败 {key}: {e}")
+            print(f"音频解码失败 {plan['key']}: {e}")
+
+    elif kind == "avatar":
+        image = textures.sprite_image(obj) if textures is not None else obj.image
+        for rel_path, payload in iter_image_variant_payloads(image, *plan["outputs"][0], quality_tuner=QUALITY_TUNER):
+            emit((rel_path, payload))
+
+    else:
+        try:
+            # 每个 Sprite 只取一次图像，纹理由 bundle 级缓存共享；各输出共用同一份格式转换结果
+            image = PreparedImage(textures.sprite_image(obj) if textures is not None else obj.image)
+            for base, formats in plan["outputs"]:
+                for rel_path, payload in iter_image_variant_payloads(image, base, formats, quality_tuner=QUALITY_TUNER):
+                    emit((rel_path, payload))
+        except Exception as e:
+            print(f"处理曲绘失败: {plan['key']}, 错误: {e}")
+
+
+def process_object(key, obj, avatar_map, emit=None):
+    """
+    处理单个资源对象。产物交给 emit((rel_path, payload))，默认放入写文件队列。
+    """
+    plan = plan_bundle(key, avatar_map)
+    if plan is None or obj.type.name not in plan["classes"]:
+        return
+    process_planned(plan, obj, emit or queue_in.put)
+
+
+def streaming_enabled():
+    return os.environ.get("RESOURCE_STREAMING", "").lower() in ("1", "true", "yes")
+
+
+def song_folder_of(key):
+    """catalog key 所属的歌曲目录（如 "xxx.0"）；头像等非歌曲资源返回 None。"""
+    if key.startswith("avatar."):
+        return None
+    parts = key.replace("\\", "/").split("/")
+    if len(parts) >= 2 and parts[-2].endswith(".0"):
+        return parts[-2]
+    return None
+
+
+def group_entries_by_song(entries):
+    """返回 ([(song_folder, [(key, bundle), ...]), ...], 不属于任何歌曲的条目)。"""
+    groups = {}
+    others = []
+    for key, bundle in entries:
+        song_folder = song_folder_of(key)
+        if song_folder is None:
+            others.append((key, bundle))
+        else:
+            groups.setdefault(song_folder, []).append((key, bundle))
+    return sorted(groups.items()), others
+
+
+def _payload_bytes(payload):
+    if isinstance(payload, BytesIO):
+        return payload.getvalue()
+    return bytes(payload)
+
+
+def finalize_song_payloads(song_folder, payloads, song_info, chart_modes):
+    """
+    流式模式下在内存中完成单首歌的后续阶段：谱面后处理（CHART_POSTPROCESS）与 Phira 打包。
+    payloads 为 {rel_path: bytes}，原地补充产物；返回 Phira 缺失原因列表。
+    """
+    import chart_format
+    import phira
+
+    chart_prefix = f"chart/{song_folder}/"
+    charts = {}
+    for rel_path in sorted(p for p in payloads if p.startswith(chart_prefix) and p.endswith(".json")):
+        data = payloads[rel_path]
+        if chart_modes:
+            try:
+                chart = json.loads(data)
+                if "minify" in chart_modes:
+                    data = payloads[rel_path] = chart_format.minify_chart(chart)
+                if "binary" in chart_modes:
+                    payloads[rel_path[:-5] + chart_format.BINARY_EXTENSION] = chart_format.encode_binary_chart(chart)
+            except (ValueError, struct.error) as e:
+                print(f"谱面后处理失败: {rel_path}, 错误: {e}")
+        charts[rel_path[len(chart_prefix):-5]] = data
+
+    if song_info is None:
+        return []
+    # 与 process_object 的命名保持一致
+    file_id = song_folder.replace(".0", "")
+    pez_payloads, missing = phira.build_song_pez_payloads(
+        song_folder[:-2],
+        song_info,
+        charts,
+        payloads.get(f"illustrationLowRes/{file_id}.png"),
+        payloads.get(f"music/{file_id}.ogg"),
+    )
+    payloads.update(pez_payloads)
+    return missing
+
+
+def load_catalog_entries(apk_path):
+    """
+    解析 APK 中的 Addressables catalog，返回 [(key, bundle 文件名)]（key 已去掉 "Assets/Tracks/" 前缀，
+    只保留歌曲与头像）；找不到 catalog.json 时返回 None。
+    """
+    try:
+        with ZipFile(apk_path) as apk:
+            with apk.open("assets/aa/catalog.json") as f: data = json.load(f)
+    except KeyError:
+        return None
+
+    key = base64.b64decode(data["m_KeyDataString"])
+    bucket = base64.b64decode(data["m_BucketDataString"])
+    entry = base64.b64decode(data["m_EntryDataString"])
+    table = []
+    reader = ByteReader(bucket)
+    for x in range(reader.readInt()):
+        key_position = reader.readInt(); key_type = key[key_position]; key_position += 1
+        if key_type == 0:
+            length = key[key_position]; key_position += 4
+            key_value = key[key_position:key_position + length].decode()
+        elif key_type == 1:
+            length = key[key_position]; key_position += 4
+            key_value = key[key_position:key_position + length].decode("utf16")
+        elif key_type == 4:
+            key_value = key[key_position]
+        else:
+            raise BaseException(key_position, key_type)
+        for i in range(reader.readInt()):
+            entry_position = reader.readInt()
+            entry_value = entry[4 + 28 * entry_position:4 + 28 * entry_position + 28]
+            entry_value = entry_value[8] ^ entry_value[9] << 8
+        table.append([key_value, entry_value])
+    
+    for i in range(len(table)):
+        if table[i][1] != 65535: table[i][1] = table[table[i][1]][0]
+    
+    final_table = []
+    for k, v in table:
+        if isinstance(k, int) or k.startswith("Assets/Tracks/#") or not (k.startswith("Assets/Tracks/") or k.startswith("avatar.")):
+            continue
+        if k.startswith("Assets/Tracks/"): k = k[14:]
+        final_table.append((k, v))
+    return final_table
+
 
 def extract_resources(apk_path, output_dir="output"):
-    global OUTPUT_ROOT, queue_in, ILLUSTRATION_IMAGE_EXPORT_FORMATS, LILITH_ILL_EXPORT_FORMATS, LILITH_ILL_LOW_EXPORT_FORMATS, LILITH_ILL_BLUR_EXPORT_FORMATS
+    global OUTPUT_ROOT, queue_in, ILLUSTRATION_IMAGE_EXPORT_FORMATS, LILITH_ILL_EXPORT_FORMATS, LILITH_ILL_LOW_EXPORT_FORMATS, LILITH_ILL_BLUR_EXPORT_FORMATS, QUALITY_TUNER
+    from UnityPy import Environment
+
     OUTPUT_ROOT = output_dir
     print(f"--- 开始提取资源文件 (Music/Image/Chart) ---", flush=True)
     ILLUSTRATION_IMAGE_EXPORT_FORMATS = ("png",)
@@ -310,6 +430,9 @@ def extract_resources(apk_path, output_dir="output"):
         )
     else:
         print("[image_export] lilith/illBlur 实验格式: 未启用（无可用编码器）", flush=True)
+    QUALITY_TUNER = quality_search.tuner_from_env(OUTPUT_ROOT)
+    if QUALITY_TUNER is not None:
+        print(f"[image_export] 按图搜索编码质量，目标 SSIM {QUALITY_TUNER.target}", flush=True)
 
     cpu_count = os.cpu_count() or 2
     max_workers = _get_int_env("RESOURCE_WORKERS", min(4, cpu_count), min_value=1, max_value=16)
@@ -326,17 +449,19 @@ def extract_resources(apk_path, output_dir="output"):
         "objects": 0,
     }
     stats_lock = threading.Lock()
+    # 流式模式：同一首歌的全部 bundle 在一个任务中处理，产物在内存里完成谱面后处理、
+    # Phira 打包与哈希后只写一次盘，后续阶段无需再读回
+    streaming = streaming_enabled()
+    hashes = HashCache(OUTPUT_ROOT) if streaming else None
 
     io_threads = []
     for _ in range(io_workers):
-        t = threading.Thread(target=io_worker, args=(stop_token, stats, stats_lock, log_every))
+        t = threading.Thread(target=io_worker, args=(stop_token, stats, stats_lock, log_every, hashes))
         t.start()
         io_threads.append(t)
     
-    try:
-        with ZipFile(apk_path) as apk:
-            with apk.open("assets/aa/catalog.json") as f: data = json.load(f)
-    except KeyError:
+    final_table = load_catalog_entries(apk_path)
+    if final_table is None:
         print("错误: 找不到 catalog.json", flush=True)
         for _ in io_threads:
             queue_in.put(stop_token)
@@ -345,41 +470,6 @@ def extract_resources(apk_path, output_dir="output"):
             t.join()
         return
 
-    key = base64.b64decode(data["m_KeyDataString"])
-    bucket = base64.b64decode(data["m_BucketDataString"])
-    entry = base64.b64decode(data["m_EntryDataString"])
-    table = []
-    reader = ByteReader(bucket)
-    for x in range(reader.readInt()):
-        key_position = reader.readInt(); key_type = key[key_position]; key_position += 1
-        if key_type == 0:
-            length = key[key_position]; key_position += 4
-            key_value = key[key_position:key_position + length].decode()
-        elif key_type == 1:
-            length = key[key_position]; key_position += 4
-            key_value = key[key_position:key_position + length].decode("utf16")
-        elif key_type == 4:
-            key_value = key[key_position]
-        else:
-            raise BaseException(key_position, key_type)
-        for i in range(reader.readInt()):
-            entry_position = reader.readInt()
-            entry_value = entry[4 + 28 * entry_position:4 + 28 * entry_position + 28]
-            entry_value = entry_value[8] ^ entry_value[9] << 8
-        table.append([key_value, entry_value])
-    
-    for i in range(len(table)):
-        if table[i][1] != 65535: table[i][1] = table[table[i][1]][0]
-    
-    final_table = []
-    for k, v in table:
-        if isinstance(k, int) or k.startswith("Assets/Tracks/#") or not (k.startswith("Assets/Tracks/") or k.startswith("avatar.")):
-            continue
-        if k.startswith("Assets/Tracks/"): k = k[14:]
-        final_table.append((k, v))
-    final_table = [(k, v) for (k, v) in final_table if _should_keep_key(k)]
-    print(f"Catalog 解析完成，找到 {len(final_table)} 个待处理资源。", flush=True)
-
     avatar_map = {}
     tmp_tsv = os.path.join(OUTPUT_ROOT, "info", "tmp.tsv")
     if os.path.exists(tmp_tsv):
@@ -388,40 +478,153 @@ def extract_resources(apk_path, output_dir="output"):
                 parts = line.strip().split("\t")
                 if len(parts) >= 2: avatar_map[parts[1]] = parts[0]
 
+    # 先按 key 规划每个 bundle 的产物，产物全部关闭的 bundle 不会被读取
+    plans = {}
+    for k, v in final_table:
+        plan = plan_bundle(k, avatar_map)
+        if plan is not None:
+            plans[k] = plan
+    skipped_bundles = len(final_table) - len(plans)
+    final_table = [(k, v) for (k, v) in final_table if k in plans]
+    print(f"Catalog 解析完成，找到 {len(final_table)} 个待处理资源（跳过 {skipped_bundles} 个无需导出的 bundle）。", flush=True)
+    stats.update({"skipped_objects": 0, "texture_decodes": 0, "texture_hits": 0})
+
     ti = time.time()
-    classes_to_load = []
-    if CONFIG["chart"]:
-        classes_to_load.append(ClassIDType.TextAsset)
-    if CONFIG["avatar"] or CONFIG["illustration"] or CONFIG["illustrationBlur"] or CONFIG["illustrationLowRes"]:
-        classes_to_load.append(ClassIDType.Sprite)
-    if CONFIG["music"]:
-        classes_to_load.append(ClassIDType.AudioClip)
-    classes_to_load = tuple(classes_to_load)
     apk_read_lock = threading.Lock()
-    
+
+    song_infos = None
+    chart_modes = ()
+    if streaming:
+        import chart_format
+        import phira
+
+        chart_modes = chart_format.parse_postprocess_modes(os.environ.get("CHART_POSTPROCESS"))
+        song_infos = phira.load_song_infos(OUTPUT_ROOT)
+        if song_infos is not None:
+            phira_dir = os.path.join(OUTPUT_ROOT, "phira")
+            if os.path.exists(phira_dir):
+                shutil.rmtree(phira_dir)
+        stats.update({"streamed_songs": 0, "pez": 0, "hashed": 0, "phira_missing": []})
+        print(f"[streaming] 按歌曲流式处理，谱面后处理: {', '.join(chart_modes) or '无'}，Phira: {'是' if song_infos is not None else '否 (缺少 info)'}", flush=True)
+
+    # 按预估耗时排序派发：zip 目录给出各 bundle 大小，单价来自上次运行记录的实际耗时
+    timings_path = os.environ.get("RESOURCE_TIMINGS") or os.path.join(OUTPUT_ROOT, bundle_schedule.TIMINGS_FILENAME)
+    schedule_mode = os.environ.get("RESOURCE_SCHEDULE", "cost").lower()
+    cost_model = bundle_schedule.fit_cost_model(bundle_schedule.load_timings(timings_path))
+    bundle_samples = []
+    job_seconds = {}
+
     with ZipFile(apk_path) as apk:
+        bundle_sizes = {}
+        for _, v in final_table:
+            try:
+                info = apk.getinfo(f"assets/aa/Android/{v}")
+            except KeyError:
+                continue
+            bundle_sizes[v] = {"compress_size": info.compress_size, "file_size": info.file_size}
+
+        def process_bundle(k, v, emit):
+            """处理一个 bundle，返回处理的对象数；纹理缓存只在本 bundle 内有效，结束时释放。"""
+            started = time.perf_counter()
+            with apk_read_lock:
+                bundle_data = apk.read(f"assets/aa/Android/{v}")
+            env = Environment()
+            env.load_file(bundle_data, name=k)
+            # 只反序列化规划中需要的对象，其余对象连 read() 都不调用
+            objects = env.objects
+            selected = select_objects(objects, plans[k])
+            textures = TextureCache()
+            try:
+                for obj in selected:
+                    process_planned(plans[k], obj.read(), emit, textures)
+            finally:
+                with stats_lock:
+                    stats["skipped_objects"] += len(objects) - len(selected)
+                    stats["texture_decodes"] += textures.decodes
+                    stats["texture_hits"] += textures.hits
+                    if v in bundle_sizes:
+                        bundle_samples.append({
+                            "category": bundle_schedule.category_of(plans[k]),
+                            **bundle_sizes[v],
+                            "seconds": round(time.perf_counter() - started, 4),
+                        })
+                textures.clear()
+            return len(selected)
+
         def job(item):
             k, v = item
+            started = time.perf_counter()
             try:
-                with apk_read_lock:
-                    bundle_data = apk.read(f"assets/aa/Android/{v}")
-                env = Environment()
-                env.load_file(bundle_data, name=k)
-                local_objects = 0
-                for obj in env.objects:
-                    if obj.type in classes_to_load:
-                        process_object(k, obj.read(), avatar_map)
-                        local_objects += 1
+                local_objects = process_bundle(k, v, queue_in.put)
                 with stats_lock:
                     stats["bundles"] += 1
                     stats["objects"] += local_objects
             except Exception:
                 with stats_lock:
                     stats["bundle_errors"] += 1
+            job_seconds[k] = time.perf_counter() - started
+
+        def song_job(group):
+            song_folder, entries = group
+            started = time.perf_counter()
+            payloads = {}
+
+            def collect(item):
+                payloads[item[0]] = _payload_bytes(item[1])
+
+            for k, v in entries:
+                try:
+                    local_objects = process_bundle(k, v, collect)
+                    with stats_lock:
+                        stats["bundles"] += 1
+                        stats["objects"] += local_objects
+                except Exception:
+                    with stats_lock:
+                        stats["bundle_errors"] += 1
+
+            song_info = song_infos.get(song_folder[:-2]) if song_infos else None
+            missing = finalize_song_payloads(song_folder, payloads, song_info, chart_modes)
+            for rel_path, data in payloads.items():
+                queue_in.put((rel_path, data, hashlib.sha256(data).hexdigest()))
+            with stats_lock:
+                stats["streamed_songs"] += 1
+                stats["hashed"] += len(payloads)
+                stats["pez"] += sum(1 for rel_path in payloads if rel_path.endswith(".pez"))
+                stats["phira_missing"].extend(missing)
+            job_seconds[song_folder] = time.perf_counter() - started
+
+        # 作业：非流式为单个 bundle，流式为整首歌（其余 bundle 仍单独成作业）
+        if streaming:
+            song_groups, others = group_entries_by_song(final_table)
+        else:
+            song_groups, others = [], final_table
+        tasks = {k: (job, (k, v), [(k, v)]) for k, v in others}
+        tasks.update({song_folder: (song_job, (song_folder, entries), entries) for song_folder, entries in song_groups})
+        jobs = bundle_schedule.build_jobs([(job_id, task[2]) for job_id, task in tasks.items()], plans, bundle_sizes, cost_model)
+        scheduled = jobs if schedule_mode == "catalog" else bundle_schedule.order_jobs(jobs)
+        predicted = (
+            bundle_schedule.simulate_makespan([job["cost"] for job in jobs], max_workers),
+            bundle_schedule.simulate_makespan([job["cost"] for job in scheduled], max_workers),
+        )
+        print(f"[schedule] {schedule_mode}: {len(jobs)} 个作业，预估总耗时 catalog 顺序 {predicted[0]:.1f}s → 调度后 {predicted[1]:.1f}s", flush=True)
 
         with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            for _ in executor.map(job, final_table):
-                pass
+            # 线程池按提交顺序取任务，提交顺序即派发顺序
+            futures = []
+            for scheduled_job in scheduled:
+                run, argument, _ = tasks[scheduled_job["id"]]
+                futures.append(executor.submit(run, argument))
+            for future in futures:
+                future.result()
+
+    tail = bundle_schedule.tail_report([job["id"] for job in jobs], [job["id"] for job in scheduled], job_seconds, max_workers)
+    stats["schedule"] = tail
+    print(
+        f"[schedule] 按实际耗时回放: catalog 顺序 {tail['catalog_makespan']:.1f}s，调度顺序 {tail['scheduled_makespan']:.1f}s，尾部节省 {tail['saved']:.1f}s",
+        flush=True,
+    )
+    if bundle_samples:
+        bundle_schedule.save_timings(timings_path, bundle_samples)
 
     for _ in io_threads:
         queue_in.put(stop_token)
@@ -435,9 +638,21 @@ def extract_resources(apk_path, output_dir="output"):
         bundles = stats["bundles"]
         objects = stats["objects"]
     print(
-        f"资源提取完成，耗时: {round(time.time() - ti, 2)}s, bundles={bundles}, objects={objects}, files={written}, bundle_errors={bundle_errors}, write_errors={write_errors}",
+        f"资源提取完成，耗时: {round(time.time() - ti, 2)}s, bundles={bundles}, objects={objects}, skipped_objects={stats['skipped_objects']}, texture_decodes={stats['texture_decodes']} (cache hits {stats['texture_hits']}), files={written}, bundle_errors={bundle_errors}, write_errors={write_errors}",
         flush=True,
     )
+    if QUALITY_TUNER is not None:
+        QUALITY_TUNER.save()
+        print(f"[image_export] {QUALITY_TUNER.summary()}", flush=True)
+    if streaming:
+        hashes.save()
+        print(
+            f"[streaming] 歌曲 {stats['streamed_songs']} 首，pez {stats['pez']} 个，已登记哈希 {stats['hashed']} 个文件",
+            flush=True,
+        )
+        if stats["pez"] == 0 and stats["phira_missing"]:
+            print(f"[streaming] Phira 缺失零件 (抽样): {stats['phira_missing'][0]}", flush=True)
+    return stats
 
 if __name__ == "__main__":
     if len(sys.argv) > 1:
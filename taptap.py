@@ -1,15 +1,29 @@
 """从 TapTap 自动拉取 Phigros 最新版 APK 下载信息。"""
+import asyncio
 import hashlib
+import http.client
 import json
+import os
+import queue
 import random
 import string
+import sys
+import threading
 import time
 import urllib.parse
 import uuid
-from http.client import HTTPSConnection
 
 SAMPLE = string.ascii_lowercase + string.digits
 PHIGROS_APP_ID = 165287
+# 可指向本地桩服务器做测试，如 http://127.0.0.1:8000
+DEFAULT_API_BASE = "https://api.taptapdada.com"
+DEFAULT_POOL_SIZE = 4
+DEFAULT_TIMEOUT = 15
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5
+# 这些状态码视为临时故障，退避后重试
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+SIGN_SECRET = "PeCkE6Fu0B10Vm9BKfPfANwCUAn5POcs"
 
 
 def _build_ua(uid):
@@ -20,80 +34,255 @@ def _build_ua(uid):
     )
 
 
-def _api_get(host, path, headers=None):
-    """封装 GET 请求，含容错输出。"""
-    import sys
-    conn = HTTPSConnection(host, timeout=15)
-    conn.request("GET", path, headers=headers or {})
-    resp = conn.getresponse()
-    body = resp.read().decode()
-    if resp.status != 200:
-        print(f"[taptap] GET {host}{path} → HTTP {resp.status}", file=sys.stderr)
-        print(f"[taptap] body: {body[:300]}", file=sys.stderr)
-        raise RuntimeError(f"HTTP {resp.status}")
-    return json.loads(body)
-
-
-def _api_post(host, path, body, headers=None):
-    """封装 POST 请求，含容错输出。"""
-    import sys
-    conn = HTTPSConnection(host, timeout=15)
-    conn.request("POST", path, body=body.encode(), headers=headers or {})
-    resp = conn.getresponse()
-    resp_body = resp.read().decode()
-    if resp.status != 200:
-        print(f"[taptap] POST {host}{path} → HTTP {resp.status}", file=sys.stderr)
-        print(f"[taptap] body: {resp_body[:300]}", file=sys.stderr)
-        raise RuntimeError(f"HTTP {resp.status}")
-    return json.loads(resp_body)
+class TapTapError(RuntimeError):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class TapTapClient:
+    """
+    TapTap API 异步客户端。
+
+    - 连接池：同一 host 复用 keep-alive 连接，阻塞 IO 放到 asyncio.to_thread 中执行，可并发请求；
+    - 重试：网络错误与 RETRY_STATUSES 按指数退避重试；
+    - 条件请求：detail-by-id 带 If-None-Match / If-Modified-Since，304 时直接用缓存；
+    - 轮询：apk_id 未变时不再请求 APK 详情，version_code 未变时不触发回调。
+    """
+
+    def __init__(
+        self,
+        base_url=None,
+        pool_size=DEFAULT_POOL_SIZE,
+        timeout=DEFAULT_TIMEOUT,
+        retries=DEFAULT_RETRIES,
+        backoff=DEFAULT_BACKOFF,
+        cache_path=None,
+    ):
+        base_url = base_url or os.environ.get("TAPTAP_API_BASE") or DEFAULT_API_BASE
+        parts = urllib.parse.urlsplit(base_url)
+        self.scheme = parts.scheme or "https"
+        self.host = parts.netloc
+        self.base_path = parts.path.rstrip("/")
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.cache_path = cache_path
+        # 同一个客户端固定 UID，X-UA 不变，条件请求的缓存键才稳定
+        self.uid = uuid.uuid4()
+        self.x_ua = _build_ua(self.uid)
+        self._idle = queue.LifoQueue()
+        self._cache = self._load_cache()
+        self.stats = {"requests": 0, "connections": 0, "retries": 0, "not_modified": 0}
+        # 新建连接发生在 asyncio.to_thread 的工作线程里，计数需加锁
+        self._stats_lock = threading.Lock()
+
+    # ---- 连接池 ----
+    def _new_connection(self):
+        with self._stats_lock:
+            self.stats["connections"] += 1
+        if self.scheme == "http":
+            return http.client.HTTPConnection(self.host, timeout=self.timeout)
+        return http.client.HTTPSConnection(self.host, timeout=self.timeout)
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._new_connection()
+
+    def _release(self, conn):
+        if self._idle.qsize() < self.pool_size:
+            self._idle.put(conn)
+        else:
+            conn.close()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def _send(self, method, path, body, headers):
+        """在工作线程中执行一次请求；连接被服务端关闭时换一条新连接重发一次。"""
+        for attempt in range(2):
+            conn = self._acquire()
+            try:
+                conn.request(method, self.base_path + path, body=body, headers=headers)
+                resp = conn.getresponse()
+                data = resp.read()
+            except (http.client.RemoteDisconnected, http.client.CannotSendRequest, ConnectionResetError, BrokenPipeError):
+                conn.close()
+                if attempt:
+                    raise
+                continue
+            except Exception:
+                conn.close()
+                raise
+            if resp.will_close:
+                conn.close()
+            else:
+                self._release(conn)
+            return resp.status, {key.lower(): value for key, value in resp.getheaders()}, data
+
+    async def request(self, method, path, body=None, headers=None):
+        """返回 (status, headers, body)；临时故障按 backoff * 2^n 重试，其余非 2xx/304 抛出 TapTapError。"""
+        payload = body.encode() if isinstance(body, str) else body
+        for attempt in range(self.retries + 1):
+            self.stats["requests"] += 1
+            try:
+                status, resp_headers, data = await asyncio.to_thread(self._send, method, path, payload, headers or {})
+            except (OSError, http.client.HTTPException) as e:
+                if attempt >= self.retries:
+                    raise TapTapError(None, f"{method} {self.host}{path} 失败: {e}") from e
+            else:
+                if status in (200, 304):
+                    return status, resp_headers, data
+                if status not in RETRY_STATUSES or attempt >= self.retries:
+                    print(f"[taptap] {method} {self.host}{path} → HTTP {status}", file=sys.stderr)
+                    print(f"[taptap] body: {data[:300].decode(errors='replace')}", file=sys.stderr)
+                    raise TapTapError(status, f"HTTP {status}")
+            self.stats["retries"] += 1
+            await asyncio.sleep(self.backoff * (2 ** attempt))
+
+    # ---- 条件请求缓存 ----
+    def _load_cache(self):
+        if not self.cache_path:
+            return {}
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_cache(self):
+        if not self.cache_path:
+            return
+        tmp_path = self.cache_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._cache, f, ensure_ascii=False)
+        os.replace(tmp_path, self.cache_path)
+
+    async def get_json_cached(self, path, cache_key, headers=None):
+        """GET 并按 ETag / Last-Modified 缓存，返回 (数据, 是否未变)。"""
+        cached = self._cache.get(cache_key)
+        request_headers = dict(headers or {})
+        if cached:
+            if cached.get("etag"):
+                request_headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                request_headers["If-Modified-Since"] = cached["last_modified"]
+
+        status, resp_headers, data = await self.request("GET", path, headers=request_headers)
+        if status == 304:
+            if not cached:
+                # 没有发条件请求头却收到 304，没有可用的数据
+                raise TapTapError(304, f"GET {self.host}{path} 返回 304，但没有本地缓存")
+            self.stats["not_modified"] += 1
+            return cached["data"], True
+
+        parsed = json.loads(data.decode())
+        unchanged = bool(cached) and cached.get("data") == parsed
+        if resp_headers.get("etag") or resp_headers.get("last-modified"):
+            self._cache[cache_key] = {
+                "etag": resp_headers.get("etag"),
+                "last_modified": resp_headers.get("last-modified"),
+                "data": parsed,
+            }
+            self._save_cache()
+        return parsed, unchanged
+
+    # ---- API ----
+    async def get_app_detail(self, app_id=PHIGROS_APP_ID):
+        """返回 (detail, 是否未变)。"""
+        path = f"/app/v2/detail-by-id/{app_id}?X-UA={urllib.parse.quote(self.x_ua)}"
+        return await self.get_json_cached(path, f"detail-by-id/{app_id}", {"User-Agent": "okhttp/3.12.1"})
+
+    async def get_apk_info(self, apk_id):
+        nonce = "".join(random.sample(SAMPLE, 5))
+        t = int(time.time())
+        param = (
+            f"abi=arm64-v8a,armeabi-v7a,armeabi"
+            f"&id={apk_id}&node={self.uid}&nonce={nonce}"
+            f"&sandbox=1&screen_densities=xhdpi&time={t}"
+        )
+        sign_data = f"X-UA={self.x_ua}&{param}{SIGN_SECRET}"
+        sign = hashlib.md5(sign_data.encode()).hexdigest()
+        post_body = f"{param}&sign={sign}"
+
+        path = f"/apk/v1/detail?X-UA={urllib.parse.quote(self.x_ua)}"
+        post_headers = {
+            "Content-Type": "application/x-www-form-urlencoded",
+            "User-Agent": "okhttp/3.12.1",
+        }
+        _, _, data = await self.request("POST", path, post_body, post_headers)
+        apk = json.loads(data.decode())["data"]["apk"]
+        # 字段名对照 CF Worker: data.apk.download / .version_name / .version_code
+        return {
+            "apk_id": apk_id,
+            "download_url": apk.get("download", ""),
+            "version_name": apk.get("version_name", ""),
+            "version_code": str(apk.get("version_code", "")),
+            "size": apk.get("size", 0),
+            "md5": apk.get("md5", ""),
+        }
+
+    async def get_latest_apk(self, app_id=PHIGROS_APP_ID):
+        detail, _ = await self.get_app_detail(app_id)
+        return await self.get_apk_info(detail["data"]["download"]["apk_id"])
+
+    async def poll(self, on_new_version, app_id=PHIGROS_APP_ID, interval=300, last_version_code=None, max_polls=None):
+        """
+        定期检查新版本，version_code 变化时调用 on_new_version(info)（可为协程函数），
+        回调返回 False 表示处理失败，下一轮会重试同一版本。
+
+        detail 返回 304 或 apk_id 未变时本轮不再请求 APK 详情。
+        返回最后一次看到的 version_code。
+        """
+        last_apk_id = None
+        polls = 0
+        while max_polls is None or polls < max_polls:
+            if polls:
+                await asyncio.sleep(interval)
+            polls += 1
+            try:
+                detail, unchanged = await self.get_app_detail(app_id)
+                apk_id = detail["data"]["download"]["apk_id"]
+                if last_apk_id is not None and (unchanged or apk_id == last_apk_id):
+                    continue
+                info = await self.get_apk_info(apk_id)
+                last_apk_id = apk_id
+                if info["version_code"] == last_version_code:
+                    continue
+                result = on_new_version(info)
+                if asyncio.iscoroutine(result):
+                    result = await result
+                if result is False:
+                    # 处理失败：下一轮重新获取并重试该版本
+                    last_apk_id = None
+                    continue
+                last_version_code = info["version_code"]
+            except (TapTapError, KeyError, ValueError) as e:
+                print(f"[taptap] 轮询失败: {e}", file=sys.stderr)
+        return last_version_code
 
 
 def get_latest_apk(app_id=PHIGROS_APP_ID):
     """返回最新 APK 的下载信息 dict。"""
-    uid = uuid.uuid4()
-    x_ua = _build_ua(uid)
-    host = "api.taptapdada.com"
-    headers = {"User-Agent": "okhttp/3.12.1"}
-
-    # 第一步：获取游戏详情 → 拿到 apk_id
-    path1 = f"/app/v2/detail-by-id/{app_id}?X-UA={urllib.parse.quote(x_ua)}"
-    detail = _api_get(host, path1, headers)
-    apk_id = detail["data"]["download"]["apk_id"]
-
-    # 第二步：获取 APK 具体信息（含下载链接）
-    nonce = "".join(random.sample(SAMPLE, 5))
-    t = int(time.time())
-    param = (
-        f"abi=arm64-v8a,armeabi-v7a,armeabi"
-        f"&id={apk_id}&node={uid}&nonce={nonce}"
-        f"&sandbox=1&screen_densities=xhdpi&time={t}"
-    )
-    sign_data = f"X-UA={x_ua}&{param}PeCkE6Fu0B10Vm9BKfPfANwCUAn5POcs"
-    sign = hashlib.md5(sign_data.encode()).hexdigest()
-    post_body = f"{param}&sign={sign}"
-
-    path2 = f"/apk/v1/detail?X-UA={urllib.parse.quote(x_ua)}"
-    post_headers = {
-        "Content-Type": "application/x-www-form-urlencoded",
-        "User-Agent": "okhttp/3.12.1",
-    }
-    apk_info = _api_post(host, path2, post_body, post_headers)
-
-    data = apk_info["data"]
-    apk = data["apk"]
-    # 字段名对照 CF Worker: data.apk.download / .version_name / .version_code
-    download_url = apk.get("download", "")
-
-    return {
-        "download_url": download_url,
-        "version_name": apk.get("version_name", ""),
-        "version_code": str(apk.get("version_code", "")),
-        "size": apk.get("size", 0),
-        "md5": apk.get("md5", ""),
-    }
+    client = TapTapClient()
 
+    async def run():
+        try:
+            return await client.get_latest_apk(app_id)
+        finally:
+            client.close()
 
-if __name__ == "__main__":
+    return asyncio.run(run())
+
+
+def main():
     info = get_latest_apk()
     # 输出为 JSON 供 CNB 管线解析
     print(json.dumps(info, ensure_ascii=False, indent=2))
@@ -103,3 +292,7 @@ if __name__ == "__main__":
         print(f"##[set-output APK_DOWNLOAD_URL={info['download_url']}]")
     print(f"##[set-output VERSION_NAME={info['version_name']}]")
     print(f"##[set-output VERSION_CODE={info['version_code']}]")
+
+
+if __name__ == "__main__":
+    main()
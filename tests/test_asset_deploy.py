@@ -0,0 +1,79 @@
+import hashlib
+import os
+import tempfile
+import unittest
+
+import asset_deploy
+from hash_cache import HashCache
+
+
+def write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+class ManifestTests(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.source = os.path.join(tmp.name, "manual_assets")
+        self.manifest = os.path.join(tmp.name, "cache", asset_deploy.MANIFEST_FILENAME)
+        write(os.path.join(self.source, "fonts", "a.woff2"), b"font")
+        write(os.path.join(self.source, "info", "chaplist.yaml"), b"chap: 1\n")
+
+    def test_only_changed_files_are_rehashed(self):
+        files, stats = asset_deploy.refresh_manifest(self.source, self.manifest, blob_ids={})
+        self.assertEqual((stats["rehashed"], stats["written"]), (2, True))
+        self.assertEqual(files["fonts/a.woff2"]["sha256"], hashlib.sha256(b"font").hexdigest())
+        # 清单写在源目录之外，构建不改动受版本控制的文件
+        self.assertTrue(os.path.exists(self.manifest))
+        self.assertEqual(sorted(os.listdir(self.source)), ["fonts", "info"])
+
+        _, stats = asset_deploy.refresh_manifest(self.source, self.manifest, blob_ids={})
+        self.assertEqual((stats["rehashed"], stats["by_stat"], stats["written"]), (0, 2, False))
+
+        write(os.path.join(self.source, "info", "chaplist.yaml"), b"chap: 2\n")
+        files, stats = asset_deploy.refresh_manifest(self.source, self.manifest, blob_ids={})
+        self.assertEqual((stats["rehashed"], stats["written"]), (1, True))
+        self.assertEqual(files["info/chaplist.yaml"]["sha256"], hashlib.sha256(b"chap: 2\n").hexdigest())
+
+    def test_matching_git_blob_skips_hashing_after_mtime_change(self):
+        blob_ids = {"fonts/a.woff2": "blob-a", "info/chaplist.yaml": "blob-b"}
+        asset_deploy.refresh_manifest(self.source, self.manifest, blob_ids=blob_ids)
+        # 模拟重新 clone：mtime 改变，blob 不变
+        for rel_path in blob_ids:
+            os.utime(os.path.join(self.source, *rel_path.split("/")), ns=(1, 1))
+
+        _, stats = asset_deploy.refresh_manifest(self.source, self.manifest, blob_ids=blob_ids)
+
+        self.assertEqual((stats["by_blob"], stats["rehashed"], stats["written"]), (2, 0, False))
+
+
+class DeployTests(unittest.TestCase):
+    def test_deploy_links_binaries_copies_text_and_records_hashes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            source = os.path.join(tmp, "manual_assets")
+            output = os.path.join(tmp, "output")
+            write(os.path.join(source, "fonts", "a.woff2"), b"font")
+            write(os.path.join(source, "info", "chaplist.yaml"), b"chap")
+            write(os.path.join(output, "info", "existing.csv"), b"game")
+            write(os.path.join(source, "info", "existing.csv"), b"manual")
+            files, _ = asset_deploy.refresh_manifest(source, os.path.join(tmp, "manifest.json"), blob_ids={})
+            cache = HashCache(output)
+
+            counts = asset_deploy.deploy_manifest_files(source, output, files, hash_cache=cache)
+
+            self.assertEqual(counts["skipped"], 1)
+            self.assertEqual(counts["reflink"] + counts["hardlink"] + counts["copy"], 2)
+            yaml_path = os.path.join(output, "info", "chaplist.yaml")
+            # 文本文件不能与源共用 inode，否则原地改写会污染 manual_assets
+            self.assertFalse(os.path.samefile(yaml_path, os.path.join(source, "info", "chaplist.yaml")))
+            with open(os.path.join(output, "info", "existing.csv"), "rb") as f:
+                self.assertEqual(f.read(), b"game")
+            self.assertEqual(cache.sha256("fonts/a.woff2"), hashlib.sha256(b"font").hexdigest())
+            self.assertEqual((cache.hits, cache.misses), (1, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import os
+import subprocess
+import tempfile
+import unittest
+
+import asset_sync
+import main
+from hash_cache import sha256_file
+
+
+def write(root, rel, data):
+    path = os.path.join(root, *rel.split("/"))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+def write_manifest(root):
+    files = sorted(asset_sync._walk_public(root) - {"checksums.sha256"})
+    lines = [f"{sha256_file(os.path.join(root, *rel.split('/')))}  {rel}" for rel in files]
+    write(root, "checksums.sha256", "\n".join(lines).encode())
+
+
+def git(repo, *args, **kwargs):
+    return subprocess.run(["git", "-C", repo, *args], check=True, capture_output=True, text=True, **kwargs).stdout
+
+
+class AssetSyncTests(unittest.TestCase):
+    def setUp(self):
+        self.output = tempfile.mkdtemp()
+        self.target = tempfile.mkdtemp()
+        self.addCleanup(subprocess.run, ["rm", "-rf", self.output, self.target])
+
+    def test_delta_sync_touches_only_changed_files_and_stages_them(self):
+        for root in (self.output, self.target):
+            write(root, "music/Same.ogg", b"same")
+            write(root, "chart/A.0/IN.json", b"old")
+            write(root, "avatar/Gone.png", b"gone")
+        write_manifest(self.target)
+        git(self.target, "init", "-q")
+        git(self.target, "add", "-A")
+        git(self.target, "-c", "user.name=t", "-c", "user.email=t@t", "commit", "-qm", "base")
+        os.remove(os.path.join(self.output, "avatar", "Gone.png"))
+        write(self.output, "chart/A.0/IN.json", b"new")
+        write(self.output, "music/New.ogg", b"fresh")
+        write_manifest(self.output)
+        untouched = os.stat(os.path.join(self.target, "music", "Same.ogg"))
+
+        result = asset_sync.sync(self.output, self.target, git_index=True)
+
+        self.assertEqual((result["mode"], result["copied"], result["deleted"]), ("delta", 3, 1))
+        self.assertFalse(os.path.exists(os.path.join(self.target, "avatar")))
+        after = os.stat(os.path.join(self.target, "music", "Same.ogg"))
+        self.assertEqual((after.st_ino, after.st_mtime_ns), (untouched.st_ino, untouched.st_mtime_ns))
+        staged = git(self.target, "diff", "--cached", "--name-status").split("\n")
+        self.assertEqual(
+            sorted(line for line in staged if line),
+            ["A\tmusic/New.ogg", "D\tavatar/Gone.png", "M\tchart/A.0/IN.json", "M\tchecksums.sha256"],
+        )
+        # 工作区与索引一致，也没有遗漏的未跟踪文件，可以直接 commit
+        self.assertEqual(git(self.target, "diff", "--name-only"), "")
+        self.assertEqual(git(self.target, "ls-files", "--others"), "")
+
+    def test_mirror_mode_without_previous_manifest(self):
+        write(self.output, "chart/A.0/IN.json", b"abc")
+        write(self.target, "chart/A.0/IN.json", b"xyz")
+        write(self.target, "chart/Stale.0/IN.json", b"stale")
+        write(self.target, "README.md", b"keep")
+
+        plan = asset_sync.plan_sync(self.output, self.target)
+        asset_sync.apply_sync(self.output, self.target, plan)
+
+        self.assertEqual((plan["mode"], plan["copy"], plan["delete"]), ("mirror", ["chart/A.0/IN.json"], ["chart/Stale.0/IN.json"]))
+        with open(os.path.join(self.target, "chart", "A.0", "IN.json"), "rb") as f:
+            self.assertEqual(f.read(), b"abc")
+        self.assertTrue(os.path.exists(os.path.join(self.target, "README.md")))
+
+
+class SyncCommandTests(unittest.TestCase):
+    def test_options_may_precede_the_target(self):
+        args = main.build_parser().parse_args(["sync", "--git-index", "/tmp/asset-repo"])
+
+        self.assertEqual((args.target, args.git_index, args.output), ("/tmp/asset-repo", True, main.OUTPUT_DIR))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from PIL import Image
+
+import avatar_atlas
+
+
+def overlaps(a, b):
+    return a[0] == b[0] and a[1] < b[1] + b[3] and b[1] < a[1] + a[3] and a[2] < b[2] + b[4] and b[2] < a[2] + a[4]
+
+
+class PackTests(unittest.TestCase):
+    def test_rects_fit_without_overlap_and_spill_to_new_pages(self):
+        sizes = {f"a{i}": (30 + i % 3 * 10, 20 + i % 4 * 10) for i in range(20)}
+
+        placements = avatar_atlas.pack(sizes, atlas_size=128, padding=2)
+
+        self.assertEqual(set(placements), set(sizes))
+        self.assertGreater(max(p[0] for p in placements.values()), 0)
+        for name, placement in placements.items():
+            self.assertLessEqual(placement[1] + placement[3], 128)
+            self.assertLessEqual(placement[2] + placement[4], 128)
+            for other, other_placement in placements.items():
+                if name != other:
+                    self.assertFalse(overlaps(placement, other_placement), (name, other))
+
+    def test_fixed_placements_are_kept(self):
+        fixed = {"old": (0, 0, 0, 64, 64)}
+
+        placements = avatar_atlas.pack({"new": (64, 64)}, atlas_size=128, padding=0, fixed=fixed)
+
+        self.assertEqual(placements["old"], (0, 0, 0, 64, 64))
+        self.assertFalse(overlaps(placements["old"], placements["new"]))
+
+
+class BuildAtlasTests(unittest.TestCase):
+    def save_avatar(self, root, name, colour, size=(32, 32)):
+        Image.new("RGBA", size, colour).save(os.path.join(root, "avatar", f"{name}.png"))
+
+    def test_index_coordinates_and_incremental_rebuild(self):
+        with tempfile.TemporaryDirectory() as output:
+            os.makedirs(os.path.join(output, "avatar"))
+            for i in range(6):
+                self.save_avatar(output, f"A{i}", (i * 40, 0, 0, 255))
+
+            # 64×64 的页每页放得下一个 34×34（含间距）的头像
+            first = avatar_atlas.build_avatar_atlas(output, atlas_size=64, padding=2, formats=("png",), logger=None)
+            index = avatar_atlas.load_index(os.path.join(output, avatar_atlas.ATLAS_DIR_NAME))
+            self.assertEqual((first["avatars"], first["pages"]), (6, 6))
+            page, x, y, w, h = index["avatars"]["A3"]
+            with Image.open(os.path.join(output, avatar_atlas.ATLAS_DIR_NAME, f"atlas-{page}.png")) as atlas:
+                self.assertEqual(atlas.getpixel((x + w // 2, y + h // 2)), (120, 0, 0, 255))
+
+            unchanged = avatar_atlas.build_avatar_atlas(output, atlas_size=64, padding=2, formats=("png",), logger=None)
+            self.assertEqual(unchanged["rebuilt"], [])
+
+            self.save_avatar(output, "A3", (1, 2, 3, 255))
+            changed = avatar_atlas.build_avatar_atlas(output, atlas_size=64, padding=2, formats=("png",), logger=None)
+            with open(os.path.join(output, avatar_atlas.ATLAS_DIR_NAME, avatar_atlas.ATLAS_INDEX_FILENAME), encoding="utf-8") as f:
+                updated = json.load(f)
+            # 其余头像坐标不动，只重画变更头像所在的页
+            self.assertEqual({k: v for k, v in updated["avatars"].items() if k != "A3"}, {k: v for k, v in index["avatars"].items() if k != "A3"})
+            self.assertEqual(changed["rebuilt"], [updated["avatars"]["A3"][0]])
+
+    def test_emptied_middle_page_is_dropped_and_pages_renumbered(self):
+        with tempfile.TemporaryDirectory() as output:
+            os.makedirs(os.path.join(output, "avatar"))
+            for i, name in enumerate("abc"):
+                self.save_avatar(output, name, (i * 100, 0, 0, 255), size=(100, 100))
+            atlas_dir = os.path.join(output, avatar_atlas.ATLAS_DIR_NAME)
+            self.assertEqual(avatar_atlas.build_avatar_atlas(output, atlas_size=128, padding=2, formats=("png",), logger=None)["pages"], 3)
+
+            page_of_a = avatar_atlas.load_index(atlas_dir)["avatars"]["a"][0]
+            os.remove(os.path.join(output, "avatar", "a.png"))
+            result = avatar_atlas.build_avatar_atlas(output, atlas_size=128, padding=2, formats=("png",), logger=None)
+
+            index = avatar_atlas.load_index(atlas_dir)
+            self.assertNotEqual(page_of_a, 2, "测试需要移除的是非末页的头像")
+            self.assertEqual(result["pages"], 2)
+            self.assertEqual(sorted(index["avatars"]), ["b", "c"])
+            self.assertFalse(os.path.exists(os.path.join(atlas_dir, "atlas-2.png")))
+            for name, colour in (("b", (100, 0, 0, 255)), ("c", (200, 0, 0, 255))):
+                page, x, y, w, h = index["avatars"][name]
+                with Image.open(os.path.join(atlas_dir, f"atlas-{page}.png")) as atlas:
+                    self.assertEqual(atlas.getpixel((x + w // 2, y + h // 2)), colour)
+
+
+
+class MainTests(unittest.TestCase):
+    def test_malformed_env_falls_back_to_defaults(self):
+        env = {"AVATAR_ATLAS_SIZE": "big", "AVATAR_ATLAS_PADDING": "-1"}
+        with mock.patch.dict(os.environ, env), mock.patch.object(avatar_atlas, "build_avatar_atlas", return_value=None) as build:
+            self.assertEqual(avatar_atlas.main(["site"]), 0)
+
+        build.assert_called_once_with("site", avatar_atlas.DEFAULT_ATLAS_SIZE, 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import os
+import tempfile
+import unittest
+
+import bundle_schedule
+
+
+class CostModelTests(unittest.TestCase):
+    def test_fit_recovers_linear_cost_and_keeps_defaults_for_sparse_categories(self):
+        samples = [{"category": "image", "file_size": size, "compress_size": size, "seconds": 0.5 + size * 1e-6} for size in (1000, 2000, 4000)]
+        samples.append({"category": "audio", "file_size": 10, "compress_size": 10, "seconds": 9.0})
+
+        model = bundle_schedule.fit_cost_model(samples)
+
+        base, rate = model["image"]
+        self.assertAlmostEqual(base, 0.5)
+        self.assertAlmostEqual(rate, 1e-6)
+        self.assertEqual(model["audio"], bundle_schedule.DEFAULT_COST_MODEL["audio"])
+
+    def test_timings_round_trip(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, bundle_schedule.TIMINGS_FILENAME)
+            self.assertEqual(bundle_schedule.load_timings(path), [])
+            samples = [{"category": "chart", "file_size": 1, "compress_size": 1, "seconds": 0.1}]
+            bundle_schedule.save_timings(path, samples)
+            self.assertEqual(bundle_schedule.load_timings(path), samples)
+
+
+class OrderJobsTests(unittest.TestCase):
+    def test_largest_first_alternating_cpu_and_io(self):
+        plans = {"a": {"kind": "illustration"}, "b": {"kind": "illustration"}, "m": {"kind": "music"}, "n": {"kind": "music"}}
+        sizes = {"A": {"file_size": 10_000_000}, "B": {"file_size": 20_000_000}, "M": {"compress_size": 40_000_000}, "N": {"compress_size": 1}}
+        jobs = bundle_schedule.build_jobs(
+            [("a", [("a", "A")]), ("b", [("b", "B")]), ("m", [("m", "M")]), ("n", [("n", "N")])],
+            plans,
+            sizes,
+            bundle_schedule.DEFAULT_COST_MODEL,
+        )
+
+        order = [job["id"] for job in bundle_schedule.order_jobs(jobs)]
+
+        # b（1.22s）> m（0.41s），先取 CPU 队列，之后交替
+        self.assertEqual(order, ["b", "m", "a", "n"])
+
+    def test_tail_report_replays_actual_durations(self):
+        durations = {"small1": 1.0, "small2": 1.0, "big": 4.0}
+
+        report = bundle_schedule.tail_report(["small1", "small2", "big"], ["big", "small1", "small2"], durations, workers=2)
+
+        self.assertEqual((report["catalog_makespan"], report["scheduled_makespan"], report["saved"]), (5.0, 4.0, 1.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
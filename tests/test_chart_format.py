@@ -0,0 +1,100 @@
+import json
+import os
+import struct
+import tempfile
+import unittest
+
+import chart_format
+
+SAMPLE_CHART = {
+    "formatVersion": 3,
+    "offset": 0.30000001192092896,
+    "numOfNotes": 3,
+    "judgeLineList": [
+        {
+            "bpm": 170.0,
+            "notesAbove": [
+                {"type": 1, "time": 64, "positionX": -2.6580002307891846, "holdTime": 0.0, "speed": 1.0, "floorPosition": 1.1764706373214722},
+                {"type": 3, "time": 128, "positionX": 0.5, "holdTime": 32, "speed": 2.5, "floorPosition": 2.352941274642944},
+            ],
+            "notesBelow": [
+                {"type": 4, "time": 96, "positionX": 1.0, "holdTime": 0.0, "speed": 1.0, "floorPosition": 1.7647058963775635},
+            ],
+            "speedEvents": [{"startTime": 0.0, "endTime": 999999.0, "value": 2.2, "floorPosition": 0.0}],
+            "judgeLineMoveEvents": [{"startTime": -999999.0, "endTime": 1e9, "start": 0.5, "end": 0.5, "start2": 0.25, "end2": 0.25}],
+            "judgeLineRotateEvents": [],
+            "judgeLineDisappearEvents": [{"startTime": 0.0, "endTime": 64.0, "start": 0.0, "end": 1.0}],
+        },
+        {"bpm": 170.0, "notesAbove": [], "notesBelow": []},
+    ],
+}
+
+
+def _float32(value):
+    return struct.unpack("<f", struct.pack("<f", value))[0]
+
+
+class MinifyChartTests(unittest.TestCase):
+    def test_float32_noise_is_shortened_without_changing_float32_value(self):
+        self.assertEqual(chart_format.float32_shortest(0.30000001192092896), 0.3)
+        self.assertEqual(chart_format.float32_shortest(-2.6580002307891846), -2.6580002)
+        # 不是 float32 精确值的小数保持原样
+        self.assertEqual(chart_format.float32_shortest(0.1), 0.1)
+        self.assertEqual(chart_format.float32_shortest(64.0), 64.0)
+
+    def test_minified_chart_keeps_structure_and_float32_values(self):
+        minified = json.loads(chart_format.minify_chart(json.dumps(SAMPLE_CHART, indent=2)))
+
+        note = minified["judgeLineList"][0]["notesAbove"][0]
+        self.assertEqual(note["positionX"], -2.6580002)
+        self.assertEqual(_float32(note["floorPosition"]), _float32(1.1764706373214722))
+        self.assertEqual(minified["offset"], 0.3)
+        self.assertEqual(len(minified["judgeLineList"]), 2)
+
+
+@unittest.skipUnless(chart_format.np is not None, "numpy 未安装")
+class BinaryChartTests(unittest.TestCase):
+    def test_round_trip_matches_float32_values(self):
+        chart = chart_format.read_binary_chart(chart_format.encode_binary_chart(SAMPLE_CHART))
+
+        self.assertEqual(chart["formatVersion"], 3)
+        self.assertEqual(chart["notes"]["type"].tolist(), [1, 3, 4])
+        self.assertEqual(chart["notes"]["side"].tolist(), [0, 0, 1])
+        self.assertEqual(chart["events"]["kind"].tolist(), [0, 1, 3])
+
+        restored = chart_format.binary_chart_to_json(chart)
+        original_line = SAMPLE_CHART["judgeLineList"][0]
+        restored_line = restored["judgeLineList"][0]
+        for side in ("notesAbove", "notesBelow"):
+            for original, converted in zip(original_line[side], restored_line[side]):
+                for key, value in original.items():
+                    self.assertEqual(converted[key], _float32(value), key)
+        self.assertEqual(restored_line["speedEvents"][0]["value"], _float32(2.2))
+        self.assertNotIn("start2", restored_line["judgeLineDisappearEvents"][0])
+        self.assertEqual(restored["judgeLineList"][1], {"bpm": 170.0, "notesAbove": [], "notesBelow": []})
+
+    def test_postprocess_writes_binary_and_skips_unchanged_charts(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            song_dir = os.path.join(output_dir, "chart", "Song.Author.0")
+            os.makedirs(song_dir)
+            with open(os.path.join(song_dir, "IN.json"), "w", encoding="utf-8") as f:
+                json.dump(SAMPLE_CHART, f, indent=2)
+
+            first = chart_format.postprocess_charts(output_dir)
+            second = chart_format.postprocess_charts(output_dir)
+
+            self.assertEqual((first["minified"], first["binary"]), (1, 1))
+            self.assertLess(first["json_bytes_after"], first["json_bytes_before"])
+            self.assertEqual((second["binary"], second["skipped"]), (0, 1))
+            self.assertEqual(len(chart_format.read_binary_chart(os.path.join(song_dir, "IN.bin"))["notes"]), 3)
+
+
+class PostprocessModeTests(unittest.TestCase):
+    def test_modes_are_parsed_from_env_value(self):
+        self.assertEqual(chart_format.parse_postprocess_modes(None), ())
+        self.assertEqual(chart_format.parse_postprocess_modes("all"), ("minify", "binary"))
+        self.assertEqual(chart_format.parse_postprocess_modes("binary"), ("binary",))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import json
+import os
+import tempfile
+import unittest
+
+import chart_stats
+
+
+def _note(note_type, time, hold=0.0):
+    return {"type": note_type, "time": time, "positionX": 0.0, "holdTime": hold, "speed": 1.0, "floorPosition": 0.0}
+
+
+CHART = {
+    "formatVersion": 3,
+    "offset": 0.0,
+    "judgeLineList": [
+        # bpm 120：32 个时间单位 = 0.5 秒
+        {"bpm": 120.0, "notesAbove": [_note(1, 0), _note(2, 32), _note(3, 64, hold=64)], "notesBelow": [_note(4, 64)]},
+        {"bpm": 240.0, "notesAbove": [_note(1, 640)], "notesBelow": []},
+    ],
+}
+
+
+@unittest.skipUnless(chart_stats.np is not None, "numpy 未安装")
+class ChartStatsTests(unittest.TestCase):
+    def test_counts_bpm_duration_and_peak_density(self):
+        chart = chart_stats.chart_format.read_binary_chart(chart_stats.chart_format.encode_binary_chart(CHART))
+
+        stats = chart_stats.compute_chart_stats(chart)
+
+        self.assertEqual((stats["notes"], stats["tap"], stats["drag"], stats["hold"], stats["flick"]), (5, 2, 1, 1, 1))
+        self.assertEqual((stats["bpm"], stats["bpm_min"], stats["bpm_max"], stats["lines"]), (120.0, 120.0, 240.0, 2))
+        # 第二条线 640 单位 @240bpm = 5 秒
+        self.assertEqual(stats["duration"], 5.0)
+        # 0s、0.5s、1s、1s：[0.5, 1.5) 内 3 个
+        self.assertEqual(stats["peak_density"], 3.0)
+
+    def test_table_is_rebuilt_only_for_changed_charts(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            for level in ("IN", "EZ"):
+                song_dir = os.path.join(output_dir, "chart", "Song.Author.0")
+                os.makedirs(song_dir, exist_ok=True)
+                with open(os.path.join(song_dir, f"{level}.json"), "w", encoding="utf-8") as f:
+                    json.dump(CHART, f)
+
+            self.assertEqual(chart_stats.build_chart_stats(output_dir), (2, 2, 0))
+            with open(os.path.join(output_dir, "chart", "Song.Author.0", "IN.json"), "w", encoding="utf-8") as f:
+                json.dump({**CHART, "judgeLineList": CHART["judgeLineList"][:1]}, f)
+            self.assertEqual(chart_stats.build_chart_stats(output_dir), (2, 1, 1))
+
+            rows = chart_stats.load_chart_stats(os.path.join(output_dir, "info", chart_stats.STATS_FILENAME))
+            self.assertEqual(list(rows), [("Song.Author", "EZ"), ("Song.Author", "IN")])
+            self.assertEqual(rows[("Song.Author", "IN")]["notes"], 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import json
+import os
+import tempfile
+import unittest
+
+import deploy_delta
+
+
+def write(root, rel, data=b"x"):
+    path = os.path.join(root, *rel.split("/"))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def checksum_text(checksums):
+    return "\n".join(f"{digest}  {path}" for path, digest in sorted(checksums.items()))
+
+
+class DiffTests(unittest.TestCase):
+    def test_sets_and_summary(self):
+        previous = {"chart/A.0/IN.json": "1", "music/A.ogg": "2", "illustration/A.png": "3", "avatar/Old.png": "4", "files.json": "5"}
+        current = {
+            "chart/A.0/IN.json": "1x",
+            "music/A.ogg": "2",
+            "illustration/A.png": "3x",
+            "chart/B.0/EZ.json": "6",
+            "music/B.ogg": "7",
+            "files.json": "5x",
+        }
+
+        delta = deploy_delta.diff_checksums(previous, current)
+        summary = deploy_delta.summarize_changes(delta, previous, current)
+
+        self.assertEqual(delta["added"], ["chart/B.0/EZ.json", "music/B.ogg"])
+        self.assertEqual(delta["changed"], ["chart/A.0/IN.json", "files.json", "illustration/A.png"])
+        self.assertEqual((delta["removed"], delta["unchanged"]), (["avatar/Old.png"], 1))
+        # 新曲目的文件只在“新曲目”一节出现
+        self.assertEqual(summary["new_songs"], ["B"])
+        self.assertEqual(summary["charts"], {"A": ["IN"]})
+        self.assertEqual((summary["art"], summary["music"], summary["other"]), ({"illustration": ["A"]}, [], 1))
+
+
+class BuildDeltaTests(unittest.TestCase):
+    def test_upload_list_covers_siblings_aliases_and_checksums(self):
+        with tempfile.TemporaryDirectory() as output, tempfile.TemporaryDirectory() as previous_dir, tempfile.TemporaryDirectory() as delta_dir:
+            digest = "ab" * 32
+            current = {"music/A.ogg": digest, "index.html": "cd" * 32, "robots.txt": "ef" * 32}
+            for rel in current:
+                write(output, rel)
+            write(output, "index.html.br")
+            write(output, f"h/{digest[:16]}.ogg")
+            write(output, "checksums.sha256", checksum_text(current).encode())
+            write(output, "checksums.sha256.br")
+            previous = {"robots.txt": "ef" * 32, "index.html": "00" * 32, "avatar/Gone.png": "11" * 32}
+            write(previous_dir, "checksums.sha256", checksum_text(previous).encode())
+
+            result = deploy_delta.build_delta(output, previous_dir, delta_dir)
+
+            self.assertEqual(
+                result["upload"],
+                ["checksums.sha256", "checksums.sha256.br", f"h/{digest[:16]}.ogg", "index.html", "index.html.br", "music/A.ogg"],
+            )
+            self.assertEqual(result["delete"], ["avatar/Gone.png", f"h/{'11' * 8}.png"])
+            with open(os.path.join(delta_dir, deploy_delta.UPLOAD_LIST_FILENAME), encoding="utf-8") as f:
+                self.assertEqual(f.read().split(), result["upload"])
+            with open(os.path.join(delta_dir, deploy_delta.DELTA_FILENAME), encoding="utf-8") as f:
+                self.assertEqual(json.load(f)["removed"], ["avatar/Gone.png"])
+            with open(os.path.join(delta_dir, deploy_delta.CHANGELOG_FILENAME), encoding="utf-8") as f:
+                self.assertIn("新增 1，变更 1，删除 1", f.read())
+
+    def test_missing_previous_manifest_means_full_upload(self):
+        with tempfile.TemporaryDirectory() as output, tempfile.TemporaryDirectory() as delta_dir:
+            write(output, "checksums.sha256", b"")
+            self.assertIsNone(deploy_delta.build_delta(output, os.path.join(output, "nope"), delta_dir))
+
+
+if __name__ == "__main__":
+    unittest.main()
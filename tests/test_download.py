@@ -0,0 +1,45 @@
+import hashlib
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import main
+
+
+class DownloadApkTests(unittest.TestCase):
+    def run_download(self, payload, expected_md5):
+        def fake_aria2c(cmd, check):
+            # 与 aria2c 默认行为一致：目标已存在时另存为 .1，因此旧文件必须事先删掉
+            target = cmd[cmd.index("-o") + 1]
+            if os.path.exists(target):
+                target = target[:-4] + ".1.apk"
+            with open(target, "wb") as f:
+                f.write(payload)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            apk = os.path.join(tmp, "game.apk")
+            with open(apk, "wb") as f:
+                f.write(b"old" * 1024)
+            with open(apk + ".aria2", "wb") as f:
+                f.write(b"control")
+            with mock.patch.object(main.subprocess, "run", side_effect=fake_aria2c), mock.patch.object(main, "flush_print"):
+                ok = main.download_apk("https://example.invalid/game.apk", apk, expected_md5)
+            with open(apk, "rb") as f:
+                content = f.read()
+            return ok, content, os.path.exists(apk + ".aria2")
+
+    def test_previous_apk_is_replaced_and_md5_checked(self):
+        payload = b"new" * 1024
+        ok, content, control_left = self.run_download(payload, hashlib.md5(payload).hexdigest().upper())
+        self.assertTrue(ok)
+        self.assertEqual(content, payload)
+        self.assertFalse(control_left)
+
+    def test_md5_mismatch_fails(self):
+        ok, _, _ = self.run_download(b"new" * 1024, "0" * 32)
+        self.assertFalse(ok)
+
+
+if __name__ == "__main__":
+    unittest.main()
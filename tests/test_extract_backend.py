@@ -0,0 +1,106 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+from zipfile import ZIP_DEFLATED, ZIP_STORED, ZipFile
+
+from PIL import Image
+
+import extract_backend
+import main
+
+
+class ShardPlanTests(unittest.TestCase):
+    def test_categories_and_keys(self):
+        self.assertEqual(extract_backend.parse_categories(""), extract_backend.CATEGORIES)
+        self.assertEqual(extract_backend.parse_categories("chart, image"), ("chart", "image"))
+        with self.assertRaises(ValueError):
+            extract_backend.parse_categories("video")
+        self.assertEqual(
+            [extract_backend.key_category(key) for key in ("avatar.Foo", "Song.0/Chart_IN.json", "Song.0/music.wav", "Song.0/IllustrationBlur.png", "Song.0/Other")],
+            ["image", "chart", "audio", "image", None],
+        )
+
+    def test_shards_are_balanced_by_size(self):
+        shards = extract_backend.assign_shards({"a": 9, "b": 5, "c": 4, "d": 1}, 2)
+
+        self.assertEqual(shards, [{"a", "d"}, {"b", "c"}])
+
+    def test_shard_package_drops_other_bundles_and_keeps_compression(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            apk_path = os.path.join(tmp, "game.apk")
+            with ZipFile(apk_path, "w") as apk:
+                apk.writestr("assets/aa/catalog.json", "{}", compress_type=ZIP_DEFLATED)
+                apk.writestr("assets/aa/Android/keep.bundle", b"k" * 100, compress_type=ZIP_STORED)
+                apk.writestr("assets/aa/Android/drop.bundle", b"d")
+            shard_path = os.path.join(tmp, "shard.apk")
+
+            extract_backend.write_shard_package(apk_path, shard_path, {"drop.bundle"})
+
+            with ZipFile(shard_path) as shard:
+                self.assertEqual(shard.namelist(), ["assets/aa/catalog.json", "assets/aa/Android/keep.bundle"])
+                self.assertEqual(shard.getinfo("assets/aa/catalog.json").compress_type, ZIP_DEFLATED)
+                self.assertEqual(shard.read("assets/aa/Android/keep.bundle"), b"k" * 100)
+
+
+class CompareOutputsTests(unittest.TestCase):
+    def write(self, root, rel, data):
+        path = os.path.join(root, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_parity_by_category(self):
+        with tempfile.TemporaryDirectory() as a, tempfile.TemporaryDirectory() as b:
+            self.write(a, "chart/S.0/IN.json", json.dumps({"notes": [1, 2]}).encode())
+            self.write(b, "chart/S.0/IN.json", b'{ "notes": [1,2] }')
+            self.write(a, "music/S.ogg", b"ogg")
+            self.write(b, "music/S.ogg", b"ogx")
+            self.write(a, "music/T.ogg", b"ogg")
+            # 同一像素，不同模式与压缩级别
+            image = Image.new("RGBA", (3, 2), (1, 2, 3, 255))
+            for root in (a, b):
+                os.makedirs(os.path.join(root, "illustration"))
+            image.save(os.path.join(a, "illustration", "S.png"), compress_level=1)
+            image.convert("RGB").save(os.path.join(b, "illustration", "S.png"), compress_level=9)
+
+            report = extract_backend.compare_outputs(a, b)
+
+            self.assertEqual(report["chart"]["equivalent"], 1)
+            self.assertEqual(report["image"]["equivalent"], 1)
+            self.assertEqual((report["audio"]["different"], report["audio"]["only_a"]), (1, 1))
+            self.assertEqual(report["audio"]["samples"], ["music/S.ogg"])
+            self.assertTrue(extract_backend.parity_ok(report["chart"]))
+            self.assertFalse(extract_backend.parity_ok(report["audio"]))
+
+    def test_recommendation_picks_fastest_successful_backend(self):
+        runs = {
+            "image": {"unitypy": {"wall": 9.0, "returncode": 0}, "phiinfo": {"wall": 3.0, "returncode": 0}},
+            "audio": {"unitypy": {"wall": 5.0, "returncode": 0}, "phiinfo": {"wall": 1.0, "returncode": 1}},
+        }
+        parity = {"image": {"only_a": 0, "only_b": 0, "different": 0}, "audio": {"only_a": 2, "only_b": 0, "different": 0}}
+
+        self.assertEqual(
+            extract_backend.recommend(runs, parity),
+            {"image": {"backend": "phiinfo", "parity": True}, "audio": {"backend": "unitypy", "parity": False}},
+        )
+
+
+class BenchmarkCommandTests(unittest.TestCase):
+    def test_options_may_precede_the_apk(self):
+        args = main.build_parser().parse_args(["benchmark", "--per-category", "--shards", "2"])
+
+        self.assertEqual((args.apk, args.shards, args.per_category), (main.APK_FILENAME, 2, True))
+
+    def test_malformed_shards_env_does_not_break_the_parser(self):
+        with mock.patch.dict(os.environ, {"PHIINFO_SHARDS": "auto"}):
+            args = main.build_parser().parse_args(["extract"])
+            self.assertEqual(extract_backend.resolve_shards(args.shards), 1)
+        with mock.patch.dict(os.environ, {"PHIINFO_SHARDS": "4"}):
+            self.assertEqual(extract_backend.resolve_shards(None), 4)
+            self.assertEqual(extract_backend.resolve_shards(0), 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+import json
+import os
+import tempfile
+import unittest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+from file_index import (
+    apply_delta,
+    front_decode,
+    front_encode,
+    MANIFEST_FILENAME,
+    split_into_shards,
+    write_compact_index,
+)
+
+
+class FrontCodingTests(unittest.TestCase):
+    def test_round_trip(self):
+        paths = sorted([
+            "chart/Song.A.0/EZ.json",
+            "chart/Song.A.0/HD.json",
+            "chart/Song.B.0/AT.json",
+            "lilith/illBlur/曲目.webp",
+        ])
+
+        encoded = front_encode(paths)
+
+        self.assertEqual(encoded[2], len("chart/Song.A.0/"))
+        self.assertEqual(front_decode(encoded), paths)
+
+    def test_shards_are_split_by_top_level_directory(self):
+        shards = split_into_shards(["music/b.ogg", "music/a.ogg", "robots.txt", "chart/x/EZ.json"])
+
+        self.assertEqual(shards["music"], ["music/a.ogg", "music/b.ogg"])
+        self.assertEqual(shards["_root"], ["robots.txt"])
+
+
+class WriteCompactIndexTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.output_dir = self.temp_dir.name
+        self.index_dir = os.path.join(self.output_dir, "index")
+
+    def _read(self, filename):
+        with open(os.path.join(self.index_dir, filename), encoding="utf-8") as f:
+            return json.load(f)
+
+    def test_unchanged_shards_keep_their_hash(self):
+        first = write_compact_index(self.output_dir, ["music/a.ogg", "chart/x/EZ.json"])
+        second = write_compact_index(self.output_dir, ["music/a.ogg", "chart/x/EZ.json", "chart/x/HD.json"])
+
+        self.assertEqual(first["shards"]["music"]["hash"], second["shards"]["music"]["hash"])
+        self.assertNotEqual(first["shards"]["chart"]["hash"], second["shards"]["chart"]["hash"])
+        self.assertEqual(second["shards"]["music"]["deltas"], {})
+
+    def test_deltas_reach_back_several_versions(self):
+        versions = [
+            ["music/a.ogg"],
+            ["music/a.ogg", "music/b.ogg"],
+            ["music/b.ogg", "music/c.ogg"],
+        ]
+        hashes = []
+        for paths in versions:
+            manifest = write_compact_index(self.output_dir, paths)
+            hashes.append(manifest["shards"]["music"]["hash"])
+
+        deltas = manifest["shards"]["music"]["deltas"]
+        self.assertEqual(set(deltas), set(hashes[:2]))
+        for old_hash, old_paths in zip(hashes[:2], versions[:2]):
+            delta = self._read(deltas[old_hash])
+            self.assertEqual(apply_delta(old_paths, delta), versions[2])
+
+        # 未被新清单引用的旧分片会被清理。
+        referenced = {MANIFEST_FILENAME, manifest["shards"]["music"]["file"], *deltas.values()}
+        self.assertEqual(set(os.listdir(self.index_dir)), referenced)
+
+
+def effective_headers(headers_text, path):
+    """按 Pages 语义合并所有匹配规则的头：同名头累加，"! 名称" 去掉前面规则设置的值。"""
+    headers = {}
+    matched = False
+    for line in headers_text.splitlines():
+        if not line.strip() or line.lstrip().startswith("#"):
+            continue
+        if not line.startswith((" ", "\t")):
+            rule = line.strip()
+            matched = rule == path or (rule.endswith("*") and path.startswith(rule[:-1]))
+            continue
+        if not matched:
+            continue
+        entry = line.strip()
+        if entry.startswith("!"):
+            headers.pop(entry[1:].strip().lower(), None)
+        else:
+            name, _, value = entry.partition(":")
+            headers.setdefault(name.strip().lower(), []).append(value.strip())
+    return headers
+
+
+class HeadersTests(unittest.TestCase):
+    def test_manifest_is_not_covered_by_immutable_shard_rule(self):
+        with open(os.path.join(REPO_ROOT, "_headers"), encoding="utf-8") as f:
+            headers = f.read()
+
+        manifest = effective_headers(headers, f"/index/{MANIFEST_FILENAME}")
+        shard = effective_headers(headers, "/index/0123456789abcdef.json")
+
+        self.assertEqual(manifest["cache-control"], ["public, max-age=300, stale-while-revalidate=86400"])
+        self.assertEqual(shard["cache-control"], ["public, max-age=31536000, immutable"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import font_shards
+
+CSS = """
+@font-face{font-family:"Demo Serif";src:local("Demo Serif"),url("./aaa.woff2")format("woff2");unicode-range:U+4E00-4E0F,U+4E20}
+@font-face{font-family:"Demo Serif";src:url("./bbb.woff2")format("woff2");unicode-range:U+4E10-4E1F,U+3??}
+@font-face{font-family:"Demo Serif";src:url("./ccc.woff2")format("woff2");unicode-range:U+61-7A}
+"""
+
+PAGE = """<!DOCTYPE html>
+<html>
+<head>
+  <title>标题</title>
+  <link rel="stylesheet" href="Demo%20Serif/result.css">
+</head>
+<body><div>丁丁丑</div><script>var s = "abc";</script></body>
+</html>
+"""
+
+
+class ParseTests(unittest.TestCase):
+    def test_unicode_range_forms(self):
+        self.assertEqual(
+            font_shards.parse_unicode_range("U+4E00, U+4E10-4E1F, U+3??"),
+            [(0x4E00, 0x4E00), (0x4E10, 0x4E1F), (0x300, 0x3FF)],
+        )
+
+    def test_runs_round_trip_and_lookup(self):
+        family = font_shards.build_family_index(font_shards.parse_font_css(CSS), "Demo Serif/result.css")
+
+        self.assertEqual(family["shards"], ["aaa.woff2", "bbb.woff2", "ccc.woff2"])
+        self.assertEqual(font_shards.decode_runs(font_shards.encode_runs(family["ranges"])), family["ranges"])
+        # 4E00-4E0F、4E10-4E1F、4E20 属于不同分片，未覆盖的字符被忽略
+        self.assertEqual(font_shards.shards_for_codepoints(family, {0x4E01, 0x4E20, 0x9999}), {0})
+        self.assertEqual(font_shards.shards_for_codepoints(family, {0x4E11, ord("b")}), {1, 2})
+
+
+    def test_preload_limit_env_is_tolerant(self):
+        for raw, expected in (("", font_shards.DEFAULT_PRELOAD_LIMIT), ("abc", font_shards.DEFAULT_PRELOAD_LIMIT), ("-3", 0), ("2", 2)):
+            with self.subTest(raw=raw), mock.patch.dict(os.environ, {"FONT_PRELOAD_LIMIT": raw}):
+                self.assertEqual(font_shards.preload_limit_from_env(), expected)
+
+
+class GenerateFontIndexTests(unittest.TestCase):
+    def test_index_info_shards_and_idempotent_preload(self):
+        with tempfile.TemporaryDirectory() as site:
+            os.makedirs(os.path.join(site, "Demo Serif"))
+            os.makedirs(os.path.join(site, "info"))
+            with open(os.path.join(site, "Demo Serif", "result.css"), "w", encoding="utf-8") as f:
+                f.write(CSS)
+            with open(os.path.join(site, "info", "info.tsv"), "w", encoding="utf-8") as f:
+                f.write("id\tab\n")
+            page_path = os.path.join(site, "index.html")
+            with open(page_path, "w", encoding="utf-8") as f:
+                f.write(PAGE)
+
+            font_shards.generate_font_index(site, preload_limit=1)
+            summary = font_shards.generate_font_index(site, preload_limit=1)
+
+            with open(os.path.join(site, font_shards.FONT_INDEX_FILENAME), encoding="utf-8") as f:
+                index = json.load(f)["fonts"]["Demo Serif"]
+            self.assertEqual(index["info"], [2])
+            self.assertEqual(summary["fonts"]["Demo Serif"], (1, 3))
+
+            with open(page_path, encoding="utf-8") as f:
+                page = f.read()
+            # 首屏出现最多的是 aaa 分片（脚本与 <head> 中的文字不计入），重复生成不会叠加区块
+            self.assertEqual(page.count('rel="preload"'), 1)
+            self.assertIn('href="Demo%20Serif/aaa.woff2"', page)
+            self.assertEqual(page.count(font_shards.PRELOAD_BEGIN_MARKER), 1)
+            self.assertLess(page.index(font_shards.PRELOAD_END_MARKER), page.index("</head>"))
+
+    def test_preload_limit_applies_across_families(self):
+        serif = font_shards.build_family_index(font_shards.parse_font_css(CSS), "Demo Serif/result.css")
+        sans = font_shards.build_family_index(font_shards.parse_font_css(CSS), "Demo Sans/result.css")
+        page = PAGE.replace(
+            '<link rel="stylesheet" href="Demo%20Serif/result.css">',
+            '<link rel="stylesheet" href="./Demo%20Serif/result.css"><link rel="stylesheet" href="/Demo%20Sans/result.css">',
+        )
+
+        fonts = {"Demo Sans": sans, "Demo Serif": serif}
+
+        # 两个字体各用到 aaa、bbb 两个分片，合计 4 个，按总数截断
+        self.assertEqual(len(font_shards.build_preload_links(fonts, page, limit=3)), 3)
+        links = font_shards.build_preload_links(fonts, page, limit=1)
+        self.assertEqual(links, ['<link rel="preload" href="Demo%20Sans/aaa.woff2" as="font" type="font/woff2" crossorigin>'])
+
+    def test_parent_relative_stylesheet_is_not_a_site_font(self):
+        page = '<link rel="stylesheet" href="../Demo%20Serif/result.css">'
+        self.assertEqual(font_shards.linked_font_css(page), ["../Demo Serif/result.css"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import os
+import tempfile
+import unittest
+
+from generate_index import (
+    build_asset_manifest,
+    build_generated_header_rules,
+    content_hashed_extensions,
+    collect_file_hashes,
+    is_content_hashed_dir,
+    sync_hashed_aliases,
+)
+
+
+class AssetManifestTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.output_dir = self.temp_dir.name
+
+    def _write(self, web_path, content):
+        path = os.path.join(self.output_dir, *web_path.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(content)
+
+    def test_manifest_only_covers_asset_dirs_and_dedupes_content(self):
+        self._write("illustration/a.PNG", b"same")
+        self._write("lilith/ill/a.webp", b"other")
+        self._write("music/b.ogg", b"same")
+        self._write("index.html", b"<html>")
+
+        manifest = build_asset_manifest(collect_file_hashes(self.output_dir))
+
+        self.assertEqual(set(manifest), {"illustration/a.PNG", "lilith/ill/a.webp", "music/b.ogg"})
+        self.assertTrue(manifest["illustration/a.PNG"].startswith("h/"))
+        self.assertTrue(manifest["illustration/a.PNG"].endswith(".png"))
+        self.assertEqual(manifest["illustration/a.PNG"][:-4], manifest["music/b.ogg"][:-4])
+
+    def test_aliases_are_created_and_stale_ones_removed(self):
+        self._write("chart/a.0/EZ.json", b"{}")
+        self._write("h/0000000000000000.json", b"stale")
+        manifest = build_asset_manifest(collect_file_hashes(self.output_dir, exclude_prefixes=("h/",)))
+
+        created, removed = sync_hashed_aliases(self.output_dir, manifest)
+
+        self.assertEqual((created, removed), (1, 1))
+        alias_path = os.path.join(self.output_dir, *manifest["chart/a.0/EZ.json"].split("/"))
+        with open(alias_path, "rb") as f:
+            self.assertEqual(f.read(), b"{}")
+
+    def test_font_shard_dirs_are_detected_as_content_hashed(self):
+        for i in range(10):
+            self._write(f"Font/{i:032x}.woff2", b"x")
+        self._write("Font/result.css", b"css")
+        self._write("chap/AllSong.png", b"png")
+
+        self.assertTrue(is_content_hashed_dir(os.path.join(self.output_dir, "Font")))
+        self.assertFalse(is_content_hashed_dir(os.path.join(self.output_dir, "chap")))
+        # result.css 不是哈希文件名，不能跟着分片一起 immutable
+        self.assertEqual(content_hashed_extensions(os.path.join(self.output_dir, "Font")), ("woff2",))
+        self.assertEqual(content_hashed_extensions(os.path.join(self.output_dir, "chap")), ())
+
+
+class GeneratedHeaderRulesTests(unittest.TestCase):
+    def test_hashed_paths_are_immutable_and_manual_rules_win(self):
+        base = "/chart/*\n  Cache-Control: public, max-age=60\n"
+
+        rules = build_generated_header_rules(
+            base,
+            top_level_dirs={"chart", "music", "info"},
+            with_aliases=True,
+            hashed_dirs={"Font": ("woff2",), "chap": ()},
+        )
+        text = "\n".join(rules)
+
+        self.assertIn("/h/*\n  ! Cache-Control\n  Cache-Control: public, max-age=31536000, immutable", text)
+        self.assertIn("/Font/*.woff2\n  ! Cache-Control\n  Cache-Control: public, max-age=31536000, immutable", text)
+        self.assertNotIn("/Font/*\n", text)
+        self.assertNotIn("/chap/", text)
+        self.assertIn("/music/*", text)
+        self.assertNotIn("/chart/*", text)
+        self.assertNotIn("/info/*", text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,10 +2,13 @@ import random
 import unittest
 
 from generate_index import (
+    build_illustration_fallback_rules,
     build_illustration_redirect_rules,
     is_hidden_web_path,
     METADATA_FILE_WEB_PATHS,
     remove_generated_illustration_redirects,
+    replace_redirect_section,
+    summarize_redirect_rules,
 )
 
 
@@ -68,6 +71,31 @@ class BuildIllustrationRedirectRulesTests(unittest.TestCase):
         self.assertNotIn("/lilith/ill/1/0.webp", cleaned)
         self.assertNotIn("Auto-generated illustration redirects", cleaned)
 
+    def test_rule_budget_limits_number_of_groups(self):
+        file_list = [f"illustration/song_{i}.png" for i in range(100)]
+
+        rules, meta = build_illustration_redirect_rules(
+            file_list,
+            hash_length=1,
+            rule_budget=40,
+            rng=random.Random(3),
+        )
+        redirect_lines = [line for line in rules if not line.startswith("#")]
+
+        self.assertEqual(meta["num_groups"], 2)
+        self.assertEqual(len(redirect_lines), 32)
+        self.assertEqual(meta["reachable_count"], 32)
+
+    def test_budget_smaller_than_one_group_skips_generation(self):
+        rules, meta = build_illustration_redirect_rules(
+            ["illustration/song_a.png"],
+            hash_length=2,
+            rule_budget=100,
+            rng=random.Random(1),
+        )
+        self.assertEqual(rules, [])
+        self.assertEqual(meta, {})
+
     def test_hidden_output_paths_are_filtered(self):
         self.assertTrue(is_hidden_web_path(".git/HEAD"))
         self.assertTrue(is_hidden_web_path("nested/.cache/file.json"))
@@ -81,5 +109,91 @@ class BuildIllustrationRedirectRulesTests(unittest.TestCase):
         self.assertIn("info/version.txt", METADATA_FILE_WEB_PATHS)
 
 
+class RedirectSectionTests(unittest.TestCase):
+    def test_section_is_replaced_in_place(self):
+        content = replace_redirect_section(
+            "/before /a 301\n",
+            "illustration",
+            ["/ill/1/0.jpg /illustration/a.png 200"],
+        )
+        content += "/after /b 301\n"
+
+        updated = replace_redirect_section(
+            content,
+            "illustration",
+            ["/ill/1/0.jpg /illustration/b.png 200"],
+        )
+
+        self.assertTrue(updated.startswith("/before /a 301\n"))
+        self.assertTrue(updated.endswith("/after /b 301\n"))
+        self.assertIn("/illustration/b.png", updated)
+        self.assertNotIn("/illustration/a.png", updated)
+
+    def test_empty_rules_remove_section(self):
+        content = replace_redirect_section("/keep /a 301\n", "illustration", ["/ill/1/0.jpg /x.png 200"])
+
+        self.assertEqual(replace_redirect_section(content, "illustration", []), "/keep /a 301\n")
+
+    def test_legacy_rules_are_migrated_into_section(self):
+        legacy = "/manual /a 301\n# === Auto-generated illustration redirects (1 png files, 1 groups) ===\n/ill/1/0.jpg /x.png 200"
+
+        updated = replace_redirect_section(legacy, "illustration", ["/ill/1/0.jpg /y.png 200"])
+
+        self.assertNotIn("/x.png", updated)
+        self.assertEqual(updated.count("/ill/1/0.jpg"), 1)
+        self.assertIn("/manual /a 301", updated)
+
+    def test_summary_counts_static_and_dynamic_rules(self):
+        summary = summarize_redirect_rules(
+            "# comment\n/a /b 301\n/ill/:group/:entry /ill/1/:entry 302\n/c/* /d 302\n"
+        )
+        self.assertEqual(summary["static"], 1)
+        self.assertEqual(summary["dynamic"], 2)
+        self.assertEqual(summary["max_line_length"], len("/ill/:group/:entry /ill/1/:entry 302"))
+
+
+def match_redirect(rule_source, path):
+    """按 Pages 语义匹配一条规则：:name 匹配一段，结尾 * 匹配其余部分；返回占位符或 None。"""
+    pattern, target_parts = rule_source.split("/"), path.split("/")
+    if pattern[-1] == "*":
+        return {} if target_parts[: len(pattern) - 1] == pattern[:-1] else None
+    if len(pattern) != len(target_parts):
+        return None
+    params = {}
+    for expected, actual in zip(pattern, target_parts):
+        if expected.startswith(":"):
+            params[expected] = actual
+        elif expected != actual:
+            return None
+    return params
+
+
+def follow_redirects(rules, existing, path, max_hops=5):
+    """静态文件优先，否则取第一条匹配的规则；返回经过的路径。"""
+    visited = [path]
+    while path not in existing and len(visited) <= max_hops:
+        for rule in rules:
+            source, target, _status = rule.split()
+            params = match_redirect(source, path)
+            if params is not None:
+                for name, value in params.items():
+                    target = target.replace(name, value)
+                path = target
+                break
+        else:
+            break
+        visited.append(path)
+    return visited
+
+
+class FallbackRuleTests(unittest.TestCase):
+    def test_missing_entries_resolve_without_loops(self):
+        rules = build_illustration_fallback_rules()
+        existing = {"/ill/1/00.jpg"}
+
+        self.assertEqual(follow_redirects(rules, existing, "/ill/1/zz.jpg"), ["/ill/1/zz.jpg", "/ill/1/00.jpg"])
+        self.assertEqual(follow_redirects(rules, existing, "/ill/9/00.jpg"), ["/ill/9/00.jpg", "/ill/1/00.jpg"])
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,50 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from PIL import Image
+
+import generate_lowres
+
+
+class WidthParsingTests(unittest.TestCase):
+    def test_parse_widths(self):
+        self.assertEqual(generate_lowres.parse_widths(None), generate_lowres.DEFAULT_ILLUSTRATION_WIDTHS)
+        self.assertEqual(generate_lowres.parse_widths("1024, 256,x,256"), (256, 1024))
+        self.assertEqual(generate_lowres.parse_widths("none"), ())
+
+
+class WidthLadderTests(unittest.TestCase):
+    def test_ladder_variants_and_srcset_manifest(self):
+        with tempfile.TemporaryDirectory() as output:
+            os.makedirs(os.path.join(output, "illustration"))
+            Image.new("RGBA", (300, 150), (10, 20, 30, 255)).save(os.path.join(output, "illustration", "Song.png"))
+            webp_only = {"webp": {"quality": 80}}
+
+            with mock.patch.object(generate_lowres, "OUTPUT_DIR", output), \
+                    mock.patch.object(generate_lowres, "ILLUSTRATION_WIDTHS", (64, 128, 512)), \
+                    mock.patch.object(generate_lowres, "RESPONSIVE_FORMATS", webp_only), \
+                    mock.patch.dict(generate_lowres.LILITH_FORMATS, {"ill": webp_only}):
+                first = generate_lowres.encode_song("Song")
+                with mock.patch.object(generate_lowres, "_encode_one") as encode:
+                    self.assertEqual(generate_lowres.encode_song("Song"), {})
+                    encode.assert_not_called()
+
+            # 512 超过源图宽度，不放大
+            self.assertEqual(first, {"webp": 1, "w/webp": 2})
+            self.assertFalse(os.path.exists(os.path.join(output, "lilith", "w512")))
+            with Image.open(os.path.join(output, "lilith", "w64", "Song.webp")) as img:
+                self.assertEqual(img.size, (64, 32))
+
+            with open(os.path.join(output, "lilith", "srcset", "Song.json"), encoding="utf-8") as f:
+                manifest = json.load(f)
+            self.assertEqual((manifest["width"], manifest["height"]), (300, 150))
+            self.assertEqual([v["width"] for v in manifest["variants"]], [64, 128, 300, 300])
+            for variant in manifest["variants"]:
+                self.assertEqual(variant["bytes"], os.path.getsize(os.path.join(output, *variant["path"].split("/"))))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+
+from generate_index import ROUTES_FILENAME, build_illustration_table, update_ill_routes
+
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+FUNCTION_PATH = ROOT_DIR / "functions" / "ill" / "[[path]].js"
+NODE = shutil.which("node")
+
+# 在 Node 中模拟 Pages 的 context.env.ASSETS，只依赖全局 fetch API (Node 18+)。
+NODE_SCRIPT = """
+const { pathToFileURL } = require("node:url");
+const [functionPath, tableJson] = process.argv.slice(1);
+
+(async () => {
+  const mod = await import(pathToFileURL(functionPath).href);
+  const table = JSON.parse(tableJson);
+  const requested = [];
+  const env = {
+    ASSETS: {
+      fetch: async (url) => {
+        const path = decodeURI(new URL(url).pathname);
+        requested.push(path);
+        if (path === mod.TABLE_PATH) return new Response(JSON.stringify(table));
+        return new Response(`image:${path}`, { headers: { "Content-Type": "image/png" } });
+      }
+    }
+  };
+
+  const counts = {};
+  for (let i = 0; i < table.items.length * 4; i++) {
+    const target = mod.pickIllustration(table, () => i / (table.items.length * 4));
+    counts[target] = (counts[target] || 0) + 1;
+  }
+
+  const response = await mod.onRequestGet({ request: new Request("https://example.com/ill/1/0a.jpg"), env });
+  console.log(JSON.stringify({
+    counts,
+    status: response.status,
+    cacheControl: response.headers.get("Cache-Control"),
+    body: await response.text(),
+    tableFetches: requested.filter((path) => path === mod.TABLE_PATH).length
+  }));
+})();
+"""
+
+
+class BuildIllustrationTableTests(unittest.TestCase):
+    def test_table_strips_common_prefix_and_suffix(self):
+        table = build_illustration_table([
+            "illustration/b.png",
+            "illustration/a.png",
+            "illustration/a.webp",
+            "lilith/ill/a.webp",
+        ])
+        self.assertEqual(table["prefix"], "illustration/")
+        self.assertEqual(table["suffix"], ".png")
+        self.assertEqual(table["items"], ["a", "b"])
+
+    def test_table_keeps_original_extension_case(self):
+        table = build_illustration_table([
+            "illustration/a.PNG",
+            "illustration/b.png",
+        ])
+        urls = sorted(f"/{table['prefix']}{item}{table['suffix']}" for item in table["items"])
+        self.assertEqual(urls, ["/illustration/a.PNG", "/illustration/b.png"])
+
+        table = build_illustration_table(["illustration/a.PNG", "illustration/b.PNG"])
+        self.assertEqual((table["suffix"], table["items"]), (".PNG", ["a", "b"]))
+
+
+class UpdateIllRoutesTests(unittest.TestCase):
+    def test_redirects_mode_removes_stale_routes(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            routes_path = os.path.join(output_dir, ROUTES_FILENAME)
+
+            update_ill_routes(output_dir, "edge")
+            with open(routes_path, "r", encoding="utf-8") as f:
+                self.assertEqual(json.load(f)["include"], ["/ill/*"])
+
+            update_ill_routes(output_dir, "redirects")
+            self.assertFalse(os.path.exists(routes_path))
+
+
+@unittest.skipIf(NODE is None, "node is not installed")
+class IllustrationFunctionTests(unittest.TestCase):
+    def _run(self, table):
+        result = subprocess.run(
+            [NODE, "-e", NODE_SCRIPT, str(FUNCTION_PATH), json.dumps(table)],
+            capture_output=True,
+            text=True,
+            timeout=30,
+            check=True,
+        )
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+    def test_pick_is_uniform_and_response_is_not_cached(self):
+        table = {"version": 1, "prefix": "illustration/", "suffix": ".png", "items": ["a", "b", "曲"]}
+
+        result = self._run(table)
+
+        self.assertEqual(
+            result["counts"],
+            {"/illustration/a.png": 4, "/illustration/b.png": 4, "/illustration/曲.png": 4},
+        )
+        self.assertEqual(result["status"], 200)
+        self.assertEqual(result["cacheControl"], "no-store")
+        self.assertTrue(result["body"].startswith("image:/illustration/"))
+        self.assertEqual(result["tableFetches"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
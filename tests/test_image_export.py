@@ -0,0 +1,42 @@
+import unittest
+from unittest import mock
+
+import numpy as np
+from PIL import Image
+
+import image_export
+
+
+def pillow_flatten(rgba):
+    background = Image.new("RGB", rgba.size, (255, 255, 255))
+    background.paste(rgba, mask=rgba.split()[-1])
+    return background
+
+
+class FlattenAlphaTests(unittest.TestCase):
+    def test_matches_pillow_paste_for_every_colour_and_alpha(self):
+        colour, alpha = np.meshgrid(np.arange(256, dtype=np.uint8), np.arange(256, dtype=np.uint8))
+        rgba = Image.fromarray(np.stack([colour, 255 - colour, colour, alpha], axis=-1))
+
+        flattened = image_export.PreparedImage(rgba).for_format("jpeg")
+
+        self.assertEqual(flattened.mode, "RGB")
+        self.assertEqual(flattened.tobytes(), pillow_flatten(rgba).tobytes())
+
+
+class PreparedImageTests(unittest.TestCase):
+    def test_conversions_are_shared_across_formats(self):
+        image = Image.new("RGBA", (2, 2), (10, 20, 30, 128))
+        prepared = image_export.PreparedImage(image)
+
+        self.assertIs(prepared.convert("RGBA"), image)
+        self.assertIs(prepared.for_format("png"), image)
+        self.assertIs(prepared.for_format("jpeg"), prepared.for_format("jpeg"))
+        with mock.patch.object(Image.Image, "convert", wraps=image.convert) as convert:
+            payloads = list(image_export.iter_image_variant_payloads(prepared, "a/b", ("png", "jpeg"), logger=None))
+            convert.assert_not_called()
+        self.assertEqual([path for path, _ in payloads], ["a/b.png", "a/b.jpg"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,130 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import pipeline
+from pipeline import Stage
+
+
+def quiet(_msg):
+    pass
+
+
+class RunStagesTests(unittest.TestCase):
+    def test_independent_stages_run_in_parallel(self):
+        barrier = threading.Barrier(2, timeout=2)
+        order = []
+
+        def both():
+            # 两个阶段互不依赖，只有同时运行才能通过 barrier
+            barrier.wait()
+
+        stages = [
+            Stage("source", lambda: order.append("source"), outputs=("raw",)),
+            Stage("a", both, inputs=("raw",)),
+            Stage("b", both, inputs=("raw",)),
+            Stage("sink", lambda: order.append("sink"), inputs=("a", "b")),
+        ]
+
+        report = pipeline.run_stages(stages, max_workers=4, logger=quiet)
+
+        self.assertEqual(order, ["source", "sink"])
+        self.assertTrue(all(entry["status"] == "done" for entry in report["stages"].values()))
+
+    def test_item_stage_streams_each_song_downstream(self):
+        first_packaged = threading.Event()
+        packaged = []
+
+        def process(song):
+            if song == "slow":
+                # 下游在上游处理完 "fast" 后即可开始，不必等 "slow"
+                self.assertTrue(first_packaged.wait(2))
+
+        def package(song):
+            packaged.append(song)
+            first_packaged.set()
+
+        stages = [
+            Stage("charts", items=lambda: ["fast", "slow"], run_item=process),
+            Stage("phira", items=lambda: ["fast", "slow"], run_item=package, streams=("charts",)),
+        ]
+
+        report = pipeline.run_stages(stages, max_workers=4, logger=quiet)
+
+        self.assertEqual(packaged, ["fast", "slow"])
+        self.assertEqual(report["stages"]["phira"]["status"], "done")
+
+    def test_failed_item_is_skipped_downstream_only_for_that_song(self):
+        packaged = []
+
+        def process(song):
+            if song == "broken":
+                raise ValueError("bad chart")
+
+        stages = [
+            Stage("charts", items=lambda: ["ok", "broken"], run_item=process),
+            Stage("phira", items=lambda: ["ok", "broken"], run_item=packaged.append, streams=("charts",)),
+        ]
+
+        report = pipeline.run_stages(stages, max_workers=2, logger=quiet)
+
+        self.assertEqual(packaged, ["ok"])
+        self.assertEqual(report["stages"]["charts"]["failed_items"], ["broken"])
+        self.assertEqual(report["stages"]["phira"]["skipped_items"], ["broken"])
+
+    def test_failed_stage_blocks_downstream(self):
+        ran = []
+
+        def explode():
+            raise RuntimeError("translate failed")
+
+        stages = [
+            Stage("translate", explode, outputs=("assets",)),
+            Stage("lowres", lambda: ran.append("lowres"), inputs=("assets",)),
+            Stage("index", lambda: ran.append("index"), inputs=("lowres",)),
+            Stage("unrelated", lambda: ran.append("unrelated")),
+        ]
+
+        report = pipeline.run_stages(stages, logger=quiet)
+
+        self.assertEqual(ran, ["unrelated"])
+        self.assertEqual(report["stages"]["translate"]["status"], "failed")
+        self.assertEqual(report["stages"]["lowres"]["status"], "blocked")
+        self.assertEqual(report["stages"]["index"]["status"], "blocked")
+
+    def test_critical_path_follows_slowest_branch(self):
+        stages = [
+            Stage("translate", lambda: None, outputs=("assets",)),
+            Stage("fast", lambda: None, inputs=("assets",)),
+            Stage("slow", lambda: time.sleep(0.2), inputs=("assets",)),
+            Stage("index", lambda: None, inputs=("fast", "slow")),
+        ]
+
+        report = pipeline.run_stages(stages, max_workers=4, logger=quiet)
+
+        self.assertEqual(report["critical_path"], ["translate", "slow", "index"])
+        self.assertIn("关键路径: translate", pipeline.format_report(report))
+
+    def test_unknown_input_is_rejected(self):
+        with self.assertRaises(ValueError):
+            pipeline.run_stages([Stage("index", lambda: None, inputs=("missing",))], logger=quiet)
+
+
+
+class MainTests(unittest.TestCase):
+    def test_malformed_workers_env_uses_the_default_pool(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            env = {"PIPELINE_WORKERS": "many", "PIPELINE_REPORT": os.path.join(temp_dir, "report.json")}
+            with mock.patch.dict(os.environ, env), \
+                    mock.patch.object(pipeline, "build_site_stages", return_value=[]), \
+                    mock.patch.object(pipeline, "run_stages", wraps=pipeline.run_stages) as run_stages, \
+                    mock.patch("builtins.print"):
+                self.assertEqual(pipeline.main([]), 0)
+
+        self.assertIsNone(run_stages.call_args.kwargs["max_workers"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import hashlib
+import json
+import os
+import tempfile
+import unittest
+
+import precompress
+
+
+@unittest.skipUnless(precompress.brotli is not None, "brotli 未安装")
+class PrecompressTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.output_dir = self.temp_dir.name
+
+    def _write(self, web_path, content):
+        path = os.path.join(self.output_dir, *web_path.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(content)
+        return hashlib.sha256(content).hexdigest()
+
+    def _run(self, file_hashes):
+        return precompress.precompress_outputs(self.output_dir, file_hashes, min_bytes=64, encodings=["br"])
+
+    def test_only_large_text_files_get_siblings(self):
+        text = json.dumps([f"chart/{i}/IN.json" for i in range(50)]).encode()
+        hashes = {
+            "files.json": self._write("files.json", text),
+            "tiny.json": self._write("tiny.json", b"[]"),
+            "illustration/a.png": self._write("illustration/a.png", text),
+        }
+
+        manifest, sibling_hashes, stats = self._run(hashes)
+
+        self.assertEqual(set(manifest), {"files.json"})
+        self.assertEqual(set(sibling_hashes), {"files.json.br"})
+        with open(os.path.join(self.output_dir, "files.json.br"), "rb") as f:
+            self.assertEqual(precompress.brotli.decompress(f.read()), text)
+        self.assertEqual(stats["compressed"], 1)
+
+    def test_unchanged_sources_are_reused_and_removed_sources_cleaned(self):
+        text = b"a,b,c\n" * 100
+        hashes = {
+            "info/a.csv": self._write("info/a.csv", text),
+            "info/b.csv": self._write("info/b.csv", text + b"x"),
+        }
+        self._run(hashes)
+        sibling = os.path.join(self.output_dir, "info", "a.csv.br")
+        before = os.stat(sibling)
+
+        del hashes["info/b.csv"]
+        manifest, _, stats = self._run(hashes)
+
+        after = os.stat(sibling)
+        self.assertEqual((after.st_ino, after.st_mtime_ns), (before.st_ino, before.st_mtime_ns))
+        self.assertEqual(stats, {"compressed": 0, "reused": 1, "source_bytes": len(text), "encoded_bytes": {"br": after.st_size}})
+        self.assertEqual(set(manifest), {"info/a.csv"})
+        self.assertFalse(os.path.exists(os.path.join(self.output_dir, "info", "b.csv.br")))
+
+    def test_siblings_are_cleaned_when_no_encoder_is_available(self):
+        hashes = {"info/a.csv": self._write("info/a.csv", b"a,b,c\n" * 100)}
+        self._run(hashes)
+
+        manifest, sibling_hashes, _ = precompress.precompress_outputs(self.output_dir, hashes, min_bytes=64, encodings=[])
+
+        self.assertEqual((manifest, sibling_hashes), ({}, {}))
+        self.assertFalse(os.path.exists(os.path.join(self.output_dir, "info", "a.csv.br")))
+
+    def test_header_rules_cover_each_extension_once(self):
+        manifest = {"a.json": {"br": {}}, "b/c.json": {"br": {}}, "d.csv": {"br": {}}}
+
+        rules = precompress.build_precompressed_header_rules(manifest, extra_extensions=(".sha256",), encodings=["br"])
+
+        self.assertEqual([line for line in rules if line.startswith("/")], ["/*.csv.br", "/*.json.br", "/*.sha256.br"])
+        self.assertIn("  Content-Encoding: br", rules)
+
+
+if __name__ == "__main__":
+    unittest.main()
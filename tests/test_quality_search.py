@@ -0,0 +1,81 @@
+import os
+import random
+import tempfile
+import unittest
+from unittest import mock
+
+from PIL import Image, ImageDraw, ImageFilter
+
+import quality_search
+
+
+def detailed_image(size=(160, 96), seed=1):
+    """随机细线，压缩时边缘最先糊掉。"""
+    rng = random.Random(seed)
+    image = Image.new("RGB", size, (128, 128, 128))
+    draw = ImageDraw.Draw(image)
+    for _ in range(300):
+        x, y = rng.randrange(size[0]), rng.randrange(size[1])
+        draw.line((x, y, x + rng.randrange(-20, 20), y + rng.randrange(-20, 20)), fill=tuple(rng.randrange(256) for _ in range(3)))
+    return image
+
+
+def flat_image(size=(160, 96)):
+    return Image.linear_gradient("L").resize(size).filter(ImageFilter.GaussianBlur(3)).convert("RGB")
+
+
+class SsimTests(unittest.TestCase):
+    def test_identical_is_one_and_distortion_lowers_score(self):
+        image = detailed_image().convert("L")
+        self.assertAlmostEqual(quality_search.ssim(image, image), 1.0)
+        self.assertLess(quality_search.ssim(image, image.filter(ImageFilter.GaussianBlur(2))), 0.5)
+
+
+class SearchQualityTests(unittest.TestCase):
+    def test_detailed_images_get_higher_quality_within_encode_cap(self):
+        bounds = quality_search.QUALITY_BOUNDS["webp"]
+
+        flat = quality_search.search_quality(flat_image(), "webp", 0.98, bounds, max_encodes=5)
+        detailed = quality_search.search_quality(detailed_image(), "webp", 0.98, bounds, max_encodes=5)
+
+        self.assertLessEqual(flat["encodes"], 5)
+        self.assertGreaterEqual(flat["ssim"], 0.98)
+        self.assertLess(flat["quality"], detailed["quality"])
+
+
+class QualityTunerTests(unittest.TestCase):
+    def test_results_are_cached_by_source_key_across_runs(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            first = quality_search.QualityTuner(cache_dir, target=0.98, max_encodes=4)
+            kwargs = first.save_kwargs(flat_image(), "webp", {"quality": 85, "method": 6}, source_key="abc")
+            self.assertEqual(first.searches, 1)
+            self.assertEqual(kwargs["method"], 6)
+            # 只在 save() 时落盘
+            self.assertFalse(os.path.exists(os.path.join(cache_dir, quality_search.QUALITY_CACHE_FILENAME)))
+            first.save()
+            self.assertTrue(os.path.exists(os.path.join(cache_dir, quality_search.QUALITY_CACHE_FILENAME)))
+
+            second = quality_search.QualityTuner(cache_dir, target=0.98, max_encodes=4)
+            with mock.patch.object(quality_search, "search_quality") as search:
+                self.assertEqual(second.save_kwargs(flat_image(), "webp", {"quality": 85, "method": 6}, source_key="abc"), kwargs)
+                search.assert_not_called()
+            self.assertEqual(second.hits, 1)
+
+            # 其余编码参数或试编码上限变化时不复用旧结果
+            with mock.patch.object(quality_search, "search_quality", return_value={"quality": 70, "ssim": 0.99, "encodes": 1}) as search:
+                second.save_kwargs(flat_image(), "webp", {"quality": 85, "method": 4}, source_key="abc")
+                quality_search.QualityTuner(cache_dir, target=0.98, max_encodes=6).save_kwargs(
+                    flat_image(), "webp", {"quality": 85, "method": 6}, source_key="abc"
+                )
+                self.assertEqual(search.call_count, 2)
+
+            # 无质量参数的格式不参与搜索
+            self.assertEqual(second.save_kwargs(flat_image(), "png", {}), {})
+
+    def test_fixed_mode_by_default(self):
+        with mock.patch.dict(os.environ, {"IMAGE_QUALITY_MODE": ""}):
+            self.assertIsNone(quality_search.tuner_from_env("output"))
+
+
+if __name__ == "__main__":
+    unittest.main()
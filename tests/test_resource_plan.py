@@ -0,0 +1,59 @@
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import resource
+
+
+def fake_object(type_name, container=None):
+    return SimpleNamespace(type=SimpleNamespace(name=type_name), container=container)
+
+
+class PlanBundleTests(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.dict(resource.CONFIG, {key: True for key in resource.CONFIG})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_disabled_outputs_skip_the_bundle(self):
+        resource.CONFIG["illustration"] = False
+
+        self.assertIsNone(resource.plan_bundle("Song.0/Illustration.png", {}))
+        blur = resource.plan_bundle("Song.0/IllustrationBlur.png", {})
+        self.assertEqual(blur["kind"], "illustrationBlur")
+        self.assertEqual(blur["classes"], ("Sprite",))
+
+    def test_empty_variant_formats_are_dropped(self):
+        with mock.patch.object(resource, "LILITH_ILL_LOW_EXPORT_FORMATS", ()):
+            plan = resource.plan_bundle("Song.0/IllustrationLowRes.png", {})
+
+        self.assertEqual(plan["outputs"], [("illustrationLowRes/Song", ("png",))])
+
+    def test_chart_and_avatar_plans(self):
+        chart = resource.plan_bundle("Song.0/Chart_IN.json", {})
+        avatar = resource.plan_bundle("avatar.Foo", {"Foo": "Bar"})
+
+        self.assertEqual((chart["classes"], chart["outputs"]), (("TextAsset",), [("chart/Song.0/IN.json", ())]))
+        self.assertEqual(avatar["outputs"], [("avatar/Bar", ("png",))])
+
+    def test_unrelated_keys_have_no_plan(self):
+        self.assertIsNone(resource.plan_bundle("Song.0/Preview.wav", {}))
+
+
+class SelectObjectsTests(unittest.TestCase):
+    def test_container_match_narrows_candidates(self):
+        plan = {"key": "Song.0/Illustration.png", "classes": ("Sprite",)}
+        wanted = fake_object("Sprite", "assets/tracks/song.0/illustration.png")
+        objects = [fake_object("Texture2D", wanted.container), wanted, fake_object("Sprite", "assets/other.png")]
+
+        self.assertEqual(resource.select_objects(objects, plan), [wanted])
+
+    def test_without_container_all_objects_of_the_class_are_kept(self):
+        plan = {"key": "avatar.Foo", "classes": ("Sprite",)}
+        sprites = [fake_object("Sprite"), fake_object("Sprite")]
+
+        self.assertEqual(resource.select_objects(sprites + [fake_object("Texture2D")], plan), sprites)
+
+
+if __name__ == "__main__":
+    unittest.main()
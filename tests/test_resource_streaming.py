@@ -0,0 +1,100 @@
+import hashlib
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import generate_index
+import phira
+from hash_cache import HashCache
+from resource import finalize_song_payloads, group_entries_by_song
+
+SONG_INFO = {"Name": "Song", "Composer": "C", "Illustrator": "I", "Chater": ["a", "b"], "difficulty": ["1", "8"]}
+
+
+def song_payloads():
+    chart = {"formatVersion": 3, "offset": 0.0, "judgeLineList": []}
+    return {
+        "chart/Song.0/EZ.json": json.dumps(chart, indent=2).encode(),
+        "chart/Song.0/HD.json": json.dumps(chart).encode(),
+        "illustrationLowRes/Song.png": b"\x89PNG fake",
+        "music/Song.ogg": b"OggS fake",
+    }
+
+
+class GroupEntriesTests(unittest.TestCase):
+    def test_song_bundles_are_grouped_and_avatars_kept_apart(self):
+        groups, others = group_entries_by_song([
+            ("Song.0/Chart_EZ.json", "a"),
+            ("avatar.Cipher1", "b"),
+            ("Song.0/music.wav", "c"),
+            ("Other.0/Illustration.png", "d"),
+        ])
+
+        self.assertEqual(groups, [
+            ("Other.0", [("Other.0/Illustration.png", "d")]),
+            ("Song.0", [("Song.0/Chart_EZ.json", "a"), ("Song.0/music.wav", "c")]),
+        ])
+        self.assertEqual(others, [("avatar.Cipher1", "b")])
+
+
+class FinalizeSongPayloadsTests(unittest.TestCase):
+    def test_in_memory_pez_matches_packaging_from_disk(self):
+        payloads = song_payloads()
+        with tempfile.TemporaryDirectory() as tmp:
+            for rel_path, data in payloads.items():
+                path = os.path.join(tmp, *rel_path.split("/"))
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "wb") as f:
+                    f.write(data)
+            phira_dir = os.path.join(tmp, "phira")
+            with mock.patch.object(phira, "BASE_DIR", tmp), mock.patch.object(phira, "PHIRA_DIR", phira_dir):
+                phira.prepare_phira_dir()
+                count, missing = phira.package_song("Song", SONG_INFO)
+
+            self.assertEqual((count, missing), (2, []))
+            self.assertEqual(finalize_song_payloads("Song.0", payloads, SONG_INFO, ()), [])
+            for level in ("EZ", "HD"):
+                with open(os.path.join(phira_dir, level, f"Song-{level}.pez"), "rb") as f:
+                    self.assertEqual(payloads[f"phira/{level}/Song-{level}.pez"], f.read())
+
+    def test_chart_postprocess_runs_in_memory_before_packaging(self):
+        payloads = song_payloads()
+        original = payloads["chart/Song.0/EZ.json"]
+
+        finalize_song_payloads("Song.0", payloads, None, ("minify", "binary"))
+
+        self.assertLess(len(payloads["chart/Song.0/EZ.json"]), len(original))
+        self.assertIn("chart/Song.0/EZ.bin", payloads)
+        self.assertFalse(any(rel_path.endswith(".pez") for rel_path in payloads))
+
+
+class HashCacheTests(unittest.TestCase):
+    def test_recorded_hashes_are_reused_until_file_changes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            os.makedirs(os.path.join(tmp, "music"))
+            paths = {"music/a.ogg": b"aaa", "music/b.ogg": b"bbb"}
+            cache = HashCache(tmp)
+            for rel_path, data in paths.items():
+                with open(os.path.join(tmp, rel_path), "wb") as f:
+                    f.write(data)
+                cache.record(rel_path, hashlib.sha256(data).hexdigest())
+            cache.save()
+
+            reloaded = HashCache(tmp)
+            hashes = generate_index.collect_file_hashes(tmp, hash_cache=reloaded)
+            self.assertEqual((reloaded.hits, reloaded.misses), (2, 0))
+            self.assertEqual(hashes["music/a.ogg"], hashlib.sha256(b"aaa").hexdigest())
+            self.assertNotIn(".hash-cache.json", hashes)
+
+            with open(os.path.join(tmp, "music", "a.ogg"), "wb") as f:
+                f.write(b"changed")
+            reloaded = HashCache(tmp)
+            hashes = generate_index.collect_file_hashes(tmp, hash_cache=reloaded)
+            self.assertEqual((reloaded.hits, reloaded.misses), (1, 1))
+            self.assertEqual(hashes["music/a.ogg"], hashlib.sha256(b"changed").hexdigest())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import json
+import shutil
+import subprocess
+import unittest
+from pathlib import Path
+
+from file_index import encode_delta, front_encode
+
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+ENGINE_PATH = ROOT_DIR / "assets" / "search-engine.js"
+NODE = shutil.which("node")
+
+# 用旧版 map/filter/sort 的实现作对照，确认小顶堆 top-k 的结果与顺序完全一致。
+NODE_SCRIPT = """
+require(process.argv[1]);
+const [paths, queries] = JSON.parse(process.argv[2]);
+const engine = globalThis.SearchEngine;
+const records = paths.map(engine.buildRecord);
+
+function legacySearch(query, limit) {
+  const terms = engine.parseTerms(query);
+  if (!terms.length) return [];
+  return records
+    .map((record) => ({ record, score: engine.scoreRecord(record, terms) }))
+    .filter((entry) => entry.score >= 0)
+    .sort((a, b) => b.score - a.score || a.record.path.localeCompare(b.record.path))
+    .slice(0, limit)
+    .map((entry) => entry.record.path);
+}
+
+const output = queries.map((query) => ({
+  query,
+  expected: legacySearch(query, 5),
+  actual: engine.search(records, query, 5)
+}));
+console.log(JSON.stringify(output));
+"""
+
+
+@unittest.skipIf(NODE is None, "node is not installed")
+class SearchEngineTests(unittest.TestCase):
+    def _run(self, paths, queries):
+        result = subprocess.run(
+            [NODE, "-e", NODE_SCRIPT, str(ENGINE_PATH), json.dumps([paths, queries])],
+            capture_output=True,
+            text=True,
+            timeout=30,
+            check=True,
+        )
+        return json.loads(result.stdout)
+
+    def test_top_k_matches_full_sort(self):
+        paths = [f"illustration/song{i:02d}.png" for i in range(30)]
+        paths += [f"music/song{i:02d}.ogg" for i in range(30)]
+        paths += ["chart/song07.0/HD.json", "info/illustration.txt", "avatar/song.png"]
+
+        for case in self._run(paths, ["song", "ill", "song0", "music song1", "nothing", ""]):
+            actual = [result["path"] for result in case["actual"]]
+            self.assertEqual(actual, case["expected"], case["query"])
+
+    def test_results_carry_type_and_highlight_ranges(self):
+        [case] = self._run(["illustration/AinSophAur.png"], ["sOph ill"])
+
+        [result] = case["actual"]
+        self.assertEqual(result["type"], "ill")
+        self.assertEqual(result["ranges"], [[0, 3], [16, 20]])
+
+
+    def test_front_coding_and_delta_match_python_encoder(self):
+        old = ["chart/A.0/EZ.json", "chart/A.0/HD.json", "chart/曲.0/IN.json"]
+        new = ["chart/A.0/HD.json", "chart/B.0/AT.json", "chart/曲.0/IN.json"]
+        script = (
+            "require(process.argv[1]);"
+            "const [encoded, old, delta] = JSON.parse(process.argv[2]);"
+            "const e = globalThis.SearchEngine;"
+            "console.log(JSON.stringify([e.frontDecode(encoded), e.applyDelta(old, delta)]));"
+        )
+        delta = json.loads(encode_delta("chart", "a", "b", old, new))
+
+        result = subprocess.run(
+            [NODE, "-e", script, str(ENGINE_PATH), json.dumps([front_encode(old), old, delta])],
+            capture_output=True,
+            text=True,
+            timeout=30,
+            check=True,
+        )
+        decoded, patched = json.loads(result.stdout)
+
+        self.assertEqual(decoded, old)
+        self.assertEqual(patched, new)
+
+
+if __name__ == "__main__":
+    unittest.main()
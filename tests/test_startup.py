@@ -0,0 +1,51 @@
+import os
+import subprocess
+import sys
+import unittest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 这些依赖只应在真正执行对应阶段时导入
+HEAVY_MODULES = ("UnityPy", "PIL", "numpy", "fsb5")
+LIGHT_ENTRY_MODULES = ("main", "generate_index", "resource", "gameInformation", "translate", "taptap", "watch", "image_export", "pipeline", "extract_backend", "deploy_delta", "asset_sync", "avatar_atlas", "quality_search")
+# `import main` 的累计导入耗时上限（微秒），正常情况下只有几十毫秒
+MAIN_IMPORT_BUDGET_US = 300_000
+
+
+def import_times(module):
+    """返回 -X importtime 输出中的 {模块名: 累计耗时(微秒)}。"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = [part.strip() for part in line[len("import time:"):].split("|")]
+        if parts[0].isdigit():
+            times[parts[2]] = int(parts[1])
+    return times
+
+
+class StartupImportTests(unittest.TestCase):
+    def test_entry_modules_do_not_import_heavy_dependencies(self):
+        for module in LIGHT_ENTRY_MODULES:
+            with self.subTest(module=module):
+                loaded = import_times(module)
+                heavy = sorted(name for name in loaded if name.split(".", 1)[0] in HEAVY_MODULES)
+                self.assertEqual(heavy, [])
+
+    def test_main_import_stays_within_budget(self):
+        self.assertLess(import_times("main")["main"], MAIN_IMPORT_BUDGET_US)
+
+    def test_translate_import_does_no_io(self):
+        code = "import translate; print(translate.get_image_ext.cache_info().currsize)"
+        result = subprocess.run([sys.executable, "-c", code], cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout.strip(), "0")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+import asyncio
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import taptap
+
+ETAG = '"detail-v1"'
+
+
+class StubTapTapHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *_args):
+        pass
+
+    def _reply(self, status, payload=None, headers=None):
+        body = json.dumps(payload).encode() if payload is not None else b""
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        server.client_ports.add(self.client_address[1])
+        server.detail_requests += 1
+        if server.fail_next > 0:
+            server.fail_next -= 1
+            self._reply(503, {"error": "busy"})
+            return
+        if server.always_not_modified or (self.headers.get("If-None-Match") == ETAG and server.apk_id == 1):
+            self._reply(304)
+            return
+        self._reply(200, {"data": {"download": {"apk_id": server.apk_id}}}, {"ETag": ETAG})
+
+    def do_POST(self):
+        server = self.server
+        server.client_ports.add(self.client_address[1])
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        server.apk_requests += 1
+        apk = {"download": f"https://example.invalid/{server.apk_id}.apk", "version_name": "3.0", "version_code": 100 + server.apk_id}
+        self._reply(200, {"data": {"apk": apk}})
+
+
+class TapTapClientTests(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubTapTapHandler)
+        self.server.client_ports = set()
+        self.server.detail_requests = 0
+        self.server.apk_requests = 0
+        self.server.fail_next = 0
+        self.server.apk_id = 1
+        self.server.always_not_modified = False
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.client = taptap.TapTapClient(base_url=f"http://127.0.0.1:{self.server.server_port}", backoff=0.01)
+        self.addCleanup(self.client.close)
+
+    def test_latest_apk_reuses_one_connection_and_retries_busy_server(self):
+        self.server.fail_next = 1
+
+        info = asyncio.run(self.client.get_latest_apk())
+
+        self.assertEqual(info["version_code"], "101")
+        self.assertEqual(self.client.stats["retries"], 1)
+        self.assertEqual(len(self.server.client_ports), 1)
+
+    def test_not_modified_without_cache_raises(self):
+        self.server.always_not_modified = True
+
+        with self.assertRaises(taptap.TapTapError) as ctx:
+            asyncio.run(self.client.get_app_detail())
+
+        self.assertEqual(ctx.exception.status, 304)
+
+    def test_poll_skips_apk_request_while_detail_is_not_modified(self):
+        seen = []
+
+        async def on_new_version(info):
+            seen.append(info["version_code"])
+            # 第二轮之后服务端发布新版本
+            self.server.apk_id = 2
+
+        last = asyncio.run(self.client.poll(on_new_version, interval=0, max_polls=4))
+
+        self.assertEqual(seen, ["101", "102"])
+        self.assertEqual(last, "102")
+        self.assertEqual(self.server.detail_requests, 4)
+        # 第 3、4 轮 detail 内容与 apk_id 都未变，不再请求 APK 详情
+        self.assertEqual(self.server.apk_requests, 2)
+
+    def test_known_version_does_not_trigger_callback(self):
+        seen = []
+
+        asyncio.run(self.client.poll(seen.append, interval=0, last_version_code="101", max_polls=2))
+
+        self.assertEqual(seen, [])
+        self.assertEqual(self.client.stats["not_modified"], 1)
+
+    def test_failed_callback_is_retried_on_next_poll(self):
+        attempts = []
+
+        def on_new_version(info):
+            attempts.append(info["version_code"])
+            return len(attempts) > 1
+
+        last = asyncio.run(self.client.poll(on_new_version, interval=0, max_polls=3))
+
+        self.assertEqual(attempts, ["101", "101"])
+        self.assertEqual(last, "101")
+
+
+if __name__ == "__main__":
+    unittest.main()
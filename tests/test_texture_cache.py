@@ -0,0 +1,77 @@
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from PIL import Image
+from UnityPy.export import SpriteHelper, Texture2DConverter
+
+from texture_cache import TextureCache
+
+ATLAS = Image.frombytes("RGBA", (4, 3), bytes(range(48)))
+
+
+def texture_ref(path_id):
+    return SimpleNamespace(file_id=0, path_id=path_id, read=lambda: f"texture-{path_id}")
+
+
+def sprite(texture, x, y, packed=0, rotation=SpriteHelper.SpritePackingRotation.kSPRNone):
+    render_data = SimpleNamespace(
+        texture=texture,
+        alphaTexture=None,
+        textureRect=SimpleNamespace(x=x, y=y, width=2, height=2),
+        settingsRaw=SimpleNamespace(packed=packed, packingRotation=rotation, packingMode=SpriteHelper.SpritePackingMode.kSPMRectangle),
+    )
+    return SimpleNamespace(m_SpriteAtlas=None, m_AtlasTags=[], m_RD=render_data, assets_file=ASSETS_FILE)
+
+
+ASSETS_FILE = SimpleNamespace(_cache={}, objects={})
+
+
+class TextureCacheTests(unittest.TestCase):
+    def setUp(self):
+        ASSETS_FILE._cache.clear()
+        self.decoded = []
+
+        def fake_decode(texture, flip=True):
+            self.decoded.append(texture)
+            return ATLAS.copy()
+
+        patcher = mock.patch.object(Texture2DConverter, "get_image_from_texture2d", fake_decode)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # UnityPy 的参照实现在模块导入时已绑定该函数
+        patcher = mock.patch.object(SpriteHelper, "get_image_from_texture2d", fake_decode)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_sprites_sharing_a_texture_decode_it_once(self):
+        cache = TextureCache()
+        shared = texture_ref(7)
+
+        first = cache.sprite_image(sprite(shared, 0, 0))
+        second = cache.sprite_image(sprite(shared, 2, 2))
+
+        self.assertEqual((cache.decodes, cache.hits, len(cache)), (1, 1, 1))
+        self.assertNotEqual(first.tobytes(), second.tobytes())
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+    def test_matches_unitypy_sprite_export(self):
+        cache = TextureCache()
+        rotations = [(0, SpriteHelper.SpritePackingRotation.kSPRNone)]
+        rotations += [(1, rotation) for rotation in SpriteHelper.SpritePackingRotation]
+        for packed, rotation in rotations:
+            with self.subTest(packed=packed, rotation=rotation):
+                target = sprite(texture_ref(3), 1, 0, packed, rotation)
+                expected = SpriteHelper.get_image_from_sprite(target)
+                self.assertEqual(cache.sprite_image(target).tobytes(), expected.tobytes())
+
+    def test_rect_outside_the_texture_falls_back_to_pillow_padding(self):
+        target = sprite(texture_ref(5), 3, 3)
+
+        expected = SpriteHelper.get_image_from_sprite(target)
+        self.assertEqual(TextureCache().sprite_image(target).tobytes(), expected.tobytes())
+
+
+if __name__ == "__main__":
+    unittest.main()
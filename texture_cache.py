@@ -0,0 +1,143 @@
+"""bundle 级别的 Texture2D 解码缓存。
+
+纹理解码（ETC / ASTC 软解）是曲绘 bundle 中最耗 CPU 的一步。多个 Sprite 指向同一张
+Texture2D / 图集时，只解码一次，各 Sprite 从缓存的像素中裁剪；bundle 处理完后调用 clear()
+立即释放，不依赖 Environment 被回收。
+
+Sprite 裁剪 / 翻转 / 紧密打包遮罩的逻辑与 UnityPy 1.10 的 SpriteHelper.get_image_from_sprite 一致。
+有 numpy 时纹理以数组缓存，裁剪、打包旋转与最终的上下翻转都是数组视图，每个 Sprite 只在
+生成结果图时拷贝一次像素；没有 numpy 时退回 Pillow 的 crop / transpose。
+UnityPy / Pillow / numpy 在首次解码时才导入。
+"""
+# 可以直接用数组表示的纹理模式（Image.fromarray 能按形状还原）
+ARRAY_MODES = ("L", "RGB", "RGBA")
+
+
+def _load_numpy():
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def _crop_box(rect):
+    """与 Image.crop 相同的取整方式。"""
+    return tuple(int(round(v)) for v in (rect.x, rect.y, rect.x + rect.width, rect.y + rect.height))
+
+
+class TextureCache:
+    def __init__(self):
+        self._images = {}
+        self.decodes = 0
+        self.hits = 0
+
+    def __len__(self):
+        return len(self._images)
+
+    def clear(self):
+        self._images.clear()
+
+    def texture_image(self, owner_file, texture, alpha_texture=None):
+        """
+        解码（或取缓存）texture，alpha_texture 为 Texture2D 时合成 RGBA。键为 (文件, PathID)。
+        返回未翻转的像素：有 numpy 且模式可用时为 (h, w[, c]) uint8 数组，否则为 Image。
+        """
+        from PIL import Image
+        from UnityPy.enums import ClassIDType
+        from UnityPy.export.Texture2DConverter import get_image_from_texture2d
+
+        has_alpha = bool(alpha_texture) and getattr(alpha_texture, "type", None) == ClassIDType.Texture2D
+        key = (
+            id(owner_file),
+            texture.file_id,
+            texture.path_id,
+            (alpha_texture.file_id, alpha_texture.path_id) if has_alpha else None,
+        )
+        cached = self._images.get(key)
+        if cached is not None:
+            self.hits += 1
+            return cached
+
+        image = get_image_from_texture2d(texture.read(), False)
+        self.decodes += 1
+        if has_alpha:
+            alpha_image = get_image_from_texture2d(alpha_texture.read(), False)
+            self.decodes += 1
+            image = Image.merge("RGBA", (*image.split()[:3], alpha_image.split()[0]))
+        np = _load_numpy()
+        if np is not None and image.mode in ARRAY_MODES:
+            # 缓存数组而不是 Image，之后每个 Sprite 的裁剪都是零拷贝视图
+            image = np.asarray(image)
+        self._images[key] = image
+        return image
+
+    def sprite_image(self, sprite):
+        """等价于 sprite.image，但纹理来自本缓存。"""
+        from PIL import Image, ImageDraw
+        from UnityPy.enums import ClassIDType
+        from UnityPy.export.SpriteHelper import SpritePackingMode, SpritePackingRotation, get_triangles
+
+        atlas = None
+        if getattr(sprite, "m_SpriteAtlas", None):
+            atlas = sprite.m_SpriteAtlas.read()
+        elif getattr(sprite, "m_AtlasTags", None):
+            for obj in sprite.assets_file.objects.values():
+                if obj.type == ClassIDType.SpriteAtlas:
+                    atlas = obj.read()
+                    if atlas.name == sprite.m_AtlasTags[0]:
+                        break
+                    atlas = None
+        render_data = atlas.m_RenderDataMap[sprite.m_RenderDataKey] if atlas else sprite.m_RD
+
+        texture = self.texture_image(sprite.assets_file, render_data.texture, render_data.alphaTexture)
+        settings = render_data.settingsRaw
+        rotation = settings.packingRotation if settings.packed == 1 else None
+        box = _crop_box(render_data.textureRect)
+        tight = settings.packingMode == SpritePackingMode.kSPMTight
+
+        if isinstance(texture, Image.Image) or not self._box_inside(texture, box):
+            image = texture if isinstance(texture, Image.Image) else Image.fromarray(texture)
+            image = image.crop(box)
+            transpose = {
+                SpritePackingRotation.kSPRFlipHorizontal: Image.FLIP_LEFT_RIGHT,
+                SpritePackingRotation.kSPRFlipVertical: Image.FLIP_TOP_BOTTOM,
+                SpritePackingRotation.kSPRRotate180: Image.ROTATE_180,
+                SpritePackingRotation.kSPRRotate90: Image.ROTATE_270,
+            }.get(rotation)
+            if transpose is not None:
+                image = image.transpose(transpose)
+            flipped = False
+        else:
+            np = _load_numpy()
+            left, top, right, bottom = box
+            view = texture[top:bottom, left:right]
+            if rotation == SpritePackingRotation.kSPRFlipHorizontal:
+                view = view[:, ::-1]
+            elif rotation == SpritePackingRotation.kSPRFlipVertical:
+                view = view[::-1]
+            elif rotation == SpritePackingRotation.kSPRRotate180:
+                view = view[::-1, ::-1]
+            elif rotation == SpritePackingRotation.kSPRRotate90:
+                view = np.rot90(view, -1)
+            # 紧密打包的遮罩按翻转前的坐标绘制，其余情况把最终翻转也并入视图，只拷贝一次
+            flipped = not tight
+            image = Image.fromarray(np.ascontiguousarray(view[::-1] if flipped else view))
+
+        if tight:
+            mask = Image.new("1", image.size, color=0)
+            draw = ImageDraw.ImageDraw(mask)
+            for triangle in get_triangles(sprite):
+                draw.polygon(triangle, fill=1)
+            if image.mode == "RGBA":
+                image = Image.composite(image, Image.new(image.mode, image.size, color=0), mask)
+            else:
+                image.putalpha(mask)
+
+        return image if flipped else image.transpose(Image.FLIP_TOP_BOTTOM)
+
+    @staticmethod
+    def _box_inside(array, box):
+        left, top, right, bottom = box
+        height, width = array.shape[:2]
+        return 0 <= left <= right <= width and 0 <= top <= bottom <= height
@@ -2,6 +2,7 @@
 import os
 import json
 import shutil
+from functools import lru_cache
 
 PHIINFO_OUTPUT = "output"
 ASSET_DIR = os.path.join(PHIINFO_OUTPUT, "asset")
@@ -9,7 +10,9 @@ INFO_DIR = os.path.join(PHIINFO_OUTPUT, "info")
 LEVELS = ["EZ", "HD", "IN", "AT"]
 
 # 自动检测 PhiInfo 输出的图片扩展名（png / webp / avif）
-def _detect_image_ext():
+# 首次映射路径时才遍历 asset/，导入本模块不做任何 IO
+@lru_cache(maxsize=1)
+def get_image_ext():
     if not os.path.isdir(ASSET_DIR):
         return "png"
     for root, _dirs, files in os.walk(ASSET_DIR):
@@ -22,8 +25,6 @@ def _detect_image_ext():
                 return "avif"
     return "png"
 
-IMAGE_EXT = _detect_image_ext()
-
 
 def translate_assets():
     """将 PhiInfo 的 asset/ 文件映射到站点目录结构。"""
@@ -52,13 +53,14 @@ def translate_assets():
 
 def _map_asset_path(rel):
     """将一条 PhiInfo asset 路径映射为目标站点路径。"""
-    # 表单后缀：PhiInfo 在所有原始 key 后加了 .txt / .ogg / .{IMAGE_EXT}
+    # 表单后缀：PhiInfo 在所有原始 key 后加了 .txt / .ogg / .{image_ext}
+    image_ext = get_image_ext()
     if rel.endswith(".txt"):
         orig = rel[:-4]  # 去掉 .txt，得到 Assets/Tracks/Song.Author.0/Chart_EZ.json
     elif rel.endswith(".ogg"):
         orig = rel[:-4]  # 去掉 .ogg，得到 Assets/Tracks/Song.Author.0/music.wav
-    elif rel.endswith(f".{IMAGE_EXT}"):
-        orig = rel[:-(len(IMAGE_EXT) + 1)]  # 去掉 .png/.webp/.avif
+    elif rel.endswith(f".{image_ext}"):
+        orig = rel[:-(len(image_ext) + 1)]  # 去掉 .png/.webp/.avif
     elif rel == "metadata.json":
         return None  # 资产清单不需要
     else:
@@ -71,7 +73,7 @@ def _map_asset_path(rel):
     # 头像：avatar.{name}.{ext} → avatar/{name}.{ext}
     if orig.startswith("avatar."):
         name = orig[len("avatar."):]
-        return f"avatar/{name}.{IMAGE_EXT}"
+        return f"avatar/{name}.{image_ext}"
 
     # 谱面 / 音乐 / 曲绘：SongID.Author.0/XXX
     folder, filename = os.path.split(orig)
@@ -88,11 +90,11 @@ def _map_asset_path(rel):
 
     # 曲绘（PhiInfo 不过滤 Blur/LowRes，但保留映射以免未来支持）
     if "IllustrationBlur" in filename:
-        return f"illustrationBlur/{song_id}.{IMAGE_EXT}"
+        return f"illustrationBlur/{song_id}.{image_ext}"
     if "IllustrationLowRes" in filename:
-        return f"illustrationLowRes/{song_id}.{IMAGE_EXT}"
+        return f"illustrationLowRes/{song_id}.{image_ext}"
     if "Illustration" in filename:
-        return f"illustration/{song_id}.{IMAGE_EXT}"
+        return f"illustration/{song_id}.{image_ext}"
 
     return None
 
@@ -239,10 +241,25 @@ def translate_all_info():
     print(f"  all_info.json written")
 
 
-if __name__ == "__main__":
+def set_output_dir(output_dir):
+    """切换 PhiInfo 导出目录（默认 output/），供提取后端把结果写到独立目录。"""
+    global PHIINFO_OUTPUT, ASSET_DIR, INFO_DIR
+    PHIINFO_OUTPUT = output_dir
+    ASSET_DIR = os.path.join(output_dir, "asset")
+    INFO_DIR = os.path.join(output_dir, "info")
+    get_image_ext.cache_clear()
+
+
+def main(output_dir=None):
+    if output_dir is not None:
+        set_output_dir(output_dir)
     print("--- Translating PhiInfo output ---")
     translate_assets()
     translate_info()
     translate_version()
     translate_all_info()
     print("--- Done ---")
+
+
+if __name__ == "__main__":
+    main()
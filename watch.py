@@ -0,0 +1,148 @@
+"""常驻模式：轮询 TapTap，出现新版本时在上一版 output 的基础上增量重建。
+
+与一次性运行 main.py 相比，进程常驻可以省掉：
+  - Python 冷启动与 UnityPy / Pillow 的导入；
+  - UnityPy 内置 class database (tpk) 的解析与 typetree 节点缓存 (NODES_CACHE)；
+  - typetree.json 的解析（gameInformation.load_typetree 已缓存）；
+  - TapTap detail 的 ETag 缓存（未变时只有一次 304 请求）。
+output 目录在两次构建之间保留，预压缩、谱面统计、files 索引等阶段按内容哈希只处理变化的文件。
+
+环境变量：
+  WATCH_INTERVAL            轮询间隔秒数，默认 600
+  WATCH_STATE_DIR           状态目录（上次版本号、TapTap 缓存），默认 .watch
+  WATCH_CLEAN_OUTPUT        设为 1 时每次构建前清空 output（关闭增量）
+  WATCH_POST_BUILD_COMMAND  构建成功后执行的 shell 命令（如推送产物），版本信息通过环境变量传入
+"""
+import asyncio
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+import main as build
+import taptap
+
+APK_FILENAME = "game.apk"
+OUTPUT_DIR = "output"
+DEFAULT_INTERVAL = 600
+DEFAULT_STATE_DIR = ".watch"
+STATE_FILENAME = "state.json"
+TAPTAP_CACHE_FILENAME = "taptap-cache.json"
+
+
+def flush_print(msg):
+    print(msg, flush=True)
+
+
+def _env_flag(name):
+    return os.environ.get(name, "").lower() in ("1", "true", "yes")
+
+
+def load_state(state_dir):
+    try:
+        with open(os.path.join(state_dir, STATE_FILENAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(state_dir, state):
+    os.makedirs(state_dir, exist_ok=True)
+    path = os.path.join(state_dir, STATE_FILENAME)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def warm_caches():
+    """启动时预热常驻缓存，返回耗时（秒）。"""
+    started = time.time()
+    # 各阶段模块都是按需导入的，常驻进程在这里一次性导入
+    import gameInformation
+    import resource
+    import PIL.Image
+    import UnityPy
+
+    PIL.Image.init()
+    if os.path.exists(gameInformation.TYPETREE_PATH):
+        gameInformation.load_typetree(gameInformation.TYPETREE_PATH)
+    # UnityPy 导入时即解析内置的 tpk，这里显式确认一次
+    from UnityPy.helpers import Tpk
+    if Tpk.TPKTYPETREE is None:
+        Tpk.init()
+    return time.time() - started
+
+
+def build_version(info, state_dir, state):
+    """下载并构建一个新版本，成功时更新状态并执行构建后命令。"""
+    started = time.time()
+    flush_print(f"\n=== 发现新版本 {info['version_name']} ({info['version_code']})，开始增量构建 ===")
+    if not info.get("download_url"):
+        flush_print("错误: TapTap 未返回下载链接，跳过本次构建。")
+        return False
+    if not build.download_apk(info["download_url"], APK_FILENAME, expected_md5=info.get("md5")):
+        return False
+
+    if _env_flag("WATCH_CLEAN_OUTPUT") and os.path.exists(OUTPUT_DIR):
+        shutil.rmtree(OUTPUT_DIR)
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    if not build.run_build_stages(APK_FILENAME, OUTPUT_DIR):
+        return False
+
+    state.update({
+        "version_code": info["version_code"],
+        "version_name": info["version_name"],
+        "md5": info.get("md5", ""),
+        "built_at": int(time.time()),
+        "build_seconds": round(time.time() - started, 2),
+    })
+    save_state(state_dir, state)
+
+    command = os.environ.get("WATCH_POST_BUILD_COMMAND")
+    if command:
+        env = dict(os.environ, VERSION_NAME=info["version_name"], VERSION_CODE=info["version_code"])
+        result = subprocess.run(command, shell=True, env=env)
+        if result.returncode != 0:
+            flush_print(f"!! 构建后命令失败: exit {result.returncode}")
+    flush_print(f"=== 版本 {info['version_code']} 构建完成，耗时 {time.time() - started:.2f} 秒 ===")
+    return True
+
+
+async def watch(interval, state_dir, max_polls=None):
+    state = load_state(state_dir)
+    client = taptap.TapTapClient(cache_path=os.path.join(state_dir, TAPTAP_CACHE_FILENAME))
+
+    async def on_new_version(info):
+        # 构建是阻塞的 CPU/IO 任务，放到线程中执行，期间不再轮询
+        return await asyncio.to_thread(build_version, info, state_dir, state)
+
+    try:
+        return await client.poll(
+            on_new_version,
+            interval=interval,
+            last_version_code=state.get("version_code"),
+            max_polls=max_polls,
+        )
+    finally:
+        client.close()
+
+
+def main(argv):
+    from resource import _get_int_env
+
+    interval = _get_int_env("WATCH_INTERVAL", DEFAULT_INTERVAL, min_value=1)
+    state_dir = os.environ.get("WATCH_STATE_DIR", DEFAULT_STATE_DIR)
+    max_polls = 1 if "--once" in argv else None
+    os.makedirs(state_dir, exist_ok=True)
+
+    build.check_environment()
+    flush_print(f"--- 预热缓存完成，耗时 {warm_caches():.2f} 秒 ---")
+    last = load_state(state_dir).get("version_code")
+    flush_print(f"--- 开始监听新版本 (间隔 {interval} 秒，当前版本 {last or '无'}) ---")
+    asyncio.run(watch(interval, state_dir, max_polls))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])